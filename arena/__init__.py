@@ -0,0 +1,31 @@
+"""
+评估引擎模块
+提供评估脚本共用的任务定义、评估循环、结果日志、统计等组件
+"""
+
+from .results_log import ResultLog, select_pending, STATUS_OK, STATUS_PARSE_ERROR, STATUS_ERROR
+from .results_store import ResultStore
+from .metrics import ConfusionMatrix
+from .bootstrap import stratified_bootstrap, BootstrapResult
+from .early_stopping import EarlyStopping, reference_from_log
+from .json_extract import extract_json
+from .latency import LatencyHistogram, LatencyStats
+from .profiling import RunProfiler, StageProfile
+from .monitoring import Monitor
+from .leaderboard import Leaderboard, write_leaderboard
+from .tasks import EvalTask
+from .dataset import iter_samples, Prefetcher
+from .cache import ImageCache, ResponseCache
+from .voting import majority_vote, vote_cost
+from .engine import EvalResult, run_evaluation, print_report
+from .scheduler import load_matrix_config, run_matrix
+from .sweep import run_sweep, print_sweep_report
+from .work_queue import WorkQueue, enqueue_run, run_worker, collect_run
+
+__all__ = ["ResultLog", "select_pending", "STATUS_OK", "STATUS_PARSE_ERROR", "STATUS_ERROR", "ResultStore",
+           "ConfusionMatrix", "stratified_bootstrap", "BootstrapResult", "EarlyStopping", "reference_from_log",
+           "extract_json", "LatencyHistogram", "LatencyStats", "RunProfiler", "StageProfile", "Monitor",
+           "Leaderboard", "write_leaderboard", "EvalTask", "iter_samples", "Prefetcher", "ImageCache",
+           "ResponseCache", "majority_vote", "vote_cost", "EvalResult", "run_evaluation", "print_report",
+           "load_matrix_config", "run_matrix", "run_sweep", "print_sweep_report", "WorkQueue", "enqueue_run",
+           "run_worker", "collect_run"]
@@ -0,0 +1,181 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .metrics import ConfusionMatrix, encode_labels
+
+# 单批抽样的最大下标数量，控制内存占用
+_MAX_DRAWS_PER_CHUNK = 8_000_000
+
+
+class BootstrapResult:
+    """分层自助法（bootstrap）的点估计与置信区间"""
+
+    def __init__(self, labels: Sequence[str], point: Dict[str, np.ndarray],
+                 samples: Dict[str, np.ndarray], confidence: float):
+        """
+        初始化结果
+
+        Args:
+            labels: 类别列表
+            point: 指标名 -> 全量数据上的点估计
+            samples: 指标名 -> 每次重采样的指标值，首维为重采样次数
+            confidence: 置信水平
+        """
+        self.labels = list(labels)
+        self.point = point
+        self.samples = samples
+        self.confidence = confidence
+
+    @property
+    def n_resamples(self) -> int:
+        """重采样次数"""
+        return len(self.samples["accuracy"])
+
+    def interval(self, metric: str) -> np.ndarray:
+        """
+        百分位置信区间
+
+        Args:
+            metric: 指标名
+
+        Returns:
+            形状为 (2, ...) 的下界/上界
+        """
+        alpha = (1 - self.confidence) / 2
+        return np.quantile(self.samples[metric], [alpha, 1 - alpha], axis=0)
+
+    def to_dict(self) -> dict:
+        """导出为可JSON序列化的字典"""
+        result = {"confidence": self.confidence, "n_resamples": self.n_resamples}
+        for metric, value in self.point.items():
+            low, high = self.interval(metric)
+            if np.ndim(value) == 0:
+                result[metric] = {"value": float(value), "low": float(low), "high": float(high)}
+            else:
+                result[metric] = {
+                    label: {"value": float(value[i]), "low": float(low[i]), "high": float(high[i])}
+                    for i, label in enumerate(self.labels)
+                }
+        return result
+
+
+def _metrics_from_matrices(matrices: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    批量计算指标
+
+    Args:
+        matrices: 形状为 (B, K, K+1) 的混淆矩阵
+
+    Returns:
+        指标名 -> 形状为 (B,) 或 (B, K) 的数组
+    """
+    matrices = matrices.astype(np.float64)
+    k = matrices.shape[1]
+    correct = matrices[:, np.arange(k), np.arange(k)]
+    support = matrices.sum(axis=2)
+    predicted = matrices[:, :, :k].sum(axis=1)
+    total = support.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        recall = np.where(support > 0, correct / support, 0.0)
+        precision = np.where(predicted > 0, correct / predicted, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        accuracy = np.where(total > 0, correct.sum(axis=1) / total, 0.0)
+
+    # 分层重采样保持各类别样本数不变，因此有样本的类别集合在每次重采样中一致
+    present = support[0] > 0 if len(support) else np.zeros(k, dtype=bool)
+    balanced_accuracy = recall[:, present].mean(axis=1) if present.any() else np.zeros(len(matrices))
+
+    return {
+        "accuracy": accuracy,
+        "balanced_accuracy": balanced_accuracy,
+        "macro_f1": f1[:, present].mean(axis=1) if present.any() else np.zeros(len(matrices)),
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    }
+
+
+def stratified_bootstrap(y_true: Sequence, y_pred: Sequence, labels: Sequence[str],
+                         n_resamples: int = 2000, confidence: float = 0.95,
+                         seed: Optional[int] = 0) -> BootstrapResult:
+    """
+    分层自助法估计指标的置信区间
+
+    每次重采样在各真实类别内部有放回地抽取与原类别相同数量的样本，
+    全部用NumPy下标数组完成，不逐个样本循环。
+
+    Args:
+        y_true: 真实标签序列
+        y_pred: 预测标签序列，无效预测可用None表示
+        labels: 类别列表
+        n_resamples: 重采样次数
+        confidence: 置信水平
+        seed: 随机种子，固定后结果可复现
+
+    Returns:
+        BootstrapResult
+    """
+    k = len(labels)
+    true_codes = encode_labels(y_true, labels)
+    pred_codes = encode_labels(y_pred, labels)
+    if true_codes.shape != pred_codes.shape:
+        raise ValueError("y_true与y_pred长度不一致")
+    if np.any(true_codes >= k):
+        raise ValueError("y_true中存在不在类别列表中的标签")
+    rng = np.random.default_rng(seed)
+
+    # 按真实类别分组的预测编码
+    order = np.argsort(true_codes, kind="stable")
+    counts = np.bincount(true_codes, minlength=k)
+    preds_by_class = np.split(pred_codes[order], np.cumsum(counts)[:-1])
+
+    matrices = np.zeros((n_resamples, k, k + 1), dtype=np.int64)
+    for c, class_preds in enumerate(preds_by_class):
+        n = len(class_preds)
+        if n == 0:
+            continue
+        chunk = max(1, _MAX_DRAWS_PER_CHUNK // n)
+        for start in range(0, n_resamples, chunk):
+            stop = min(start + chunk, n_resamples)
+            draws = class_preds[rng.integers(0, n, size=(stop - start, n))]
+            # 每次重采样的预测分布：偏移后一次bincount得到 (B, K+1)
+            offsets = np.arange(stop - start)[:, None] * (k + 1)
+            flat = np.bincount((draws + offsets).ravel(), minlength=(stop - start) * (k + 1))
+            matrices[start:stop, c] = flat.reshape(stop - start, k + 1)
+
+    point_cm = ConfusionMatrix.from_codes(true_codes, pred_codes, k, labels)
+    point = {metric: values[0] for metric, values in _metrics_from_matrices(point_cm.matrix[None]).items()}
+    return BootstrapResult(labels, point, _metrics_from_matrices(matrices), confidence)
+
+
+def print_bootstrap_report(result: BootstrapResult, display_names: Optional[Dict[str, str]] = None):
+    """
+    打印带置信区间的指标
+
+    Args:
+        result: stratified_bootstrap的返回值
+        display_names: 类别显示名称
+    """
+    display_names = display_names or {}
+    level = f"{result.confidence * 100:.0f}%"
+    print(f"分层Bootstrap重采样次数: {result.n_resamples}，置信水平: {level}")
+
+    for metric, name in [("accuracy", "准确率"), ("balanced_accuracy", "均衡准确率")]:
+        low, high = result.interval(metric)
+        print(f"{name}: {result.point[metric] * 100:.2f}%  [{low * 100:.2f}%, {high * 100:.2f}%]")
+    low, high = result.interval("macro_f1")
+    print(f"宏平均F1: {result.point['macro_f1'] * 100:.2f}  [{low * 100:.2f}, {high * 100:.2f}]")
+
+    recall_low, recall_high = result.interval("recall")
+    precision_low, precision_high = result.interval("precision")
+    f1_low, f1_high = result.interval("f1")
+    for i, label in enumerate(result.labels):
+        print(f"\n类别: {display_names.get(label, label)}")
+        print(f"  召回率: {result.point['recall'][i] * 100:.2f}%  "
+              f"[{recall_low[i] * 100:.2f}%, {recall_high[i] * 100:.2f}%]")
+        print(f"  精确率: {result.point['precision'][i] * 100:.2f}%  "
+              f"[{precision_low[i] * 100:.2f}%, {precision_high[i] * 100:.2f}%]")
+        print(f"  F1分数: {result.point['f1'][i] * 100:.2f}  "
+              f"[{f1_low[i] * 100:.2f}, {f1_high[i] * 100:.2f}]")
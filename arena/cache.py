@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from llm_client import ImagePayload, ChatResult
+
+
+class ImageCache:
+    """
+    编码后图片的LRU缓存
+
+    同一张图片被多个模型、多个提示词评估时只读取和base64编码一次。可在预读取线程中使用。
+    """
+
+    def __init__(self, max_items: int = 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_items: 最多缓存的图片数
+        """
+        self.max_items = max_items
+        self._items: "OrderedDict[str, ImagePayload]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, image_path: Union[str, Path]) -> ImagePayload:
+        """
+        读取并编码图片（命中缓存时直接返回）
+
+        Args:
+            image_path: 图片文件路径
+
+        Returns:
+            图片数据
+        """
+        key = str(image_path)
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+
+        # 读取文件时不持有锁，其他线程可以同时读取别的图片
+        payload = ImagePayload.from_file(image_path)
+        with self._lock:
+            self._items[key] = payload
+            if len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return payload
+
+
+class ResponseCache:
+    """
+    模型响应缓存
+
+    键为 (供应商, 模型, 提示词, 图片内容摘要)，相同请求不重复调用模型；
+    并发的相同请求共享同一次调用。指定 path 时成功的响应追加写入JSONL文件，跨进程复用。
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """
+        初始化缓存
+
+        Args:
+            path: 持久化文件路径，None表示只缓存在内存中
+        """
+        self.path = Path(path) if path is not None else None
+        self._items: Dict[str, ChatResult] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._file = None
+        self.hits = 0
+        self.misses = 0
+
+        if self.path is not None and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._items[entry["key"]] = ChatResult(
+                        entry["content"], entry.get("prompt_tokens"), entry.get("completion_tokens"),
+                        choices=entry.get("choices"), requests=entry.get("requests", 1),
+                    )
+
+    @staticmethod
+    def key(provider: str, model_name: str, text_input: str, payload: Optional[ImagePayload]) -> str:
+        """
+        请求的缓存键
+
+        Args:
+            provider: 供应商名称
+            model_name: 模型名称
+            text_input: 提示词
+            payload: 图片数据
+
+        Returns:
+            缓存键
+        """
+        request = json.dumps([provider, model_name, text_input, payload.digest if payload else None])
+        return hashlib.sha1(request.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _hit(result: ChatResult) -> ChatResult:
+        """缓存命中时返回带 cached 标记的副本，调用方据此不计入延迟统计"""
+        copy = ChatResult(result.content, result.prompt_tokens, result.completion_tokens,
+                          choices=result.choices, requests=result.requests)
+        copy.cached = True
+        return copy
+
+    async def get_or_call(self, key: str, call, refresh: bool = False) -> ChatResult:
+        """
+        返回缓存的响应，未命中时调用 call() 并缓存成功的结果
+
+        Args:
+            key: 缓存键
+            call: 返回ChatResult的无参协程函数
+            refresh: 为True时不使用已缓存的响应，重新调用并覆盖缓存（重跑失败样本时，
+                缓存的响应可能正是解析失败的那一个）
+
+        Returns:
+            聊天结果；来自缓存（或共享了进行中的调用）时 cached 属性为True
+        """
+        if key in self._items and not refresh:
+            self.hits += 1
+            return self._hit(self._items[key])
+        if key in self._pending:
+            # 相同请求正在进行中，等待其结果
+            self.hits += 1
+            future = self._pending[key]
+            try:
+                return self._hit(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 发起请求的一方被取消，由本方重新调用
+                return await self.get_or_call(key, call, refresh)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+        future.set_result(result)
+        self._items[key] = result
+        self._persist(key, result)
+        return result
+
+    def _persist(self, key: str, result: ChatResult):
+        """追加写入持久化文件"""
+        if self.path is None:
+            return
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({
+            "key": key,
+            "content": result.content,
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+            "choices": result.choices,
+            "requests": result.requests,
+        }, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        """关闭持久化文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
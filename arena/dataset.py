@@ -0,0 +1,138 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Union
+
+from .tasks import EvalTask
+
+_END = object()
+
+
+def count_samples(metadata_file: Union[str, Path]) -> int:
+    """
+    统计元数据中的样本数（只数非空行，不解析JSON）
+
+    Args:
+        metadata_file: metadata.jsonl路径
+
+    Returns:
+        样本数
+    """
+    with open(metadata_file, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def dataset_size(task: EvalTask) -> int:
+    """
+    数据集样本数：元数据的非空行数，或虚拟数据集的记录数
+
+    Args:
+        task: 评估任务
+
+    Returns:
+        样本数
+    """
+    return len(task.source) if task.source is not None else count_samples(task.metadata_file)
+
+
+def iter_samples(task: EvalTask, records: Optional[Iterable[Tuple[int, dict]]] = None,
+                 log=print) -> Iterator[Tuple[int, dict, str]]:
+    """
+    逐个校验样本，跳过数据不完整、标签未知或重复的样本
+
+    Args:
+        task: 评估任务
+        records: (样本序号, 元数据记录)，默认逐行读取任务的元数据文件
+        log: 输出跳过信息的函数
+
+    Yields:
+        (样本序号, 元数据记录, 统一后的真实标签)
+    """
+    if records is None:
+        records = task.iter_dataset(log)
+
+    seen = set()
+    for i, item in records:
+        image_path = item.get("file_name")
+        ground_truth = task.ground_truth(item)
+
+        if not isinstance(image_path, str) or not image_path or ground_truth is None:
+            log(f"跳过第 {i+1} 个样本: 数据不完整")
+            continue
+        if ground_truth not in task.labels:
+            log(f"跳过第 {i+1} 个样本: 未知标签 {ground_truth}")
+            continue
+        if image_path in seen:
+            # 结果日志以文件名为样本ID，重复的样本只评估一次
+            log(f"跳过第 {i+1} 个样本: 重复的文件 {image_path}")
+            continue
+        seen.add(image_path)
+        yield i, item, ground_truth
+
+
+class Prefetcher:
+    """
+    带后台预读取的迭代器
+
+    在线程池中提前 distance 个元素执行 load（例如读取并编码图片），
+    消费者拿到元素时数据通常已经就绪；同时最多持有 distance + 1 个元素的数据，内存占用有上限。
+    """
+
+    def __init__(self, items: Iterable, load: Callable, distance: int = 8, workers: int = 4,
+                 select: Optional[Callable] = None):
+        """
+        初始化预读取迭代器
+
+        Args:
+            items: 元素（可以是惰性的生成器）
+            load: 在后台线程中执行的读取函数，参数为元素
+            distance: 预读取距离（元素个数）
+            workers: 读取线程数
+            select: 只为返回True的元素预读取，默认全部预读取
+        """
+        self.items = iter(items)
+        self.load = load
+        self.distance = max(0, distance)
+        self.select = select
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._window = deque()
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Tuple[object, Optional[Future]]:
+        """
+        下一个元素
+
+        Returns:
+            (元素, 读取结果的Future)；未被select选中的元素Future为None
+        """
+        self._fill()
+        if not self._window:
+            raise StopIteration
+        return self._window.popleft()
+
+    def _fill(self):
+        """补足预读取窗口"""
+        while not self._exhausted and len(self._window) <= self.distance:
+            item = next(self.items, _END)
+            if item is _END:
+                self._exhausted = True
+                break
+            selected = self.select is None or self.select(item)
+            self._window.append((item, self._executor.submit(self.load, item) if selected else None))
+
+    def close(self):
+        """取消尚未开始的读取并关闭线程池"""
+        for _, future in self._window:
+            if future is not None:
+                future.cancel()
+        self._window.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
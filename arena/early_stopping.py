@@ -0,0 +1,237 @@
+import math
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tasks import normalize_label
+
+
+def stratified_order(labels: Sequence, seed: Optional[int] = 0) -> np.ndarray:
+    """
+    随机分层评估顺序
+
+    各类别内部随机打乱后按类别比例交错排列，任意前缀中的类别分布都接近整体分布，
+    因此中途停止时已评估的样本仍然具有代表性。
+
+    Args:
+        labels: 每个样本的真实标签
+        seed: 随机种子
+
+    Returns:
+        样本下标的排列
+    """
+    _, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    codes = codes.reshape(-1)
+    rng = np.random.default_rng(seed)
+    keys = np.empty(len(codes))
+    for c in np.unique(codes):
+        members = np.flatnonzero(codes == c)
+        rng.shuffle(members)
+        # 第j个样本落在 [j/n, (j+1)/n) 区间内的随机位置
+        keys[members] = (np.arange(len(members)) + rng.random(len(members))) / len(members)
+    return np.argsort(keys, kind="stable")
+
+
+def wilson_interval(successes: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    比例的Wilson置信区间
+
+    Args:
+        successes: 成功次数
+        n: 试验次数
+        confidence: 置信水平
+
+    Returns:
+        (下界, 上界)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class SequentialTest:
+    """伯努利序贯概率比检验（SPRT）：H0: p = p0 vs H1: p = p1"""
+
+    def __init__(self, p0: float, p1: float, alpha: float = 0.05, beta: float = 0.05):
+        """
+        初始化检验
+
+        Args:
+            p0: 原假设下的成功概率
+            p1: 备择假设下的成功概率（p1 > p0）
+            alpha: 第一类错误率
+            beta: 第二类错误率
+        """
+        eps = 1e-6
+        self.p0 = min(max(p0, eps), 1 - eps)
+        self.p1 = min(max(p1, eps), 1 - eps)
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.llr = 0.0
+        self.n = 0
+        self.decision = None
+
+    def update(self, success: bool) -> Optional[str]:
+        """
+        加入一次观测
+
+        Args:
+            success: 是否成功
+
+        Returns:
+            "H1"、"H0" 或 None（尚未决定）
+        """
+        if self.decision is not None:
+            return self.decision
+        self.n += 1
+        if success:
+            self.llr += math.log(self.p1 / self.p0)
+        else:
+            self.llr += math.log((1 - self.p1) / (1 - self.p0))
+        if self.llr >= self.upper:
+            self.decision = "H1"
+        elif self.llr <= self.lower:
+            self.decision = "H0"
+        return self.decision
+
+
+class EarlyStopping:
+    """
+    评估提前停止策略
+
+    满足任一条件即停止：
+    - 准确率置信区间宽度小于 ci_width
+    - 与固定阈值 threshold 的序贯检验得出结论
+    - 与参照模型（reference）的配对序贯检验得出结论（只看两者结果不一致的样本）
+    """
+
+    def __init__(self, ci_width: Optional[float] = None, threshold: Optional[float] = None,
+                 reference: Optional[Dict[str, bool]] = None, delta: float = 0.05,
+                 alpha: float = 0.05, beta: float = 0.05, confidence: float = 0.95,
+                 min_samples: int = 20, seed: Optional[int] = 0):
+        """
+        初始化提前停止策略
+
+        Args:
+            ci_width: 目标置信区间宽度（例如0.1表示±5%）
+            threshold: 准确率阈值，检验模型是否高于该阈值
+            reference: 参照模型每个样本是否正确（sample_id -> bool），可由 reference_from_log 得到
+            delta: 序贯检验的无差异区间半宽
+            alpha: 第一类错误率
+            beta: 第二类错误率
+            confidence: 置信区间的置信水平
+            min_samples: 至少评估多少个样本后才允许停止
+            seed: 随机分层顺序的随机种子
+        """
+        if ci_width is None and threshold is None and reference is None:
+            raise ValueError("至少需要设置 ci_width、threshold、reference 中的一项")
+        self.ci_width = ci_width
+        self.threshold = threshold
+        self.reference = reference
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.seed = seed
+
+        self.threshold_test = (
+            SequentialTest(threshold - delta, threshold + delta, alpha, beta) if threshold is not None else None
+        )
+        self.paired_test = SequentialTest(0.5 - delta, 0.5 + delta, alpha, beta) if reference is not None else None
+        self.wins = 0
+        self.losses = 0
+
+        self.n = 0
+        self.correct = 0
+        self.reason = None
+
+    def order(self, labels: Sequence) -> np.ndarray:
+        """评估顺序（随机分层）"""
+        return stratified_order(labels, self.seed)
+
+    def update(self, sample_id: str, correct: bool):
+        """
+        加入一个样本的评估结果（无效预测计为错误）
+
+        Args:
+            sample_id: 样本ID
+            correct: 是否预测正确
+        """
+        self.n += 1
+        self.correct += int(correct)
+        if self.threshold_test is not None:
+            self.threshold_test.update(correct)
+        if self.paired_test is not None and sample_id in self.reference:
+            reference_correct = self.reference[sample_id]
+            if correct != reference_correct:
+                # 只有结果不一致的样本才携带两模型差异的信息
+                self.wins += int(correct)
+                self.losses += int(reference_correct)
+                self.paired_test.update(correct)
+
+    def interval(self) -> Tuple[float, float]:
+        """当前准确率的Wilson置信区间"""
+        return wilson_interval(self.correct, self.n, self.confidence)
+
+    def should_stop(self) -> bool:
+        """
+        是否满足停止条件，满足时记录原因到 self.reason
+
+        Returns:
+            是否停止
+        """
+        if self.reason is not None:
+            return True
+        if self.n < self.min_samples:
+            return False
+
+        low, high = self.interval()
+        if self.ci_width is not None and high - low <= self.ci_width:
+            self.reason = f"准确率置信区间宽度 {high - low:.3f} ≤ {self.ci_width}"
+        elif self.threshold_test is not None and self.threshold_test.decision is not None:
+            side = "高于" if self.threshold_test.decision == "H1" else "低于"
+            self.reason = f"序贯检验判定准确率{side}阈值 {self.threshold:.2%}"
+        elif self.paired_test is not None and self.paired_test.decision is not None:
+            side = "优于" if self.paired_test.decision == "H1" else "劣于"
+            self.reason = f"配对序贯检验判定模型{side}参照模型（{self.wins}胜/{self.losses}负）"
+        return self.reason is not None
+
+    def summary(self) -> dict:
+        """提前停止状态摘要"""
+        low, high = self.interval()
+        result = {
+            "evaluated": self.n,
+            "accuracy": self.correct / self.n if self.n else 0.0,
+            "ci": [low, high],
+            "stopped_early": self.reason is not None,
+            "reason": self.reason,
+        }
+        if self.threshold_test is not None:
+            result["threshold"] = self.threshold
+            result["threshold_decision"] = self.threshold_test.decision
+        if self.paired_test is not None:
+            result["reference_wins"] = self.wins
+            result["reference_losses"] = self.losses
+            result["reference_decision"] = self.paired_test.decision
+        return result
+
+
+def reference_from_log(records: Dict[str, dict], task) -> Dict[str, bool]:
+    """
+    由参照模型的结果日志得到每个样本是否正确
+
+    Args:
+        records: 参照模型 ResultLog.load() 的返回值
+        task: EvalTask
+
+    Returns:
+        sample_id -> 是否正确（失败样本计为错误）
+    """
+    return {
+        sample_id: task.prediction_label(record.get("predicted")) == normalize_label(record.get("ground_truth"))
+        for sample_id, record in records.items()
+    }
@@ -0,0 +1,529 @@
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Optional, Union
+
+from llm_client import LLMClient, ImagePayload, span
+from llm_client.base import MIME_TYPES
+from .bootstrap import stratified_bootstrap, print_bootstrap_report
+from .cache import ImageCache
+from .dataset import Prefetcher, dataset_size, iter_samples
+from .early_stopping import EarlyStopping
+from .leaderboard import write_leaderboard
+from .latency import LatencyStats, print_latency_report
+from .metrics import ConfusionMatrix, print_class_report, print_summary
+from .monitoring import Monitor, RunMonitor
+from .profiling import RunProfiler, print_stage_report
+from .results_log import ResultLog, is_pending, STATUS_OK, STATUS_PARSE_ERROR, STATUS_ERROR
+from .results_store import ResultStore
+from .tasks import EvalTask
+from .voting import majority_vote, print_voting_report
+
+
+class EvalResult:
+    """一次评估运行的结果"""
+
+    def __init__(self, task: EvalTask, provider: str, model_name: str, result_log: ResultLog,
+                 total_samples: int, pending_total: int):
+        """
+        初始化评估结果
+
+        Args:
+            task: 评估任务
+            provider: 供应商名称
+            model_name: 模型名称
+            result_log: 结果日志
+            total_samples: 数据集样本数
+            pending_total: 本次需要调用模型的样本数
+        """
+        self.task = task
+        self.provider = provider
+        self.model_name = model_name
+        self.run_id = result_log.run_id
+        self.log_path = result_log.path
+        self.total_samples = total_samples
+        self.pending_total = pending_total
+
+        # 按评估顺序排列的样本记录（包括复用日志的记录）
+        self.records: List[dict] = []
+        self.y_true: List[str] = []
+        self.y_pred: List[Optional[str]] = []
+        self.total_time = 0.0
+        self.valid_predictions = 0
+        self.calls_made = 0
+        self.early_stopping: Optional[EarlyStopping] = None
+        self.profiler: Optional[RunProfiler] = None
+        # 仅统计本次实际调用模型的样本
+        self.latency = LatencyStats()
+
+    @property
+    def calls_saved(self) -> int:
+        """提前停止节省的模型调用次数"""
+        return self.pending_total - self.calls_made
+
+    def add(self, record: dict, ground_truth: str, predicted_label: Optional[str]):
+        """
+        加入一个样本记录
+
+        Args:
+            record: 样本记录
+            ground_truth: 统一后的真实标签
+            predicted_label: 统一后的预测标签，无效预测为None
+        """
+        self.records.append(record)
+        self.y_true.append(ground_truth)
+        self.y_pred.append(predicted_label)
+        if "latency" in record:
+            self.total_time += record["latency"]
+            self.valid_predictions += 1
+
+    def confusion_matrix(self) -> ConfusionMatrix:
+        """由已评估样本构建混淆矩阵"""
+        return ConfusionMatrix.from_labels(self.y_true, self.y_pred, self.task.labels)
+
+
+async def evaluate_sample(task: EvalTask, client: LLMClient, item: dict,
+                          image_cache: Optional[ImageCache] = None, votes: int = 1,
+                          prefetched: Optional[Future] = None, monitor: Optional[RunMonitor] = None) -> dict:
+    """
+    调用模型评估单个样本
+
+    Args:
+        task: 评估任务
+        client: LLM客户端
+        item: 元数据记录
+        image_cache: 编码后图片的共享缓存（可选）
+        votes: 每个样本的候选回复数，大于1时对全部候选的预测多数投票
+        prefetched: 后台线程预读取图片的Future（可选），此时encode阶段为等待读取完成的时间
+        monitor: 运行监控（可选），记录请求计数、进行中的请求数、各阶段耗时与trace span
+
+    Returns:
+        样本记录，status为ok/parse_error/error之一；
+        timings记录各阶段耗时（单调时钟），usage记录token用量；
+        投票时votes为各候选的原始预测，agreement为多数标签的一致率
+    """
+    image_path = item["file_name"]
+    record = {"sample_id": image_path, "ground_truth": item.get(task.label_field)}
+    timings = {}
+    started = time.time()
+    start_time = time.perf_counter()
+    if monitor is not None:
+        monitor.request_started()
+    try:
+        # 读取并编码图片
+        with span("encode"):
+            if prefetched is not None:
+                payload = await asyncio.wrap_future(prefetched)
+            else:
+                payload = load_image(task, item, image_cache)
+        network_start = time.perf_counter()
+        timings["encode"] = network_start - start_time
+
+        with span("network"):
+            if votes > 1:
+                chat_result = await client.async_chat_n(task.prompt_template, payload, votes)
+            else:
+                chat_result = await client.async_chat(task.prompt_template, payload)
+
+        parse_start = time.perf_counter()
+        timings["network"] = parse_start - network_start
+        queue_time = getattr(chat_result, "queue_time", None)
+        if queue_time is not None:
+            # 等待并发名额的时间单独统计，不计入网络耗时
+            timings["queue"] = queue_time
+            timings["network"] -= queue_time
+        # 模型响应耗时
+        record["latency"] = timings["network"]
+        record["usage"] = {
+            "prompt_tokens": chat_result.prompt_tokens,
+            "completion_tokens": chat_result.completion_tokens,
+        }
+        if chat_result.requests != 1:
+            record["usage"]["requests"] = chat_result.requests
+        if getattr(chat_result, "cached", False):
+            # 响应来自缓存，耗时不代表模型的真实延迟
+            record["cached"] = True
+        # 保留原始响应，便于更换解析逻辑后重新解析
+        response = record["response"] = chat_result.content
+
+        # 提取 JSON 部分
+        with span("parse"):
+            if votes > 1:
+                record["responses"] = chat_result.choices
+                parsed = [task.response_parser(choice) for choice in chat_result.choices]
+                record["votes"] = [data.get(task.label_field) if data is not None else None for data in parsed]
+                labels = [task.prediction_label(vote) for vote in record["votes"]]
+                label, record["agreement"] = majority_vote(labels)
+                # 预测值与调试信息取自第一个投给多数标签的候选回复
+                response_data = next(
+                    (data for data, vote in zip(parsed, labels) if label is not None and vote == label), None
+                )
+            else:
+                response_data = task.response_parser(response)
+        timings["parse"] = time.perf_counter() - parse_start
+
+        if response_data is None:
+            record["status"] = STATUS_PARSE_ERROR
+        else:
+            record.update(status=STATUS_OK, predicted=response_data.get(task.label_field))
+            for field in task.debug_fields:
+                record[field] = response_data.get(field)
+    except asyncio.CancelledError:
+        if monitor is not None:
+            monitor.request_cancelled()
+        raise
+    except Exception as e:
+        record.update(status=STATUS_ERROR, error=str(e))
+    timings["total"] = time.perf_counter() - start_time
+    record["timings"] = timings
+    if monitor is not None:
+        monitor.request_finished(record, started)
+    return record
+
+
+def _print_record(task: EvalTask, record: dict, ground_truth: str, predicted_label: Optional[str]):
+    """打印单个样本的评估结果"""
+    if record["status"] == STATUS_ERROR:
+        print(f"  - 发生错误: {record['error']}")
+        return
+    if record["status"] == STATUS_PARSE_ERROR:
+        print(f"  - 错误: 无法从响应中提取有效的JSON")
+        print(f"  - 原始响应: {record['response']}")
+        return
+
+    print(f"  - 真实标签: {record['ground_truth']}")
+    print(f"  - 预测标签: {record['predicted']}")
+    if "votes" in record:
+        print(f"  - 投票: {record['votes']}，一致率 {record['agreement'] * 100:.0f}%")
+    for field, name in task.debug_fields.items():
+        print(f"  - 调试信息 - {name}: {record.get(field)}")
+    print(f"  - 耗时: {record['latency']:.2f}秒")
+    print("  - 结果: 正确" if predicted_label == ground_truth else "  - 结果: 错误")
+
+
+def load_image(task: EvalTask, item: dict, image_cache: Optional[ImageCache] = None) -> ImagePayload:
+    """
+    读取并编码样本图片（在预读取线程中执行）
+
+    Args:
+        task: 评估任务
+        item: 元数据记录
+        image_cache: 编码后图片的共享缓存（可选，任务有数据源时不使用）
+
+    Returns:
+        图片数据
+    """
+    file_name = task.image_file(item)
+    if task.source is not None:
+        # 虚拟数据集在此渲染，打包数据集从映射的分片中读取
+        with span("image.source"):
+            data = task.source.encode(item if file_name == item["file_name"] else {**item, "file_name": file_name})
+        return ImagePayload.from_bytes(data, MIME_TYPES.get(Path(file_name).suffix.lower(), "image/jpeg"))
+    full_path = task.dataset_path / file_name
+    return image_cache.get(full_path) if image_cache is not None else ImagePayload.from_file(full_path)
+
+
+async def run_evaluation(task: EvalTask, client: LLMClient, provider: str, model_name: str,
+                         log_dir: Union[str, Path] = "results/logs", retry_failures_only: bool = False,
+                         early_stopping: Optional[EarlyStopping] = None,
+                         store_dir: Optional[Union[str, Path]] = "results/store",
+                         leaderboard_file: Optional[Union[str, Path]] = "results/leaderboard.md",
+                         concurrency: int = 1, image_cache: Optional[ImageCache] = None,
+                         votes: int = 1, prefetch: int = 8, prefetch_workers: int = 4,
+                         profile: Optional[str] = None, monitor: Optional[Monitor] = None,
+                         verbose: bool = True) -> Optional[EvalResult]:
+    """
+    逐样本评估模型，结果实时追加到结果日志
+
+    元数据逐行读取（启用提前停止时除外，分层顺序需要全部标签），图片在后台线程中预读取。
+
+    Args:
+        task: 评估任务
+        client: LLM客户端
+        provider: 供应商名称（用于区分结果日志）
+        model_name: 模型名称（用于区分结果日志）
+        log_dir: 结果日志目录，相同配置重启时跳过已完成的样本
+        retry_failures_only: 为True时只重跑日志中失败的样本
+        early_stopping: 提前停止策略，None表示评估全部样本
+        store_dir: 列式结果库目录，运行结束后写入本次运行的全部样本结果；None表示不写入
+        leaderboard_file: 写入结果库后重新生成的markdown排行榜；None表示不生成
+        concurrency: 同时进行的模型调用数；结果仍按样本顺序处理（提前停止、日志顺序不受影响）
+        image_cache: 编码后图片的共享缓存（可选）
+        votes: 每个样本的候选回复数，大于1时多数投票（支持API n参数的供应商只上传一次图片）
+        prefetch: 预读取距离，后台线程提前读取并编码之后多少个样本的图片（内存中最多保留这么多张）
+        prefetch_workers: 预读取线程数
+        profile: 分析模式，"cprofile" 或 "sampling"；启用后汇总各阶段耗时，分析结果写在结果日志旁
+        monitor: 实时监控（可选，需已启动），导出请求、错误、延迟与进度指标，并为每个请求写出trace span
+        verbose: 为False时不打印逐样本信息（多个评估并发运行时使用）
+
+    Returns:
+        评估结果；元数据文件不存在时返回None
+    """
+    # --- 加载数据集 ---
+    if not task.dataset_file.exists():
+        print(f"错误: 元数据文件未找到 {task.dataset_file}")
+        return None
+
+    log = print if verbose else lambda *args, **kwargs: None
+    total_samples = dataset_size(task)
+    # 逐行读取、校验元数据，不一次性载入
+    samples = iter_samples(task, log=log)
+
+    # --- 结果日志 ---
+    result_log = ResultLog(log_dir, task.name, task.run_config(provider, model_name, votes))
+    previous_results = result_log.load()
+    log(f"结果日志: {result_log.path}")
+
+    result = EvalResult(task, provider, model_name, result_log, total_samples, 0)
+    result.early_stopping = early_stopping
+    run_monitor = monitor.run(task.name, provider, model_name, result_log.run_id) if monitor is not None else None
+    if monitor is not None and image_cache is not None:
+        monitor.watch_cache("image", image_cache)
+
+    if early_stopping is not None:
+        # 随机分层顺序需要全部标签，保证中途停止时已评估样本的类别分布与整体一致
+        samples = list(samples)
+        order = early_stopping.order([ground_truth for _, _, ground_truth in samples])
+        samples = [samples[j] for j in order]
+        result.pending_total = sum(
+            is_pending(item["file_name"], previous_results, retry_failures_only) for _, item, _ in samples
+        )
+        log(f"日志中已有 {len(previous_results)} 个样本结果，本次需调用模型 {result.pending_total} 个样本")
+        log(f"已启用提前停止，按随机分层顺序评估")
+    else:
+        log(f"日志中已有 {len(previous_results)} 个样本结果，其余样本边读取边评估")
+    log("-" * 30)
+
+    # 后台线程提前 prefetch 个样本读取图片，模型调用不等待磁盘
+    stream = Prefetcher(
+        (
+            (i, item, ground_truth, is_pending(item["file_name"], previous_results, retry_failures_only))
+            for i, item, ground_truth in samples
+        ),
+        lambda sample: load_image(task, sample[1], image_cache),
+        distance=prefetch, workers=prefetch_workers, select=lambda sample: sample[3],
+    )
+    # 已从数据流取出、等待按顺序处理的样本；待调用的样本取出时即发起调用，最多 concurrency 个同时进行
+    ahead = deque()
+    in_flight = {}
+
+    def launch_ahead():
+        while len(in_flight) < max(1, concurrency) and len(ahead) < max(1, concurrency) + prefetch:
+            sample = next(stream, None)
+            if sample is None:
+                break
+            (i, item, ground_truth, pending), prefetched = sample
+            ahead.append((i, item, ground_truth, pending))
+            if pending:
+                in_flight[item["file_name"]] = asyncio.ensure_future(
+                    evaluate_sample(task, client, item, image_cache, votes, prefetched, run_monitor)
+                )
+                if early_stopping is None:
+                    result.pending_total += 1
+
+    # --- 开始评估 ---
+    if profile is not None:
+        result.profiler = RunProfiler(result_log.path.with_suffix(""), profile)
+        result.profiler.start()
+    result.latency.start()
+    try:
+        while True:
+            launch_ahead()
+            if not ahead:
+                break
+            i, item, ground_truth, pending = ahead.popleft()
+            image_path = item["file_name"]
+            record = previous_results.get(image_path)
+            if not pending and record is None:
+                # 仅重跑失败样本时，尚未评估过的样本不参与本次统计
+                continue
+
+            log(f"正在处理样本 {i+1}/{total_samples}: {Path(image_path).name}")
+
+            if pending:
+                record = await in_flight.pop(image_path)
+                result_log.append(record)
+                result.latency.add(record)
+                result.calls_made += 1
+            else:
+                log("  - 已完成，复用结果日志中的记录")
+
+            predicted_label = task.prediction_label(record.get("predicted"))
+            result.add(record, ground_truth, predicted_label)
+            if run_monitor is not None:
+                run_monitor.set_progress(len(result.records), total_samples)
+            if verbose:
+                _print_record(task, record, ground_truth, predicted_label)
+            log("-" * 20)
+
+            if early_stopping is not None:
+                early_stopping.update(image_path, predicted_label == ground_truth)
+                if early_stopping.should_stop():
+                    log(f"提前停止: {early_stopping.reason}")
+                    break
+
+        if in_flight:
+            # 提前停止时已发起的调用通常已经发送（已付费）：等待完成并写入结果日志，续跑时不再重复调用；
+            # 计入调用数，但不计入本次统计，保持已统计样本为分层顺序的前缀
+            records = await asyncio.gather(*in_flight.values())
+            in_flight.clear()
+            for record in records:
+                result_log.append(record)
+                result.latency.add(record)
+                result.calls_made += 1
+    finally:
+        # 只有异常退出时才会剩下未完成的调用，连同预读取一起取消
+        for future in in_flight.values():
+            future.cancel()
+        stream.close()
+        result.latency.stop()
+        # 异常退出时也写入缓冲中的结果
+        result_log.close()
+        if result.profiler is not None:
+            result.profiler.stop()
+
+    if store_dir is not None:
+        # 以结果日志为准，包括之前中断的运行中已完成的样本
+        store = ResultStore(store_dir)
+        store_path = store.write_run(result_log.run_config, result_log.run_id, list(result_log.load().values()))
+        log(f"结果已写入结果库: {store_path}")
+        if leaderboard_file is not None:
+            log(f"排行榜已更新: {write_leaderboard(store, leaderboard_file)}")
+
+    return result
+
+
+def print_report(result: EvalResult, bootstrap_resamples: int = 2000, bootstrap_seed: Optional[int] = 42):
+    """
+    打印评估统计报告，延迟统计同时导出到结果日志旁的 .latency.json 文件
+
+    Args:
+        result: run_evaluation的返回值
+        bootstrap_resamples: 分层Bootstrap重采样次数
+        bootstrap_seed: Bootstrap随机种子
+    """
+    task = result.task
+    if not result.records:
+        print("没有可评估的样本。")
+        return
+
+    cm = result.confusion_matrix()
+    avg_time = result.total_time / result.valid_predictions if result.valid_predictions > 0 else 0
+
+    print("\n" + "=" * 50)
+    print(f"评估完成 - {task.name} 统计报告")
+    print("=" * 50)
+
+    # 总体统计
+    print(f"\n【总体统计】")
+    print(f"总样本数: {result.total_samples}")
+    print(f"已评估样本数: {cm.total}")
+    print(f"正确预测数: {int(cm.correct.sum())}")
+    print(f"总体准确率: {cm.accuracy() * 100:.2f}%")
+    print(f"有效预测数: {result.valid_predictions}")
+    print(f"总耗时: {result.total_time:.2f}秒")
+    print(f"平均耗时: {avg_time:.2f}秒/样本")
+    print_summary(cm)
+
+    # 延迟与吞吐（仅本次实际调用模型的样本）
+    if result.latency.requests:
+        print(f"\n【延迟与吞吐】")
+        print_latency_report(result.latency)
+        latency_file = result.latency.export(
+            result.log_path.with_suffix(".latency.json"),
+            {"task": task.name, "provider": result.provider, "model_name": result.model_name, "run_id": result.run_id},
+        )
+        print(f"延迟统计已保存到: {latency_file}")
+
+    # 阶段耗时与分析器输出
+    if result.profiler is not None:
+        print(f"\n【阶段耗时】")
+        print_stage_report(result.profiler.stages)
+        for path in result.profiler.outputs:
+            print(f"分析结果已保存到: {path}")
+
+    # 多数投票
+    if any("votes" in record for record in result.records):
+        print(f"\n【多数投票】")
+        print_voting_report(task, result.records, result.y_true)
+
+    # 提前停止
+    if result.early_stopping is not None:
+        summary = result.early_stopping.summary()
+        low, high = summary["ci"]
+        print(f"\n【提前停止】")
+        print(f"停止原因: {summary['reason'] or '未触发，已评估全部样本'}")
+        print(f"准确率置信区间: [{low * 100:.2f}%, {high * 100:.2f}%]")
+        print(f"本次模型调用数: {result.calls_made}/{result.pending_total}")
+        print(f"节省调用数: {result.calls_saved}")
+
+    # 分层Bootstrap置信区间（各类别内部重采样，结果由随机种子固定）
+    print(f"\n【均衡统计 (分层Bootstrap置信区间)】")
+    bootstrap_result = stratified_bootstrap(
+        result.y_true, result.y_pred, task.labels, n_resamples=bootstrap_resamples, seed=bootstrap_seed
+    )
+    print_bootstrap_report(bootstrap_result, task.display_names)
+
+    # 各类别详细统计
+    print(f"\n【各类别统计】")
+    print("-" * 30)
+    print_class_report(cm, task.display_names)
+
+    grouped_cm = None
+    if task.groups:
+        grouped_cm = cm.group(task.groups)
+        print(f"\n【分组统计 ({' vs '.join(task.groups)})】")
+        print("-" * 40)
+        print_class_report(grouped_cm, {
+            name: f"{name} ({' + '.join(members)})" for name, members in task.groups.items() if len(members) > 1
+        })
+        print(f"\n分组总体准确率: {grouped_cm.accuracy() * 100:.2f}%")
+        print(f"分组均衡准确率: {grouped_cm.balanced_accuracy() * 100:.2f}%")
+
+    # 混淆矩阵
+    print(f"\n【混淆矩阵】")
+    print("-" * 30)
+    print("行: 真实标签, 列: 预测标签")
+    print(cm.format_table(task.display_names))
+    if grouped_cm is not None:
+        print()
+        print(grouped_cm.format_table())
+
+    if len(task.labels) == 2:
+        positive, negative = (task.display_name(label) for label in task.labels)
+        tp = int(cm.matrix[0, 0])
+        fn = int(cm.matrix[0, 1:].sum())
+        fp = int(cm.matrix[1, 0])
+        tn = int(cm.matrix[1, 1])
+        print()
+        print(f"真正例 (TP): {tp} - 实际{positive}，预测{positive}")
+        print(f"假负例 (FN): {fn} - 实际{positive}，预测{negative}或无效")
+        print(f"假正例 (FP): {fp} - 实际{negative}，预测{positive}")
+        print(f"真负例 (TN): {tn} - 实际{negative}，预测{negative}")
+
+        # 敏感性和特异性
+        recall = cm.recall()
+        print(f"\n敏感性 (Sensitivity/Recall): {recall[0] * 100:.2f}%")
+        print(f"特异性 (Specificity): {recall[1] * 100:.2f}%")
+
+    if task.debug_fields:
+        # 保存调试信息到文件
+        debug_info = [
+            {
+                "file_name": record["sample_id"],
+                "ground_truth": record["ground_truth"],
+                "predicted": record.get("predicted"),
+                **{field: record.get(field) for field in task.debug_fields},
+                "correct": predicted_label == ground_truth,
+            }
+            for record, ground_truth, predicted_label in zip(result.records, result.y_true, result.y_pred)
+            if record["status"] == STATUS_OK
+        ]
+        debug_file = f"debug_{task.name.replace('-', '_')}_{int(time.time())}.json"
+        with open(debug_file, "w", encoding="utf-8") as f:
+            json.dump(debug_info, f, ensure_ascii=False, indent=2)
+
+        print(f"\n调试信息已保存到: {debug_file}")
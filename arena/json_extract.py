@@ -0,0 +1,65 @@
+import json
+import re
+from typing import Iterable, Optional
+
+_decoder = json.JSONDecoder()
+# JSON对象的开头："{" 之后（可有空白）必须是字符串键或 "}"，先过滤掉推理文字中的普通花括号
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+
+def _find_matching(value, expected_keys: frozenset) -> Optional[dict]:
+    """
+    在解析出的JSON值中查找包含全部期望字段的对象（广度优先，外层优先）
+
+    Args:
+        value: json解析结果
+        expected_keys: 期望字段集合
+
+    Returns:
+        匹配的对象，找不到时返回None
+    """
+    queue = [value]
+    while queue:
+        current = queue.pop(0)
+        if isinstance(current, dict):
+            if expected_keys <= current.keys():
+                return current
+            queue.extend(current.values())
+        elif isinstance(current, list):
+            queue.extend(current)
+    return None
+
+
+def extract_json(response: str, expected_keys: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    从模型响应中提取JSON对象
+
+    只扫描一遍响应：从每个可能是对象开头的 "{" 处用 JSONDecoder.raw_decode 尝试解析，
+    解析成功后直接跳到该对象末尾继续扫描，因此代码块标记、前后的推理文字
+    和任意深度的嵌套都不需要额外处理。
+
+    Args:
+        response: 模型响应文本
+        expected_keys: 期望包含的字段；给定时只接受包含全部字段的对象（可以嵌套在外层对象中）
+
+    Returns:
+        最后一个符合要求的对象（推理模型的最终答案通常在最后），找不到时返回None
+    """
+    if not response:
+        return None
+
+    expected = frozenset(expected_keys or ())
+    found = None
+    candidate = _OBJECT_START.search(response)
+    while candidate is not None:
+        try:
+            value, end = _decoder.raw_decode(response, candidate.start())
+        except json.JSONDecodeError:
+            candidate = _OBJECT_START.search(response, candidate.start() + 1)
+            continue
+
+        match = _find_matching(value, expected) if expected else value
+        if isinstance(match, dict):
+            found = match
+        candidate = _OBJECT_START.search(response, end)
+    return found
@@ -0,0 +1,259 @@
+import json
+import math
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from .metrics import format_rows
+from .results_log import STATUS_ERROR
+
+# 各阶段：读取编码图片、等待并发名额、等待模型响应、解析响应、单个样本总耗时
+STAGES = ("encode", "queue", "network", "parse", "total")
+PERCENTILES = (50, 90, 95, 99)
+
+
+class LatencyHistogram:
+    """
+    HDR风格的延迟直方图
+
+    桶边界按固定相对精度呈几何增长，任意分位数的相对误差不超过 precision，
+    内存占用只与数值范围的对数有关，与样本数无关，可以合并多个直方图。
+    """
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-6):
+        """
+        初始化直方图
+
+        Args:
+            precision: 相对精度（0.01表示分位数误差不超过1%）
+            lowest: 可区分的最小值（秒），更小的值计入第一个桶
+        """
+        self.precision = precision
+        self.lowest = lowest
+        self._log_base = math.log1p(precision)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, value: float) -> int:
+        """数值所在的桶下标"""
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _bucket_value(self, index: np.ndarray) -> np.ndarray:
+        """桶的代表值（桶区间的几何中点）"""
+        return self.lowest * np.exp((np.asarray(index) - 0.5) * self._log_base)
+
+    def record(self, value: float):
+        """
+        记录一个数值
+
+        Args:
+            value: 耗时（秒）
+        """
+        index = self._bucket(value)
+        if index >= len(self.counts):
+            self.counts = np.pad(self.counts, (0, index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        合并另一个相同精度的直方图
+
+        Args:
+            other: 另一个直方图
+        """
+        if (other.precision, other.lowest) != (self.precision, self.lowest):
+            raise ValueError("只能合并精度和最小值相同的直方图")
+        size = max(len(self.counts), len(other.counts))
+        self.counts = np.pad(self.counts, (0, size - len(self.counts)))
+        self.counts[:len(other.counts)] += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        """平均值"""
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        分位数
+
+        Args:
+            q: 百分位（0-100）
+
+        Returns:
+            分位数（秒），没有数据时为0
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        if index == 0:
+            return self.min
+        # 代表值限制在实际观测范围内，p0/p100分别等于最小/最大值
+        return float(min(max(self._bucket_value(index), self.min), self.max))
+
+    def to_dict(self) -> dict:
+        """摘要（分位数、均值、极值）"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            **{f"p{q}": self.percentile(q) for q in PERCENTILES},
+        }
+
+
+class LatencyStats:
+    """
+    一次评估运行的延迟与吞吐统计
+
+    分阶段记录每个样本的耗时，并用单调时钟记录整个运行的墙钟时间；
+    请求并发时吞吐按墙钟时间计算，不会因为各请求耗时相加而被低估。
+    """
+
+    def __init__(self, precision: float = 0.01):
+        """
+        初始化统计
+
+        Args:
+            precision: 直方图相对精度
+        """
+        self.stages: Dict[str, LatencyHistogram] = {stage: LatencyHistogram(precision) for stage in STAGES}
+        self.requests = 0
+        self.failures = 0
+        self.cached = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def start(self):
+        """开始计时（重复调用不会重置）"""
+        if self._started is None:
+            self._started = time.perf_counter()
+
+    def stop(self):
+        """结束计时"""
+        self._finished = time.perf_counter()
+
+    def set_interval(self, started: float, finished: float):
+        """
+        按外部时间戳设置计时区间（同一时钟即可），用于合并多个进程的统计
+
+        Args:
+            started: 开始时间
+            finished: 结束时间
+        """
+        self._started = started
+        self._finished = finished
+
+    @property
+    def wall_time(self) -> float:
+        """墙钟时间（秒）"""
+        if self._started is None:
+            return 0.0
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    def add(self, record: dict):
+        """
+        加入一个样本记录中的耗时与token用量
+
+        Args:
+            record: evaluate_sample返回的样本记录（来自响应缓存的记录只计数，不计入延迟与吞吐）
+        """
+        if record.get("cached"):
+            self.cached += 1
+            return
+        self.requests += 1
+        if record.get("status") == STATUS_ERROR:
+            self.failures += 1
+        for stage, seconds in record.get("timings", {}).items():
+            if stage in self.stages:
+                self.stages[stage].record(seconds)
+        usage = record.get("usage") or {}
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+
+    def throughput(self) -> dict:
+        """每秒请求数与每秒token数"""
+        wall = self.wall_time
+        return {
+            "requests_per_sec": self.requests / wall if wall > 0 else 0.0,
+            "completion_tokens_per_sec": self.completion_tokens / wall if wall > 0 else 0.0,
+            "total_tokens_per_sec": (self.prompt_tokens + self.completion_tokens) / wall if wall > 0 else 0.0,
+        }
+
+    def to_dict(self) -> dict:
+        """可导出为JSON的统计结果"""
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "cached": self.cached,
+            "wall_time": self.wall_time,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            **self.throughput(),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+        }
+
+    def export(self, path: Union[str, Path], extra: Optional[dict] = None) -> Path:
+        """
+        导出统计结果到JSON文件
+
+        Args:
+            path: 输出文件路径
+            extra: 额外写入的字段（例如供应商与模型名称）
+
+        Returns:
+            输出文件路径
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**(extra or {}), **self.to_dict()}, f, ensure_ascii=False, indent=2)
+        return path
+
+
+def print_latency_report(stats: LatencyStats):
+    """
+    打印延迟分位数与吞吐
+
+    Args:
+        stats: 延迟统计
+    """
+    throughput = stats.throughput()
+    print(f"模型调用数: {stats.requests}（失败 {stats.failures}）")
+    if stats.cached:
+        print(f"响应缓存命中: {stats.cached}")
+    print(f"墙钟时间: {stats.wall_time:.2f}秒")
+    print(f"吞吐: {throughput['requests_per_sec']:.2f} 请求/秒")
+    if stats.completion_tokens:
+        print(f"输出token: {stats.completion_tokens}，{throughput['completion_tokens_per_sec']:.1f} token/秒")
+        print(f"总token: {stats.prompt_tokens + stats.completion_tokens}，"
+              f"{throughput['total_tokens_per_sec']:.1f} token/秒")
+
+    names = {"encode": "编码", "queue": "排队", "network": "网络", "parse": "解析", "total": "总计"}
+    # 表头与各行按显示宽度对齐（中文字符占两格）
+    table = [["阶段"] + [f"p{q}" for q in PERCENTILES] + ["平均", "最大"]]
+    for stage, histogram in stats.stages.items():
+        if histogram.count == 0:
+            continue
+        summary = histogram.to_dict()
+        values = [summary[f"p{q}"] for q in PERCENTILES] + [summary["mean"], summary["max"]]
+        table.append([names.get(stage, stage)] + [f"{value * 1000:.1f}ms" for value in values])
+    print(format_rows(table))
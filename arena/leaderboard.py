@@ -0,0 +1,337 @@
+import math
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+import pyarrow.compute as pc
+
+from .metrics import format_rows
+from .results_store import ResultStore, RUN_KEYS
+
+
+@lru_cache(maxsize=None)
+def _binomial_tails(size: int) -> np.ndarray:
+    """
+    二项分布 Bin(n, 1/2) 的累积概率表（精确计算，按大小缓存）
+
+    Args:
+        size: 表的大小
+
+    Returns:
+        (size, size) 数组，tails[n, k] = P(X <= k)，n < size
+    """
+    tails = np.ones((size, size))
+    for n in range(size):
+        cumulative = 0
+        for k in range(n + 1):
+            cumulative += math.comb(n, k)
+            tails[n, k] = cumulative / 2 ** n
+    return tails
+
+
+def _erfc(x: np.ndarray) -> np.ndarray:
+    """互补误差函数（Chebyshev有理近似，相对误差小于1.2e-7），x >= 0"""
+    t = 1.0 / (1.0 + 0.5 * x)
+    poly = -x * x - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    return t * np.exp(poly)
+
+
+def mcnemar_pvalues(b: np.ndarray, c: np.ndarray, exact_below: int = 50) -> np.ndarray:
+    """
+    McNemar检验的p值
+
+    不一致样本数少于 exact_below 时使用精确二项检验（查缓存的累积概率表），
+    否则使用带连续性校正的卡方近似，全部按数组计算。
+
+    Args:
+        b: 模型A正确、模型B错误的样本数
+        c: 模型A错误、模型B正确的样本数
+        exact_below: 使用精确检验的不一致样本数上限
+
+    Returns:
+        与b形状相同的p值数组（没有不一致样本时为1）
+    """
+    b = np.asarray(b, dtype=np.int64)
+    c = np.asarray(c, dtype=np.int64)
+    n = b + c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = np.where(n > 0, (np.abs(b - c) - 1).clip(min=0) ** 2 / n, 0.0)
+    # 自由度为1的卡方分布生存函数
+    pvalues = _erfc(np.sqrt(chi2 / 2))
+
+    # 精确检验：不一致样本上的双侧二项检验
+    small = n < exact_below
+    tails = _binomial_tails(exact_below)
+    exact = np.minimum(1.0, 2 * tails[np.where(small, n, 0), np.where(small, np.minimum(b, c), 0)])
+    pvalues = np.where(small, exact, pvalues)
+    pvalues[n == 0] = 1.0
+    return pvalues
+
+
+def bradley_terry(wins: np.ndarray, prior: float = 0.5, max_iter: int = 1000, tol: float = 1e-9) -> np.ndarray:
+    """
+    Bradley-Terry模型强度（MM算法，全部向量化）
+
+    Args:
+        wins: wins[i, j] 为模型i胜过模型j的次数
+        prior: 每对有比较的模型之间各加的虚拟胜场，避免全胜/全负的模型强度发散
+        max_iter: 最大迭代次数
+        tol: 收敛阈值（对数强度的最大变化）
+
+    Returns:
+        各模型的强度，几何平均为1
+    """
+    wins = np.asarray(wins, dtype=float)
+    if len(wins) == 0:
+        return np.ones(0)
+    compared = (wins + wins.T) > 0
+    wins = wins + prior * compared
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+
+    strength = np.ones(len(wins))
+    for _ in range(max_iter):
+        denominator = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        updated = np.where(denominator > 0, total_wins / np.where(denominator > 0, denominator, 1), strength)
+        updated = updated / np.exp(np.log(updated).mean())
+        if np.max(np.abs(np.log(updated) - np.log(strength))) < tol:
+            strength = updated
+            break
+        strength = updated
+    return strength
+
+
+def elo_ratings(strength: np.ndarray, base: float = 1000.0, scale: float = 400.0) -> np.ndarray:
+    """
+    Bradley-Terry强度换算为Elo分数
+
+    Args:
+        strength: bradley_terry的返回值
+        base: 平均水平对应的分数
+        scale: 强度相差10倍对应的分差
+
+    Returns:
+        Elo分数
+    """
+    return base + scale * np.log10(strength)
+
+
+class Leaderboard:
+    """
+    同一任务上多个模型（运行）的排行榜
+
+    由结果库构建 模型×样本 的正确性矩阵，两两比较只看双方都评估过的样本，
+    全部通过矩阵乘法计算，模型数和样本数增加时仍然很快。
+    """
+
+    def __init__(self, task: str, entrants: List[dict], correct: np.ndarray, evaluated: np.ndarray,
+                 sample_ids: np.ndarray):
+        """
+        初始化排行榜（一般通过 from_store 构建）
+
+        Args:
+            task: 任务名称
+            entrants: 每个参赛运行的信息（provider、model_name、prompt_version、run_id）
+            correct: (模型数, 样本数) 布尔矩阵，是否预测正确
+            evaluated: (模型数, 样本数) 布尔矩阵，是否评估过该样本
+            sample_ids: 样本ID
+        """
+        self.task = task
+        self.entrants = entrants
+        self.correct = correct & evaluated
+        self.evaluated = evaluated
+        self.sample_ids = sample_ids
+
+        right = self.correct.astype(np.float32)
+        wrong = (evaluated & ~correct).astype(np.float32)
+        both = evaluated.astype(np.float32)
+        # wins[i, j]: 两者都评估过、i正确而j错误的样本数
+        self.wins = np.rint(right @ wrong.T).astype(np.int64)
+        self.common = np.rint(both @ both.T).astype(np.int64)
+        self.strength = bradley_terry(self.wins)
+        self.elo = elo_ratings(self.strength)
+
+    @classmethod
+    def from_store(cls, store: ResultStore, task: str) -> "Leaderboard":
+        """
+        由结果库中某个任务的全部运行构建排行榜
+
+        Args:
+            store: 结果库
+            task: 任务名称
+
+        Returns:
+            排行榜
+        """
+        table = store.query(task=task, columns=RUN_KEYS + ["sample_id", "correct"])
+        # 字典编码得到运行与样本的整数下标，避免在Python层逐行处理字符串
+        run_codes = pc.dictionary_encode(table["run_id"]).combine_chunks()
+        sample_codes = pc.dictionary_encode(table["sample_id"]).combine_chunks()
+        run_ids = run_codes.dictionary.to_pylist()
+        sample_ids = np.asarray(sample_codes.dictionary.to_pylist(), dtype=object)
+
+        correct = np.zeros((len(run_ids), len(sample_ids)), dtype=bool)
+        evaluated = np.zeros_like(correct)
+        rows = run_codes.indices.to_numpy()
+        columns = sample_codes.indices.to_numpy()
+        evaluated[rows, columns] = True
+        correct[rows, columns] = pc.fill_null(table["correct"], False).to_numpy(zero_copy_only=False)
+
+        info = {row["run_id"]: row for row in table.select(RUN_KEYS).group_by(RUN_KEYS).aggregate([]).to_pylist()}
+        entrants = [info[run_id] for run_id in run_ids]
+        return cls(task, entrants, correct, evaluated, sample_ids)
+
+    @property
+    def accuracy(self) -> np.ndarray:
+        """各模型在自己评估过的样本上的准确率"""
+        evaluated = self.evaluated.sum(axis=1)
+        return self.correct.sum(axis=1) / np.maximum(evaluated, 1)
+
+    def win_rates(self) -> np.ndarray:
+        """
+        两两胜率：只看结果不一致的样本，i正确j错误的比例
+
+        Returns:
+            (模型数, 模型数) 矩阵，没有不一致样本时为NaN
+        """
+        discordant = self.wins + self.wins.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(discordant > 0, self.wins / discordant, np.nan)
+
+    def mcnemar(self) -> np.ndarray:
+        """两两McNemar检验的p值矩阵"""
+        return mcnemar_pvalues(self.wins, self.wins.T)
+
+    def ranking(self) -> np.ndarray:
+        """按Elo分数从高到低的模型下标"""
+        return np.argsort(-self.elo, kind="stable")
+
+    def rows(self) -> List[dict]:
+        """
+        排行榜各行（按Elo分数排序）
+
+        Returns:
+            每个模型一个字典；vs_next_p 为与下一名的McNemar检验p值
+        """
+        order = self.ranking()
+        pvalues = self.mcnemar()
+        evaluated = self.evaluated.sum(axis=1)
+        rows = []
+        for rank, i in enumerate(order):
+            next_p = float(pvalues[i, order[rank + 1]]) if rank + 1 < len(order) else None
+            rows.append({
+                "rank": rank + 1,
+                **self.entrants[i],
+                "samples": int(evaluated[i]),
+                "accuracy": float(self.accuracy[i]),
+                "elo": float(self.elo[i]),
+                "vs_next_p": next_p,
+            })
+        return rows
+
+    def to_markdown(self, latency: Optional[dict] = None, alpha: float = 0.05) -> str:
+        """
+        生成markdown排行榜
+
+        Args:
+            latency: run_id -> p95延迟（秒），可由 ResultStore.summary 得到
+            alpha: McNemar检验的显著性水平
+
+        Returns:
+            markdown文本
+        """
+        latency = latency or {}
+        lines = [
+            f"## {self.task}",
+            "",
+            f"模型数: {len(self.entrants)}，样本数: {len(self.sample_ids)}",
+            "",
+            "| 排名 | 模型 | 供应商 | 提示词版本 | 样本数 | 准确率 | Elo | p95延迟 | 与下一名差异显著 |",
+            "| --- | --- | --- | --- | --- | --- | --- | --- | --- |",
+        ]
+        for row in self.rows():
+            p95 = latency.get(row["run_id"])
+            if row["vs_next_p"] is None:
+                significant = "-"
+            else:
+                significant = f"{'是' if row['vs_next_p'] < alpha else '否'} (p={row['vs_next_p']:.3g})"
+            lines.append(
+                f"| {row['rank']} | {row['model_name']} | {row['provider']} | {row['prompt_version']} "
+                f"| {row['samples']} | {row['accuracy'] * 100:.2f}% | {row['elo']:.0f} "
+                f"| {f'{p95:.2f}秒' if p95 is not None else '-'} | {significant} |"
+            )
+
+        # 两两胜率矩阵（行对列，只看结果不一致的样本）
+        order = self.ranking()
+        rates = self.win_rates()
+        pvalues = self.mcnemar()
+        lines += ["", "两两胜率（行模型对列模型，只统计结果不一致的样本；* 表示McNemar检验显著）", ""]
+        lines.append("| | " + " | ".join(str(rank + 1) for rank in range(len(order))) + " |")
+        lines.append("| --- " * (len(order) + 1) + "|")
+        for rank, i in enumerate(order):
+            cells = []
+            for j in order:
+                if i == j or np.isnan(rates[i, j]):
+                    cells.append("-")
+                else:
+                    cells.append(f"{rates[i, j] * 100:.0f}%{'*' if pvalues[i, j] < alpha else ''}")
+            lines.append(f"| {rank + 1}. {self.entrants[i]['model_name']} | " + " | ".join(cells) + " |")
+        return "\n".join(lines)
+
+
+def write_leaderboard(store: ResultStore, path: Union[str, Path] = "results/leaderboard.md",
+                      tasks: Optional[List[str]] = None) -> Path:
+    """
+    重新生成markdown排行榜文件
+
+    Args:
+        store: 结果库
+        path: 输出文件路径
+        tasks: 包含的任务，默认为结果库中的全部任务
+
+    Returns:
+        输出文件路径
+    """
+    if tasks is None:
+        tasks = store.tasks()
+
+    sections = [
+        "# LLM Arena 排行榜",
+        "",
+        f"由结果库自动生成（{time.strftime('%Y-%m-%d %H:%M:%S')}），请勿手动编辑。"
+        "Elo分数由Bradley-Terry模型拟合：每个样本上一方正确、另一方错误计为一场胜负。",
+    ]
+    boards = []
+    for task in tasks:
+        leaderboard = Leaderboard.from_store(store, task)
+        if not leaderboard.entrants:
+            continue
+        latency = {row["run_id"]: row["latency_p95"] for row in store.summary(task=task)}
+        boards += ["", leaderboard.to_markdown(latency)]
+    sections += boards or ["", "没有运行记录。"]
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(sections) + "\n", encoding="utf-8")
+    return path
+
+
+def print_leaderboard(leaderboard: Leaderboard):
+    """
+    打印排行榜
+
+    Args:
+        leaderboard: 排行榜
+    """
+    table = [["排名", "模型", "样本数", "准确率", "Elo", "与下一名p值"]]
+    for row in leaderboard.rows():
+        table.append([
+            str(row["rank"]), f"{row['model_name']} ({row['provider']}, {row['prompt_version']})",
+            str(row["samples"]), f"{row['accuracy'] * 100:.2f}%", f"{row['elo']:.0f}",
+            f"{row['vs_next_p']:.3g}" if row["vs_next_p"] is not None else "-",
+        ])
+    print(format_rows(table))
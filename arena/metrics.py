@@ -0,0 +1,301 @@
+from collections.abc import Hashable
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+def encode_labels(values: Sequence, labels: Sequence[str]) -> np.ndarray:
+    """
+    将标签序列编码为整数数组
+
+    Args:
+        values: 标签序列，可以包含None或不在labels中的值
+        labels: 类别列表
+
+    Returns:
+        整数编码数组，不在labels中的值编码为len(labels)
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iu":
+        return values.astype(np.intp, copy=False)
+
+    k = len(labels)
+    index = {label: i for i, label in enumerate(labels)}
+    try:
+        # map在C层逐个查表，百万级样本也只需零点几秒
+        return np.fromiter(map(index.get, values, repeat(k)), dtype=np.intp, count=len(values))
+    except TypeError:
+        # 模型输出了不可哈希的值（如列表），逐个处理
+        return np.fromiter(
+            (index.get(v, k) if isinstance(v, Hashable) else k for v in values),
+            dtype=np.intp, count=len(values)
+        )
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """分母为0时结果为0的逐元素除法"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+class ConfusionMatrix:
+    """
+    混淆矩阵及其派生指标
+
+    矩阵形状为 (K, K+1)：行为真实类别，列为预测类别，最后一列为无效预测。
+    """
+
+    def __init__(self, matrix: np.ndarray, labels: Sequence[str]):
+        """
+        初始化混淆矩阵
+
+        Args:
+            matrix: 形状为 (K, K+1) 的计数矩阵
+            labels: K个类别名称
+        """
+        self.labels = list(labels)
+        self.matrix = np.asarray(matrix, dtype=np.int64)
+        k = len(self.labels)
+        if self.matrix.shape != (k, k + 1):
+            raise ValueError(f"混淆矩阵形状应为 {(k, k + 1)}，实际为 {self.matrix.shape}")
+
+    @classmethod
+    def from_labels(cls, y_true: Sequence, y_pred: Sequence, labels: Sequence[str]) -> "ConfusionMatrix":
+        """
+        由真实标签与预测标签构建混淆矩阵
+
+        Args:
+            y_true: 真实标签序列（必须都在labels中）
+            y_pred: 预测标签序列，无效预测可用None表示
+            labels: 类别列表
+
+        Returns:
+            混淆矩阵
+        """
+        k = len(labels)
+        true_codes = encode_labels(y_true, labels)
+        pred_codes = encode_labels(y_pred, labels)
+        if true_codes.shape != pred_codes.shape:
+            raise ValueError("y_true与y_pred长度不一致")
+        if np.any(true_codes >= k):
+            raise ValueError("y_true中存在不在类别列表中的标签")
+        return cls.from_codes(true_codes, pred_codes, k, labels)
+
+    @classmethod
+    def from_codes(cls, true_codes: np.ndarray, pred_codes: np.ndarray, k: int,
+                   labels: Optional[Sequence[str]] = None) -> "ConfusionMatrix":
+        """
+        由整数编码构建混淆矩阵（预测编码k表示无效预测）
+
+        Args:
+            true_codes: 真实类别编码
+            pred_codes: 预测类别编码
+            k: 类别数
+            labels: 类别名称，默认使用编码本身
+
+        Returns:
+            混淆矩阵
+        """
+        flat = np.bincount(true_codes * (k + 1) + pred_codes, minlength=k * (k + 1))
+        return cls(flat.reshape(k, k + 1), labels if labels is not None else [str(i) for i in range(k)])
+
+    # --- 基础计数 ---
+
+    @property
+    def total(self) -> int:
+        """样本总数"""
+        return int(self.matrix.sum())
+
+    @property
+    def support(self) -> np.ndarray:
+        """各类别真实样本数"""
+        return self.matrix.sum(axis=1)
+
+    @property
+    def predicted(self) -> np.ndarray:
+        """各类别被预测的次数"""
+        return self.matrix[:, :-1].sum(axis=0)
+
+    @property
+    def correct(self) -> np.ndarray:
+        """各类别预测正确的次数"""
+        return np.diagonal(self.matrix[:, :-1])
+
+    @property
+    def invalid(self) -> int:
+        """无效预测数"""
+        return int(self.matrix[:, -1].sum())
+
+    # --- 派生指标 ---
+
+    def precision(self) -> np.ndarray:
+        """各类别精确率"""
+        return _safe_divide(self.correct, self.predicted)
+
+    def recall(self) -> np.ndarray:
+        """各类别召回率"""
+        return _safe_divide(self.correct, self.support)
+
+    def f1(self) -> np.ndarray:
+        """各类别F1分数"""
+        precision = self.precision()
+        recall = self.recall()
+        return _safe_divide(2 * precision * recall, precision + recall)
+
+    def accuracy(self) -> float:
+        """总体准确率（无效预测计为错误）"""
+        return float(_safe_divide(self.correct.sum(), self.total))
+
+    def balanced_accuracy(self) -> float:
+        """均衡准确率：有样本的类别召回率的平均值"""
+        present = self.support > 0
+        if not present.any():
+            return 0.0
+        return float(self.recall()[present].mean())
+
+    def macro(self) -> Dict[str, float]:
+        """宏平均精确率/召回率/F1（只统计有样本的类别）"""
+        present = self.support > 0
+        if not present.any():
+            return {"precision": 0.0, "recall": 0.0, "f1": 0.0}
+        return {
+            "precision": float(self.precision()[present].mean()),
+            "recall": float(self.recall()[present].mean()),
+            "f1": float(self.f1()[present].mean()),
+        }
+
+    def micro(self) -> Dict[str, float]:
+        """微平均精确率/召回率/F1（无效预测只影响召回率）"""
+        correct = self.correct.sum()
+        precision = float(_safe_divide(correct, self.predicted.sum()))
+        recall = float(_safe_divide(correct, self.total))
+        f1 = float(_safe_divide(2 * precision * recall, precision + recall))
+        return {"precision": precision, "recall": recall, "f1": f1}
+
+    def per_class(self) -> Dict[str, dict]:
+        """
+        各类别统计
+
+        Returns:
+            类别 -> {total, predicted, correct, precision, recall, f1}
+        """
+        support, predicted, correct = self.support, self.predicted, self.correct
+        precision, recall, f1 = self.precision(), self.recall(), self.f1()
+        return {
+            label: {
+                "total": int(support[i]),
+                "predicted": int(predicted[i]),
+                "correct": int(correct[i]),
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+    def group(self, groups: Dict[str, List[str]]) -> "ConfusionMatrix":
+        """
+        将类别合并为分组后的混淆矩阵，例如 upstream vs not-upstream
+
+        Args:
+            groups: 分组名 -> 该组包含的类别，未出现在任何分组中的类别被丢弃
+
+        Returns:
+            分组后的混淆矩阵
+        """
+        k, g = len(self.labels), len(groups)
+        index = {label: i for i, label in enumerate(self.labels)}
+        # 类别到分组的0/1映射矩阵，最后一行/列保留无效预测
+        mapping = np.zeros((k + 1, g + 1), dtype=np.int64)
+        for j, members in enumerate(groups.values()):
+            for label in members:
+                mapping[index[label], j] = 1
+        mapping[k, g] = 1
+        grouped = mapping[:k, :g].T @ self.matrix @ mapping
+        return ConfusionMatrix(grouped, list(groups.keys()))
+
+    def to_dict(self) -> dict:
+        """导出为可JSON序列化的字典"""
+        return {
+            "labels": self.labels,
+            "matrix": self.matrix.tolist(),
+            "accuracy": self.accuracy(),
+            "balanced_accuracy": self.balanced_accuracy(),
+            "macro": self.macro(),
+            "micro": self.micro(),
+            "per_class": self.per_class(),
+        }
+
+    def format_table(self, display_names: Optional[Dict[str, str]] = None) -> str:
+        """
+        格式化完整混淆矩阵
+
+        Args:
+            display_names: 类别显示名称
+
+        Returns:
+            文本表格，行为真实标签，列为预测标签
+        """
+        display_names = display_names or {}
+        names = [display_names.get(label, label) for label in self.labels] + ["无效"]
+        header = ["真实\\预测"] + names
+        rows = [[names[i]] + [str(v) for v in self.matrix[i]] for i in range(len(self.labels))]
+        return format_rows([header] + rows)
+
+
+def _display_width(text: str) -> int:
+    """终端显示宽度（中文字符占两格）"""
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+
+
+def format_rows(rows: List[List[str]]) -> str:
+    """
+    按列对齐的文本表格
+
+    Args:
+        rows: 单元格文本，第一行为表头
+
+    Returns:
+        文本表格
+    """
+    widths = [max(_display_width(row[c]) for row in rows) for c in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell + " " * (widths[c] - _display_width(cell)) for c, cell in enumerate(row)).rstrip()
+        for row in rows
+    )
+
+
+def print_class_report(cm: ConfusionMatrix, display_names: Optional[Dict[str, str]] = None):
+    """
+    按评估脚本的格式打印各类别统计
+
+    Args:
+        cm: 混淆矩阵
+        display_names: 类别显示名称
+    """
+    display_names = display_names or {}
+    for label, stats in cm.per_class().items():
+        print(f"\n类别: {display_names.get(label, label)}")
+        print(f"  实际样本数: {stats['total']}")
+        print(f"  预测样本数: {stats['predicted']}")
+        print(f"  正确预测数: {stats['correct']}")
+        print(f"  召回率 (Recall): {stats['recall'] * 100:.2f}%")
+        print(f"  精确率 (Precision): {stats['precision'] * 100:.2f}%")
+        print(f"  F1分数: {stats['f1'] * 100:.2f}")
+
+
+def print_summary(cm: ConfusionMatrix):
+    """
+    打印宏/微平均与均衡准确率
+
+    Args:
+        cm: 混淆矩阵
+    """
+    macro, micro = cm.macro(), cm.micro()
+    print(f"均衡准确率 (Balanced Accuracy): {cm.balanced_accuracy() * 100:.2f}%")
+    print(f"宏平均 - 精确率: {macro['precision'] * 100:.2f}%  召回率: {macro['recall'] * 100:.2f}%  F1: {macro['f1'] * 100:.2f}")
+    print(f"微平均 - 精确率: {micro['precision'] * 100:.2f}%  召回率: {micro['recall'] * 100:.2f}%  F1: {micro['f1'] * 100:.2f}")
+    if cm.invalid:
+        print(f"无效预测数: {cm.invalid}")
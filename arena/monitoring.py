@@ -0,0 +1,372 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+from .results_log import STATUS_ERROR
+
+# 请求延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    """Prometheus标签值转义"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """带标签的指标（counter 或 gauge）"""
+
+    def __init__(self, name: str, help_text: str, kind: str, labels: Sequence[str] = ()):
+        """
+        初始化指标
+
+        Args:
+            name: 指标名称
+            help_text: 说明
+            kind: "counter" 或 "gauge"
+            labels: 标签名称
+        """
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        """增加（gauge可为负数）"""
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def set(self, *labels, value: float):
+        """设置当前值（仅gauge）"""
+        with self._lock:
+            self.values[labels] = value
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self.values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}" for labels, value in items]
+        return "\n".join(lines)
+
+
+class Histogram:
+    """带标签的直方图（累积桶，与Prometheus histogram一致）"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        初始化直方图
+
+        Args:
+            name: 指标名称
+            help_text: 说明
+            labels: 标签名称
+            buckets: 桶上界（升序）
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶计数（非累积，最后一个为+Inf）, 总和, 次数]
+        self.values: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        """记录一个观测值"""
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            entry = self.values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((labels, ([*counts], total, count)) for labels, (counts, total, count) in self.values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return "\n".join(lines)
+
+
+class Monitor:
+    """
+    长时间评估的实时监控
+
+    维护请求数、错误数（按供应商与状态）、进行中的请求数、缓存命中、token用量与延迟直方图，
+    以Prometheus文本格式导出到文件（node_exporter textfile collector，定期原子替换）或本地HTTP端点，
+    并为每个请求追加一行JSON trace span。
+    """
+
+    def __init__(self, textfile: Optional[Union[str, Path]] = None, port: Optional[int] = None,
+                 trace_file: Optional[Union[str, Path]] = None, interval: float = 15.0, host: str = "127.0.0.1"):
+        """
+        初始化监控
+
+        Args:
+            textfile: Prometheus文本文件路径（可选），每 interval 秒更新一次
+            port: HTTP端点端口（可选），GET /metrics 返回当前指标
+            trace_file: trace span 的JSONL文件路径（可选）
+            interval: 文本文件的更新间隔（秒）
+            host: HTTP端点监听地址
+        """
+        self.textfile = Path(textfile) if textfile else None
+        self.port = port
+        self.host = host
+        self.trace_file = Path(trace_file) if trace_file else None
+        self.interval = interval
+
+        run_labels = ("task", "provider", "model_name")
+        self.requests = Metric("arena_requests_total", "完成的模型请求数", "counter", (*run_labels, "status"))
+        self.in_flight = Metric("arena_requests_in_flight", "进行中的模型请求数", "gauge", run_labels)
+        self.tokens = Metric("arena_tokens_total", "token用量", "counter", (*run_labels, "kind"))
+        self.latency = Histogram("arena_request_latency_seconds", "请求各阶段耗时（不含缓存命中）",
+                                 (*run_labels, "stage"))
+        self.progress = Metric("arena_samples", "评估进度：已处理（含复用日志）与数据集样本数", "gauge",
+                               (*run_labels, "state"))
+        self.cache_lookups = Metric("arena_cache_lookups_total", "缓存查找次数", "counter", ("cache", "result"))
+        self.started = Metric("arena_start_time_seconds", "监控开始时间（Unix时间）", "gauge")
+        self.started.set(value=time.time())
+        self._caches = {}
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._trace = None
+        self._trace_lock = threading.Lock()
+
+    def watch_cache(self, name: str, cache):
+        """
+        导出缓存的命中与未命中次数
+
+        Args:
+            name: 缓存名称，例如 "image"、"response"
+            cache: 具有 hits、misses 属性的缓存对象
+        """
+        self._caches[name] = cache
+
+    def run(self, task: str, provider: str, model_name: str, run_id: str) -> "RunMonitor":
+        """
+        为一次评估运行创建带标签的记录器
+
+        Args:
+            task: 任务名称
+            provider: 供应商名称
+            model_name: 模型名称
+            run_id: 运行ID（作为trace_id）
+
+        Returns:
+            运行记录器
+        """
+        return RunMonitor(self, (task, provider, model_name), run_id)
+
+    def render(self) -> str:
+        """当前全部指标的Prometheus文本格式"""
+        for name, cache in self._caches.items():
+            self.cache_lookups.set(name, "hit", value=cache.hits)
+            self.cache_lookups.set(name, "miss", value=cache.misses)
+        metrics = (self.requests, self.in_flight, self.tokens, self.latency, self.progress, self.cache_lookups,
+                   self.started)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def write_textfile(self):
+        """原子地更新Prometheus文本文件"""
+        if self.textfile is None:
+            return
+        self.textfile.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.textfile.with_name(f".{self.textfile.name}.{os.getpid()}.tmp")
+        temp_path.write_text(self.render(), encoding="utf-8")
+        os.replace(temp_path, self.textfile)
+
+    def trace(self, span: dict):
+        """追加一行trace span"""
+        if self.trace_file is None:
+            return
+        line = json.dumps(span, ensure_ascii=False) + "\n"
+        with self._trace_lock:
+            if self._trace is None:
+                self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+                self._trace = open(self.trace_file, "a", encoding="utf-8")
+            self._trace.write(line)
+            # 逐行写出，便于 tail -f 实时查看
+            self._trace.flush()
+
+    def _write_periodically(self):
+        while not self._stop.wait(self.interval):
+            self.write_textfile()
+
+    def start(self) -> "Monitor":
+        """启动HTTP端点与文本文件的定期更新"""
+        if self.port is not None:
+            monitor = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = monitor.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self.port = self._server.server_address[1]
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True))
+            print(f"监控指标: http://{self.host}:{self.port}/metrics")
+        if self.textfile is not None:
+            self._threads.append(threading.Thread(target=self._write_periodically, name="metrics-textfile", daemon=True))
+            print(f"监控指标文件: {self.textfile}（每 {self.interval:g} 秒更新）")
+        if self.trace_file is not None:
+            print(f"请求trace: {self.trace_file}")
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def close(self):
+        """停止后台线程，写出最终的指标文件并关闭trace文件"""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.write_textfile()
+        with self._trace_lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def monitor_from_config(config: dict) -> Optional[Monitor]:
+    """
+    由矩阵配置的 [metrics] 表创建监控
+
+    Args:
+        config: 配置，[metrics] 表可包含 textfile、port、trace_file、interval、host
+
+    Returns:
+        监控（尚未启动）；未配置任何输出时返回None
+    """
+    metrics = config.get("metrics") or {}
+    if not any(metrics.get(key) for key in ("textfile", "port", "trace_file")):
+        return None
+    return Monitor(metrics.get("textfile"), metrics.get("port"), metrics.get("trace_file"),
+                   metrics.get("interval", 15.0), metrics.get("host", "127.0.0.1"))
+
+
+class RunMonitor:
+    """一次评估运行的请求记录器（由 Monitor.run 创建）"""
+
+    def __init__(self, monitor: Monitor, labels: LabelValues, run_id: str):
+        """
+        初始化记录器
+
+        Args:
+            monitor: 所属的监控
+            labels: (任务, 供应商, 模型)
+            run_id: 运行ID
+        """
+        self.monitor = monitor
+        self.labels = labels
+        self.run_id = run_id
+
+    def request_started(self):
+        """请求开始（进行中的请求数加一）"""
+        self.monitor.in_flight.inc(*self.labels)
+
+    def request_cancelled(self):
+        """请求被取消（提前停止或异常退出）"""
+        self.monitor.in_flight.inc(*self.labels, amount=-1)
+
+    def set_progress(self, processed: int, total: int):
+        """
+        更新评估进度
+
+        Args:
+            processed: 已处理的样本数
+            total: 数据集样本数
+        """
+        self.monitor.progress.set(*self.labels, "processed", value=processed)
+        self.monitor.progress.set(*self.labels, "total", value=total)
+
+    def request_finished(self, record: dict, started: float):
+        """
+        请求结束：更新计数器与直方图，并写出trace span
+
+        Args:
+            record: evaluate_sample返回的样本记录
+            started: 请求开始的Unix时间
+        """
+        monitor = self.monitor
+        monitor.in_flight.inc(*self.labels, amount=-1)
+        monitor.requests.inc(*self.labels, record.get("status", STATUS_ERROR))
+        timings = record.get("timings", {})
+        if not record.get("cached"):
+            for stage, seconds in timings.items():
+                monitor.latency.observe(*self.labels, stage, value=seconds)
+        usage = record.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                monitor.tokens.inc(*self.labels, kind.split("_")[0], amount=usage[kind])
+
+        task, provider, model_name = self.labels
+        monitor.trace({
+            "trace_id": self.run_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "name": "request",
+            "start": started,
+            "duration": timings.get("total"),
+            "attributes": {
+                "task": task,
+                "provider": provider,
+                "model_name": model_name,
+                "sample_id": record.get("sample_id"),
+                "status": record.get("status"),
+                "cached": bool(record.get("cached")),
+                "error": record.get("error"),
+            },
+            "stages": timings,
+        })
@@ -0,0 +1,224 @@
+import cProfile
+import json
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from llm_client import add_span_hook, remove_span_hook
+from .latency import LatencyHistogram
+from .metrics import format_rows
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+class StageProfile:
+    """
+    各阶段耗时汇总（span回调）
+
+    按阶段路径（例如 "network/request.network"）累计耗时分布；并发请求的阶段耗时直接相加，
+    因此总计可能大于墙钟时间。
+    """
+
+    def __init__(self):
+        """初始化汇总"""
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, path: str, start: float, duration: float):
+        with self._lock:
+            histogram = self.stages.get(path)
+            if histogram is None:
+                histogram = self.stages[path] = LatencyHistogram()
+            histogram.record(duration)
+
+    def __enter__(self):
+        add_span_hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        remove_span_hook(self)
+
+    def self_times(self) -> Dict[str, float]:
+        """各阶段扣除子阶段后的耗时总和（秒）"""
+        totals = {path: histogram.sum for path, histogram in self.stages.items()}
+        self_times = dict(totals)
+        for path, total in totals.items():
+            parent = path.rpartition("/")[0]
+            if parent in self_times:
+                self_times[parent] -= total
+        return {path: max(0.0, seconds) for path, seconds in self_times.items()}
+
+    def to_dict(self) -> dict:
+        """可序列化为JSON的汇总"""
+        self_times = self.self_times()
+        return {
+            path: {
+                "count": histogram.count,
+                "total": histogram.sum,
+                "self": self_times[path],
+                "mean": histogram.mean,
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "max": histogram.max,
+            }
+            for path, histogram in sorted(self.stages.items())
+        }
+
+    def export(self, path: Union[str, Path]) -> Path:
+        """
+        导出汇总JSON，并在同名 .folded 文件中写入按阶段折叠的栈（微秒），
+        可直接用 flamegraph.pl、speedscope、inferno 等工具生成火焰图
+
+        Args:
+            path: JSON文件路径
+
+        Returns:
+            JSON文件路径
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(path.with_suffix(".folded"), "w", encoding="utf-8") as f:
+            for stage, seconds in sorted(self.self_times().items()):
+                if seconds > 0:
+                    f.write(f"{stage.replace('/', ';')} {round(seconds * 1e6)}\n")
+        return path
+
+
+def print_stage_report(profile: StageProfile):
+    """
+    打印各阶段耗时表（按总耗时从高到低）
+
+    Args:
+        profile: 阶段耗时汇总
+    """
+    self_times = profile.self_times()
+    rows = [["阶段", "次数", "总计", "自身", "平均", "p50", "p95", "最大"]]
+    for path, histogram in sorted(profile.stages.items(), key=lambda item: -item[1].sum):
+        rows.append([
+            path, str(histogram.count), f"{histogram.sum:.2f}秒", f"{self_times[path]:.2f}秒",
+            *(f"{seconds * 1000:.1f}ms" for seconds in (
+                histogram.mean, histogram.percentile(50), histogram.percentile(95), histogram.max
+            )),
+        ])
+    print(format_rows(rows))
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程定时采集所有线程的调用栈，输出折叠栈格式（flamegraph.pl / speedscope 可直接读取）
+
+    与cProfile不同，采样可以看到预读取线程与事件循环各自在做什么，对被分析代码几乎没有额外开销。
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        初始化分析器
+
+        Args:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        """开始采样"""
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path: Union[str, Path]):
+        """
+        写入折叠栈文件，每行为 "栈帧;栈帧;... 采样次数"
+
+        Args:
+            path: 输出文件路径
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RunProfiler:
+    """
+    作用于一次评估运行的分析器
+
+    同时汇总各阶段的span耗时，并按 mode 运行 cProfile（输出 .prof，可用 snakeviz、flameprof、
+    gprof2dot 查看）或采样分析器（输出 .folded 折叠栈，可用 flamegraph.pl、speedscope 生成火焰图）。
+    """
+
+    def __init__(self, output_prefix: Union[str, Path], mode: str = "sampling", interval: float = 0.005):
+        """
+        初始化分析器
+
+        Args:
+            output_prefix: 输出文件路径前缀（不含扩展名）
+            mode: "cprofile" 或 "sampling"
+            interval: 采样间隔（秒），仅 sampling 模式使用
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的分析模式: {mode}，可用模式: {', '.join(PROFILE_MODES)}")
+        self.output_prefix = Path(output_prefix)
+        self.mode = mode
+        self.stages = StageProfile()
+        self._profiler = cProfile.Profile() if mode == "cprofile" else SamplingProfiler(interval)
+        self.outputs = []
+
+    def start(self):
+        """开始分析"""
+        add_span_hook(self.stages)
+        if self.mode == "cprofile":
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def stop(self):
+        """停止分析并写入输出文件（文件路径见 outputs）"""
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        remove_span_hook(self.stages)
+
+        self.output_prefix.parent.mkdir(parents=True, exist_ok=True)
+        stages_path = self.stages.export(f"{self.output_prefix}.stages.json")
+        self.outputs = [stages_path, stages_path.with_suffix(".folded")]
+        if self.mode == "cprofile":
+            profile_path = Path(f"{self.output_prefix}.prof")
+            self._profiler.dump_stats(profile_path)
+        else:
+            profile_path = Path(f"{self.output_prefix}.samples.folded")
+            self._profiler.dump(profile_path)
+        self.outputs.append(profile_path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Union
+
+from llm_client import span
+
+# 样本结果状态
+STATUS_OK = "ok"
+STATUS_PARSE_ERROR = "parse_error"
+STATUS_ERROR = "error"
+
+
+def config_hash(run_config: dict) -> str:
+    """
+    计算运行配置的哈希，作为run_id
+
+    Args:
+        run_config: 运行配置（任务、供应商、模型、提示词等）
+
+    Returns:
+        12位十六进制哈希字符串
+    """
+    payload = json.dumps(run_config, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class ResultLog:
+    """逐样本追加写入的评估结果日志（JSONL），支持断点续跑"""
+
+    def __init__(self, log_dir: Union[str, Path], task: str, run_config: dict,
+                 flush_every: int = 20, flush_interval: float = 5.0):
+        """
+        初始化结果日志
+
+        Args:
+            log_dir: 日志目录
+            task: 任务名称
+            run_config: 运行配置，相同配置的运行共享同一个日志文件
+            flush_every: 缓冲多少条记录后写盘
+            flush_interval: 距上次写盘超过多少秒后写盘
+        """
+        self.task = task
+        self.run_config = run_config
+        self.run_id = config_hash(run_config)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.log_dir / f"{task}-{self.run_id}.jsonl"
+
+        # 记录运行配置，便于追溯日志来源
+        config_path = self.log_dir / f"{task}-{self.run_id}.config.json"
+        if not config_path.exists():
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(run_config, f, ensure_ascii=False, indent=2, default=str)
+
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._file = None
+
+    def load(self) -> Dict[str, dict]:
+        """
+        读取日志中已有的结果
+
+        Returns:
+            sample_id -> 最新一条记录（同一样本重试后以最后一条为准）
+        """
+        records = {}
+        if not self.path.exists():
+            return records
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程崩溃时最后一行可能只写了一半
+                    continue
+                records[record["sample_id"]] = record
+        return records
+
+    def append(self, record: dict):
+        """
+        追加一条样本结果，按批写盘
+
+        Args:
+            record: 样本结果，必须包含sample_id和status
+        """
+        record.setdefault("run_id", self.run_id)
+        record.setdefault("timestamp", time.time())
+        self._buffer.append(record)
+
+        if (len(self._buffer) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """将缓冲的记录写入磁盘"""
+        if self._buffer:
+            with span("log.flush"):
+                if self._file is None:
+                    self._file = self._open_for_append()
+                self._file.write("".join(
+                    json.dumps(record, ensure_ascii=False) + "\n" for record in self._buffer
+                ))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _open_for_append(self):
+        """
+        以追加模式打开日志文件
+
+        进程崩溃时最后一行可能只写了一半，直接追加会把新记录拼在这半行后面，
+        读取时两条记录都会丢失，因此先截掉结尾不完整的一行。
+
+        Returns:
+            追加模式的文件对象
+        """
+        try:
+            with open(self.path, "rb+") as f:
+                end = f.seek(0, os.SEEK_END)
+                # 从文件末尾向前查找最后一个换行符
+                start = end
+                while start > 0:
+                    step = min(start, 4096)
+                    f.seek(start - step)
+                    index = f.read(step).rfind(b"\n")
+                    if index >= 0:
+                        start = start - step + index + 1
+                        break
+                    start -= step
+                if start < end:
+                    f.seek(start)
+                    try:
+                        # 只差换行符的完整记录（load已读入）保留下来
+                        json.loads(f.read())
+                        f.write(b"\n")
+                    except ValueError:
+                        f.truncate(start)
+        except FileNotFoundError:
+            pass
+        return open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        """写入剩余记录并关闭文件"""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def is_pending(sample_id: str, previous: Dict[str, dict], retry_failures_only: bool = False) -> bool:
+    """
+    单个样本本次是否需要调用模型（规则同 select_pending）
+
+    Args:
+        sample_id: 样本ID
+        previous: ResultLog.load() 的返回值
+        retry_failures_only: 为True时只重跑日志中失败的样本
+
+    Returns:
+        是否需要调用模型
+    """
+    if retry_failures_only:
+        return sample_id in previous and previous[sample_id]["status"] != STATUS_OK
+    return sample_id not in previous
+
+
+def select_pending(sample_ids, previous: Dict[str, dict], retry_failures_only: bool = False) -> set:
+    """
+    根据已有日志确定本次需要调用模型的样本
+
+    Args:
+        sample_ids: 数据集中全部样本ID
+        previous: ResultLog.load() 的返回值
+        retry_failures_only: 为True时只重跑日志中失败的样本
+
+    Returns:
+        需要调用模型的样本ID集合
+    """
+    return {sample_id for sample_id in sample_ids if is_pending(sample_id, previous, retry_failures_only)}
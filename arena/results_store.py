@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .metrics import format_rows
+from .results_log import STATUS_OK
+
+# 每个样本一行，所有运行共用同一个schema
+SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("task", pa.string()),
+    ("provider", pa.string()),
+    ("model_name", pa.string()),
+    ("prompt_version", pa.string()),
+    ("sample_id", pa.string()),
+    ("ground_truth", pa.string()),
+    ("predicted", pa.string()),
+    ("status", pa.string()),
+    ("correct", pa.bool_()),
+    ("latency", pa.float64()),
+    ("encode_time", pa.float64()),
+    ("queue_time", pa.float64()),
+    ("network_time", pa.float64()),
+    ("parse_time", pa.float64()),
+    ("total_time", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("timestamp", pa.float64()),
+])
+
+# 运行维度的分组字段
+RUN_KEYS = ["task", "provider", "model_name", "prompt_version", "run_id"]
+
+
+def prompt_version(prompt: str) -> str:
+    """
+    提示词版本（提示词内容的短哈希）
+
+    Args:
+        prompt: 提示词
+
+    Returns:
+        8位十六进制哈希字符串
+    """
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+
+
+def _label(value) -> Optional[str]:
+    """标签统一为字符串列（布尔值转换为 "true"/"false"）"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class ResultStore:
+    """
+    列式评估结果库
+
+    每次运行的逐样本结果写成一个Parquet文件（按任务分区：<root>/task=<task>/<run_id>.parquet），
+    跨运行的查询直接读取需要的列，不需要重新解析JSONL日志。
+    """
+
+    def __init__(self, root: Union[str, Path] = "results/store"):
+        """
+        初始化结果库
+
+        Args:
+            root: 结果库目录
+        """
+        self.root = Path(root)
+
+    def run_path(self, task: str, run_id: str) -> Path:
+        """运行结果文件路径"""
+        return self.root / f"task={task}" / f"{run_id}.parquet"
+
+    def write_run(self, run_config: dict, run_id: str, records: Sequence[dict]) -> Path:
+        """
+        写入（覆盖）一次运行的全部样本结果
+
+        Args:
+            run_config: 运行配置（task、provider、model_name、prompt）
+            run_id: 运行ID
+            records: 样本记录（ResultLog中每个样本的最新记录）
+
+        Returns:
+            写入的文件路径
+        """
+        columns: Dict[str, list] = {field.name: [] for field in SCHEMA}
+        for record in records:
+            ground_truth = _label(record.get("ground_truth"))
+            predicted = _label(record.get("predicted"))
+            # 来自响应缓存的记录不代表模型的真实延迟
+            timings = {} if record.get("cached") else record.get("timings") or {}
+            usage = record.get("usage") or {}
+            columns["sample_id"].append(record["sample_id"])
+            columns["ground_truth"].append(ground_truth)
+            columns["predicted"].append(predicted)
+            columns["status"].append(record.get("status"))
+            # 真实标签一定在类别列表中，与之相等的预测必然有效
+            columns["correct"].append(record.get("status") == STATUS_OK and predicted == ground_truth)
+            columns["latency"].append(None if record.get("cached") else record.get("latency"))
+            for stage in ("encode", "queue", "network", "parse", "total"):
+                columns[f"{stage}_time"].append(timings.get(stage))
+            columns["prompt_tokens"].append(usage.get("prompt_tokens"))
+            columns["completion_tokens"].append(usage.get("completion_tokens"))
+            columns["timestamp"].append(record.get("timestamp"))
+
+        n = len(columns["sample_id"])
+        constants = {
+            "run_id": run_id,
+            "task": run_config["task"],
+            "provider": run_config.get("provider"),
+            "model_name": run_config.get("model_name"),
+            "prompt_version": prompt_version(run_config.get("prompt", "")),
+        }
+        for name, value in constants.items():
+            columns[name] = [value] * n
+
+        table = pa.table(columns, schema=SCHEMA)
+        path = self.run_path(run_config["task"], run_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，查询时不会读到写了一半的文件
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        return path
+
+    def ingest_log(self, log_path: Union[str, Path]) -> Path:
+        """
+        导入一个已有的JSONL结果日志（及其 .config.json）
+
+        Args:
+            log_path: ResultLog文件路径
+
+        Returns:
+            写入的文件路径
+        """
+        log_path = Path(log_path)
+        with open(log_path.with_suffix(".config.json"), "r", encoding="utf-8") as f:
+            run_config = json.load(f)
+        records = {}
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["sample_id"]] = record
+        run_id = log_path.stem.rsplit("-", 1)[-1]
+        return self.write_run(run_config, run_id, list(records.values()))
+
+    def _dataset(self) -> Optional[ds.Dataset]:
+        """结果库中的全部运行，结果库为空时返回None"""
+        if not self.root.exists() or not any(self.root.glob("task=*/*.parquet")):
+            return None
+        return ds.dataset(self.root, format="parquet", schema=SCHEMA, partitioning="hive",
+                          exclude_invalid_files=True)
+
+    def query(self, task: Optional[str] = None, provider: Optional[str] = None,
+              model_name: Optional[str] = None, columns: Optional[List[str]] = None) -> pa.Table:
+        """
+        查询逐样本结果
+
+        Args:
+            task: 任务名称过滤
+            provider: 供应商过滤
+            model_name: 模型名称过滤
+            columns: 只读取这些列（默认全部）
+
+        Returns:
+            pyarrow Table
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return SCHEMA.empty_table().select(columns) if columns else SCHEMA.empty_table()
+
+        expression = None
+        for name, value in (("task", task), ("provider", provider), ("model_name", model_name)):
+            if value is not None:
+                condition = pc.field(name) == value
+                expression = condition if expression is None else expression & condition
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def tasks(self) -> List[str]:
+        """结果库中的全部任务"""
+        return sorted(set(self.query(columns=["task"])["task"].to_pylist()))
+
+    def summary(self, task: Optional[str] = None, provider: Optional[str] = None,
+                model_name: Optional[str] = None) -> List[dict]:
+        """
+        每次运行的汇总：准确率、有效率、延迟分位数与token用量
+
+        Args:
+            task: 任务名称过滤
+            provider: 供应商过滤
+            model_name: 模型名称过滤
+
+        Returns:
+            每次运行一个字典，按准确率从高到低排列
+        """
+        table = self.query(task, provider, model_name, columns=RUN_KEYS + [
+            "status", "correct", "latency", "completion_tokens"
+        ])
+        if table.num_rows == 0:
+            return []
+
+        table = table.append_column("valid", pc.equal(table["status"], STATUS_OK))
+        grouped = table.group_by(RUN_KEYS).aggregate([
+            ("correct", "count"),
+            ("correct", "mean"),
+            ("valid", "mean"),
+            ("latency", "mean"),
+            ("latency", "tdigest", pc.TDigestOptions(q=[0.5, 0.95, 0.99])),
+            ("completion_tokens", "sum"),
+        ])
+
+        rows = []
+        for row in grouped.to_pylist():
+            p50, p95, p99 = row["latency_tdigest"] or (None, None, None)
+            rows.append({
+                **{key: row[key] for key in RUN_KEYS},
+                "samples": row["correct_count"],
+                "accuracy": row["correct_mean"],
+                "valid_rate": row["valid_mean"],
+                "latency_mean": row["latency_mean"],
+                "latency_p50": p50,
+                "latency_p95": p95,
+                "latency_p99": p99,
+                "completion_tokens": row["completion_tokens_sum"],
+            })
+        rows.sort(key=lambda row: row["accuracy"], reverse=True)
+        return rows
+
+
+def print_store_summary(rows: List[dict]):
+    """
+    打印 ResultStore.summary 的结果
+
+    Args:
+        rows: 汇总结果
+    """
+    if not rows:
+        print("结果库中没有匹配的运行。")
+        return
+    header = ["任务", "供应商", "模型", "提示词版本", "样本数", "准确率", "有效率", "p50延迟", "p95延迟"]
+    table = [header]
+    for row in rows:
+        table.append([
+            row["task"], row["provider"] or "-", row["model_name"] or "-", row["prompt_version"],
+            str(row["samples"]), f"{row['accuracy'] * 100:.2f}%", f"{row['valid_rate'] * 100:.2f}%",
+            f"{row['latency_p50']:.2f}秒" if row["latency_p50"] is not None else "-",
+            f"{row['latency_p95']:.2f}秒" if row["latency_p95"] is not None else "-",
+        ])
+    print(format_rows(table))
@@ -0,0 +1,314 @@
+import asyncio
+import time
+import tomllib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from llm_client import LLMClient, LLMClientFactory, ImagePayload, ChatResult
+from .cache import ImageCache, ResponseCache
+from .engine import EvalResult, run_evaluation
+from .leaderboard import write_leaderboard
+from .monitoring import monitor_from_config
+from .results_store import ResultStore, print_store_summary
+from .tasks import EvalTask
+
+# 任务名称 -> 构建EvalTask的函数，参数为 (dataset_path, prompt_template)，均可省略
+TaskBuilder = Callable[..., EvalTask]
+
+DEFAULT_CONCURRENCY = 4
+
+
+class ScheduledClient(LLMClient):
+    """
+    矩阵调度使用的客户端包装
+
+    同一供应商的所有评估共享一个并发上限；相同请求（模型、提示词、图片都相同）只调用一次。
+    """
+
+    def __init__(self, client: LLMClient, provider: str, semaphore: asyncio.Semaphore,
+                 response_cache: Optional[ResponseCache] = None, refresh_cache: bool = False):
+        """
+        初始化客户端包装
+
+        Args:
+            client: 实际的LLM客户端
+            provider: 供应商名称
+            semaphore: 该供应商共享的并发信号量
+            response_cache: 共享的响应缓存（可选）
+            refresh_cache: 为True时重新调用模型并覆盖缓存的响应（重跑失败样本时使用）
+        """
+        self.client = client
+        self.provider = provider
+        self.semaphore = semaphore
+        self.response_cache = response_cache
+        self.refresh_cache = refresh_cache
+
+    @property
+    def model_name(self) -> str:
+        """模型名称"""
+        return self.client.model_name
+
+    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
+        return self.client.fast_chat(text_input, image_path)
+
+    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
+        result = await self.async_chat(text_input, image_path)
+        return result.content
+
+    async def async_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
+        """
+        受并发上限约束的聊天调用，优先使用响应缓存
+
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+
+        Returns:
+            聊天结果；来自缓存时 cached 属性为True，queue_time 为等待并发名额的时间
+        """
+        payload = self._payload(image_path)
+        return await self._call(text_input, payload, lambda: self.client.async_chat(text_input, payload))
+
+    async def async_chat_n(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None,
+                           n: int = 1) -> ChatResult:
+        """
+        多候选采样：整体作为一次调用受并发上限约束，并按 n 区分缓存
+
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            n: 候选回复数
+
+        Returns:
+            聊天结果，choices中为全部候选回复
+        """
+        if n <= 1:
+            return await self.async_chat(text_input, image_path)
+        payload = self._payload(image_path)
+        return await self._call(f"{text_input}\x00n={n}", payload,
+                                lambda: self.client.async_chat_n(text_input, payload, n))
+
+    @staticmethod
+    def _payload(image_path) -> Optional[ImagePayload]:
+        """统一转换为预先编码的图片数据，便于计算缓存键"""
+        if image_path is None or isinstance(image_path, ImagePayload):
+            return image_path
+        return ImagePayload.from_file(image_path)
+
+    async def _call(self, cache_text: str, payload: Optional[ImagePayload], request) -> ChatResult:
+        """
+        在并发上限内执行请求，并经过响应缓存
+
+        Args:
+            cache_text: 参与缓存键计算的请求文本
+            payload: 图片数据
+            request: 发起请求的无参协程函数
+
+        Returns:
+            聊天结果
+        """
+        async def call():
+            wait_start = time.perf_counter()
+            async with self.semaphore:
+                queue_time = time.perf_counter() - wait_start
+                result = await request()
+            result.queue_time = queue_time
+            return result
+
+        if self.response_cache is None:
+            return await call()
+        key = ResponseCache.key(self.provider, self.model_name, cache_text, payload)
+        return await self.response_cache.get_or_call(key, call, self.refresh_cache)
+
+
+class MatrixJob:
+    """评估矩阵中的一项：任务 × 提示词 × (供应商, 模型)"""
+
+    def __init__(self, task: EvalTask, prompt_name: str, provider: str, model_name: str):
+        """
+        初始化评估项
+
+        Args:
+            task: 评估任务（已带入该提示词）
+            prompt_name: 提示词名称
+            provider: 供应商名称
+            model_name: 模型名称
+        """
+        self.task = task
+        self.prompt_name = prompt_name
+        self.provider = provider
+        self.model_name = model_name
+
+    def __str__(self):
+        return f"{self.task.name} × {self.provider}/{self.model_name} × {self.prompt_name}"
+
+
+def load_matrix_config(path: Union[str, Path]) -> dict:
+    """
+    读取评估矩阵配置（TOML），提示词文件路径相对于配置文件解析
+
+    Args:
+        path: 配置文件路径
+
+    Returns:
+        配置字典
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+
+    if not config.get("tasks"):
+        raise ValueError(f"配置中没有定义任务: {path}")
+    if not config.get("targets"):
+        raise ValueError(f"配置中没有定义评估目标: {path}")
+    for task in config["tasks"]:
+        for prompt in task.get("prompts", []):
+            if "file" in prompt:
+                prompt["text"] = (path.parent / prompt["file"]).read_text(encoding="utf-8")
+    return config
+
+
+def build_jobs(config: dict, task_builders: Dict[str, TaskBuilder]) -> List[MatrixJob]:
+    """
+    展开评估矩阵
+
+    Args:
+        config: load_matrix_config的返回值
+        task_builders: 任务名称 -> 构建函数
+
+    Returns:
+        评估项列表
+    """
+    tasks = []
+    for task_config in config["tasks"]:
+        name = task_config["name"]
+        if name not in task_builders:
+            raise ValueError(f"未知任务: {name}，可用任务: {', '.join(task_builders)}")
+        kwargs = {}
+        if "dataset_path" in task_config:
+            kwargs["dataset_path"] = Path(task_config["dataset_path"])
+        # 未声明提示词时使用任务内置的提示词
+        for prompt in task_config.get("prompts") or [{"name": "default"}]:
+            prompt_kwargs = dict(kwargs, prompt_template=prompt["text"]) if "text" in prompt else kwargs
+            task = task_builders[name](**prompt_kwargs)
+            # 每个预计算分辨率一项，分辨率扫描无需重新准备数据集
+            for resolution in task_config.get("resolutions") or [None]:
+                tasks.append((prompt["name"], name, task.at_resolution(resolution)))
+
+    jobs = []
+    for target in config["targets"]:
+        for prompt_name, name, task in tasks:
+            # targets 中的 tasks 按配置中的任务名称筛选，不含分辨率后缀
+            if "tasks" in target and name not in target["tasks"]:
+                continue
+            jobs.append(MatrixJob(task, prompt_name, target["provider"], target["model_name"]))
+    return jobs
+
+
+async def run_matrix(config: dict, task_builders: Dict[str, TaskBuilder],
+                     verbose: bool = False) -> List[EvalResult]:
+    """
+    在同一进程内并发运行整个评估矩阵
+
+    各供应商的评估同时进行、互不等待，同一供应商内的并发数由 [providers.<name>] concurrency 限制，
+    因此总耗时取决于最慢的供应商。编码后的图片和模型响应在所有评估之间共享。
+
+    Args:
+        config: load_matrix_config的返回值
+        task_builders: 任务名称 -> 构建函数
+        verbose: 是否打印逐样本信息
+
+    Returns:
+        各评估项的结果
+    """
+    jobs = build_jobs(config, task_builders)
+    store_dir = config.get("store_dir", "results/store")
+    # 设为空字符串时不生成排行榜
+    leaderboard_file = config.get("leaderboard_file", "results/leaderboard.md")
+    providers = config.get("providers", {})
+    limits = {
+        job.provider: providers.get(job.provider, {}).get("concurrency", DEFAULT_CONCURRENCY) for job in jobs
+    }
+
+    image_cache = ImageCache(config.get("image_cache_size", 1024))
+    response_cache = ResponseCache(config.get("response_cache"))
+    monitor = monitor_from_config(config)
+    if monitor is not None:
+        monitor.watch_cache("image", image_cache)
+        monitor.watch_cache("response", response_cache)
+
+    semaphores = {provider: asyncio.Semaphore(limit) for provider, limit in limits.items()}
+    # 只重跑失败样本时，缓存中对应的响应就是失败的那一次，需要重新调用模型
+    retry_failures_only = config.get("retry_failures_only", False)
+    clients = {}
+    for job in jobs:
+        key = (job.provider, job.model_name)
+        if key in clients:
+            continue
+        try:
+            client = LLMClientFactory.create_client(provider=job.provider, model_name=job.model_name)
+        except Exception as e:
+            print(f"初始化 LLM 客户端失败 ({job.provider}/{job.model_name}): {e}")
+            clients[key] = None
+            continue
+        clients[key] = ScheduledClient(client, job.provider, semaphores[job.provider], response_cache,
+                                       refresh_cache=retry_failures_only)
+
+    runnable = [job for job in jobs if clients[(job.provider, job.model_name)] is not None]
+    print(f"评估矩阵: {len(jobs)} 项，其中 {len(runnable)} 项可运行")
+    for provider, limit in limits.items():
+        print(f"  - {provider}: 并发上限 {limit}")
+    print("-" * 30)
+
+    start_time = time.perf_counter()
+    finished = 0
+
+    async def run_job(job: MatrixJob) -> Optional[EvalResult]:
+        nonlocal finished
+        try:
+            result = await run_evaluation(
+                job.task, clients[(job.provider, job.model_name)], job.provider, job.model_name,
+                log_dir=config.get("log_dir", "results/logs"),
+                retry_failures_only=retry_failures_only,
+                store_dir=store_dir,
+                # 全部完成后统一生成排行榜
+                leaderboard_file=None,
+                concurrency=limits[job.provider],
+                prefetch=config.get("prefetch", 8),
+                image_cache=image_cache,
+                monitor=monitor,
+                verbose=verbose,
+            )
+        except Exception as e:
+            print(f"评估失败 ({job}): {e}")
+            return None
+        finished += 1
+        if result is not None:
+            accuracy = result.confusion_matrix().accuracy() if result.records else 0.0
+            print(f"[{finished}/{len(runnable)}] {job}: 准确率 {accuracy * 100:.2f}%，"
+                  f"调用 {result.calls_made} 次，耗时 {time.perf_counter() - start_time:.1f}秒")
+        return result
+
+    if monitor is not None:
+        monitor.start()
+    try:
+        results = await asyncio.gather(*(run_job(job) for job in runnable))
+    finally:
+        response_cache.close()
+        if monitor is not None:
+            monitor.close()
+
+    print("-" * 30)
+    print(f"评估矩阵完成，总耗时 {time.perf_counter() - start_time:.1f}秒")
+    print(f"图片缓存: 命中 {image_cache.hits} 次，编码 {image_cache.misses} 次")
+    print(f"响应缓存: 命中 {response_cache.hits} 次，调用模型 {response_cache.misses} 次")
+
+    results = [result for result in results if result is not None]
+    if results:
+        store = ResultStore(store_dir)
+        run_ids = {result.run_id for result in results}
+        print()
+        print_store_summary([row for row in store.summary() if row["run_id"] in run_ids])
+        if leaderboard_file:
+            print(f"\n排行榜已更新: {write_leaderboard(store, leaderboard_file)}")
+    return results
@@ -0,0 +1,186 @@
+import asyncio
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from llm_client import LLMClient
+from .dataset import Prefetcher, dataset_size, iter_samples
+from .engine import EvalResult, evaluate_sample, load_image
+from .leaderboard import mcnemar_pvalues, write_leaderboard
+from .metrics import format_rows
+from .monitoring import Monitor
+from .results_log import ResultLog, is_pending
+from .results_store import ResultStore, prompt_version
+from .tasks import EvalTask
+
+
+async def run_sweep(variants: Dict[str, EvalTask], client: LLMClient, provider: str, model_name: str,
+                    log_dir: Union[str, Path] = "results/logs",
+                    store_dir: Optional[Union[str, Path]] = "results/store",
+                    leaderboard_file: Optional[Union[str, Path]] = "results/leaderboard.md",
+                    concurrency: int = 4, prefetch: int = 8,
+                    prefetch_workers: int = 4, monitor: Optional[Monitor] = None) -> Dict[str, EvalResult]:
+    """
+    在一次数据集遍历中评估多个提示词变体
+
+    按 样本 × 变体 的顺序交错发起请求：每张图片只在后台线程中读取和编码一次，所有变体共享；
+    同一个客户端（连接池）服务全部请求。每个变体仍有各自的结果日志，可断点续跑。
+
+    Args:
+        variants: 变体名称 -> 评估任务（除提示词外应完全相同）
+        client: LLM客户端
+        provider: 供应商名称
+        model_name: 模型名称
+        log_dir: 结果日志目录
+        store_dir: 列式结果库目录；None表示不写入
+        leaderboard_file: 写入结果库后重新生成的排行榜；None表示不生成
+        concurrency: 同时进行的模型调用数
+        prefetch: 预读取距离（样本数）
+        prefetch_workers: 预读取线程数
+        monitor: 实时监控（可选，需已启动），各变体的指标以 "任务/变体" 作为task标签
+
+    Returns:
+        变体名称 -> 评估结果；元数据文件不存在时为空字典
+    """
+    first = next(iter(variants.values()))
+    if any(task.dataset_file != first.dataset_file for task in variants.values()):
+        raise ValueError("提示词变体必须使用同一个数据集")
+    if not first.dataset_file.exists():
+        print(f"错误: 元数据文件未找到 {first.dataset_file}")
+        return {}
+
+    total_samples = dataset_size(first)
+    logs, previous, results, monitors = {}, {}, {}, {}
+    for name, task in variants.items():
+        logs[name] = ResultLog(log_dir, task.name, task.run_config(provider, model_name))
+        previous[name] = logs[name].load()
+        results[name] = EvalResult(task, provider, model_name, logs[name], total_samples, 0)
+        if monitor is not None:
+            monitors[name] = monitor.run(f"{task.name}/{name}", provider, model_name, logs[name].run_id)
+        print(f"变体 {name}: 日志中已有 {len(previous[name])} 个样本结果")
+
+    # 每个样本的图片在后台线程中只读取和编码一次，该样本的所有变体共享
+    stream = Prefetcher(
+        (
+            (item, ground_truth, {name for name in variants if is_pending(item["file_name"], previous[name])})
+            for _, item, ground_truth in iter_samples(first)
+        ),
+        lambda sample: load_image(first, sample[0]),
+        distance=prefetch, workers=prefetch_workers, select=lambda sample: bool(sample[2]),
+    )
+    work = deque()
+    in_flight = deque()
+    done = 0
+
+    def launch_ahead():
+        while len(in_flight) < max(1, concurrency):
+            if not work:
+                sample = next(stream, None)
+                if sample is None:
+                    break
+                # 同一样本的所有变体紧挨着发起
+                (item, ground_truth, pending), prefetched = sample
+                work.extend((name, item, ground_truth, prefetched if name in pending else None) for name in variants)
+            name, item, ground_truth, prefetched = work.popleft()
+            if prefetched is not None:
+                results[name].pending_total += 1
+                future = asyncio.ensure_future(
+                    evaluate_sample(variants[name], client, item, prefetched=prefetched, monitor=monitors.get(name))
+                )
+            else:
+                future = None
+            in_flight.append((name, item, ground_truth, future))
+
+    for result in results.values():
+        result.latency.start()
+    try:
+        launch_ahead()
+        while in_flight:
+            name, item, ground_truth, future = in_flight.popleft()
+            result = results[name]
+            if future is None:
+                record = previous[name].get(item["file_name"])
+            else:
+                record = await future
+                logs[name].append(record)
+                result.latency.add(record)
+                result.calls_made += 1
+            launch_ahead()
+
+            if record is not None:
+                result.add(record, ground_truth, variants[name].prediction_label(record.get("predicted")))
+                if name in monitors:
+                    monitors[name].set_progress(len(result.records), total_samples)
+            done += 1
+            if done % 50 == 0:
+                print(f"进度: {done} 个请求")
+    finally:
+        for _, _, _, future in in_flight:
+            if future is not None:
+                future.cancel()
+        stream.close()
+        for name in variants:
+            results[name].latency.stop()
+            logs[name].close()
+
+    print(f"完成: {done} 个请求，调用模型 {sum(result.calls_made for result in results.values())} 次")
+
+    if store_dir is not None:
+        store = ResultStore(store_dir)
+        for log in logs.values():
+            store.write_run(log.run_config, log.run_id, list(log.load().values()))
+        if leaderboard_file is not None:
+            print(f"排行榜已更新: {write_leaderboard(store, leaderboard_file)}")
+    return results
+
+
+def print_sweep_report(results: Dict[str, EvalResult], alpha: float = 0.05):
+    """
+    打印各提示词变体的指标对比表
+
+    最后一列为与准确率最高的变体的配对McNemar检验p值（只比较双方都评估过的样本）。
+
+    Args:
+        results: run_sweep的返回值
+        alpha: 显著性水平
+    """
+    if not results:
+        return
+
+    # 样本 -> 是否正确，用于配对比较
+    correctness = {
+        name: {record["sample_id"]: label == truth for record, truth, label in zip(r.records, r.y_true, r.y_pred)}
+        for name, r in results.items()
+    }
+    matrices = {name: result.confusion_matrix() for name, result in results.items()}
+    best = max(results, key=lambda name: matrices[name].accuracy())
+
+    header = ["变体", "提示词版本", "样本数", "准确率", "均衡准确率", "宏F1", "无效预测", "p50延迟", "p95延迟",
+              "输出token", f"与{best}差异p值"]
+    rows = [header]
+    for name, result in results.items():
+        cm = matrices[name]
+        network = result.latency.stages["network"]
+        shared = correctness[name].keys() & correctness[best].keys()
+        b = sum(correctness[name][s] and not correctness[best][s] for s in shared)
+        c = sum(correctness[best][s] and not correctness[name][s] for s in shared)
+        pvalue = float(mcnemar_pvalues(np.array([b]), np.array([c]))[0])
+        rows.append([
+            name,
+            prompt_version(result.task.prompt_template),
+            str(cm.total),
+            f"{cm.accuracy() * 100:.2f}%",
+            f"{cm.balanced_accuracy() * 100:.2f}%",
+            f"{cm.macro()['f1'] * 100:.2f}",
+            str(cm.invalid),
+            f"{network.percentile(50):.2f}秒" if network.count else "-",
+            f"{network.percentile(95):.2f}秒" if network.count else "-",
+            str(result.latency.completion_tokens) if result.latency.completion_tokens else "-",
+            "-" if name == best else f"{pvalue:.3g}{' *' if pvalue < alpha else ''}",
+        ])
+
+    print(f"\n【提示词变体对比】")
+    print(format_rows(rows))
+    print(f"* 表示与最佳变体的差异在 {alpha} 水平下显著")
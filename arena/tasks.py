@@ -0,0 +1,206 @@
+import copy
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .json_extract import extract_json
+
+
+def normalize_label(value):
+    """
+    统一标签表示：布尔值转换为 "true"/"false"，其余原样返回
+
+    Args:
+        value: 元数据或模型输出中的标签值
+
+    Returns:
+        统一后的标签
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+class EvalTask:
+    """评估任务定义：数据集位置、标签字段、类别与提示词"""
+
+    def __init__(self, name: str, dataset_path: Union[str, Path], label_field: str,
+                 labels: Sequence[str], prompt_template: str,
+                 response_parser: Optional[Callable[[str], Optional[dict]]] = None,
+                 display_names: Optional[Dict[str, str]] = None,
+                 groups: Optional[Dict[str, List[str]]] = None,
+                 debug_fields: Optional[Dict[str, str]] = None, source=None,
+                 resolution: Optional[int] = None):
+        """
+        初始化评估任务
+
+        Args:
+            name: 任务名称，例如 "gaze-direction"
+            dataset_path: HF imagefolder数据集目录（包含metadata.jsonl）
+            label_field: 元数据与模型JSON输出中的标签字段
+            labels: 类别列表
+            prompt_template: 提示词
+            response_parser: 从模型响应中提取JSON的函数，失败时返回None；
+                默认提取最后一个包含label_field字段的JSON对象
+            display_names: 类别显示名称
+            groups: 额外统计的类别分组，例如 upstream vs not-upstream
+            debug_fields: 需要记录但不参与统计的模型输出字段 -> 显示名称
+            source: 数据源（可选），例如 dataset_tools.VirtualGazeDataset、PackedDataset；设置后不读取metadata.jsonl，
+                样本记录来自 source 的迭代，图片数据由 source.encode(record) 提供
+            resolution: 使用预计算的分辨率变体（最长边像素数，见 prepare 脚本的 --resolutions），None表示原图
+        """
+        self.name = name
+        self.dataset_path = Path(dataset_path)
+        self.label_field = label_field
+        self.labels = list(labels)
+        self.prompt_template = prompt_template
+        self.response_parser = response_parser or self._default_parser
+        self.display_names = display_names or {}
+        self.groups = groups
+        self.debug_fields = debug_fields or {}
+        self.source = source
+        self.resolution = resolution
+
+    @property
+    def metadata_file(self) -> Path:
+        """元数据文件路径"""
+        return self.dataset_path / "metadata.jsonl"
+
+    @property
+    def dataset_file(self) -> Path:
+        """样本记录的来源文件：数据源的标注或索引文件，否则为元数据文件"""
+        return Path(self.source.dataset_file) if self.source is not None else self.metadata_file
+
+    def at_resolution(self, resolution: Optional[int]) -> "EvalTask":
+        """
+        使用某个预计算分辨率的任务副本
+
+        Args:
+            resolution: 最长边像素数，None表示原图
+
+        Returns:
+            新任务；名称加 @<分辨率>px 后缀，结果日志与排行榜中与其他分辨率分开
+        """
+        task = copy.copy(self)
+        task.resolution = resolution
+        if resolution is not None:
+            task.name = f"{self.name}@{resolution}px"
+        return task
+
+    def image_file(self, item: dict) -> str:
+        """
+        样本图片（相对于数据集目录）
+
+        Args:
+            item: 元数据记录
+
+        Returns:
+            原图，或所选分辨率的变体
+        """
+        if self.resolution is None:
+            return item["file_name"]
+        variant = (item.get("resolutions") or {}).get(str(self.resolution))
+        if variant is None:
+            raise ValueError(f"样本 {item['file_name']} 没有 {self.resolution}px 的图片，"
+                             f"请使用 --resolutions 重新准备数据集")
+        return variant
+
+    def iter_dataset(self, log=print) -> Iterator[Tuple[int, dict]]:
+        """
+        逐行读取元数据，不一次性载入整个文件
+
+        Args:
+            log: 输出跳过信息的函数
+
+        Yields:
+            (样本序号, 元数据记录)；序号按非空行计数，无法解析的行跳过
+        """
+        if self.source is not None:
+            yield from enumerate(self.source)
+            return
+
+        with open(self.metadata_file, "r", encoding="utf-8") as f:
+            index = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    log(f"跳过第 {index+1} 个样本: 元数据格式错误 ({e})")
+                    item = None
+                if isinstance(item, dict):
+                    yield index, item
+                elif item is not None:
+                    log(f"跳过第 {index+1} 个样本: 元数据不是JSON对象")
+                index += 1
+
+    def load_dataset(self) -> List[dict]:
+        """
+        读取元数据
+
+        Returns:
+            样本列表
+        """
+        return [item for _, item in self.iter_dataset()]
+
+    def ground_truth(self, item: dict) -> Optional[str]:
+        """
+        样本的真实标签
+
+        Args:
+            item: 元数据记录
+
+        Returns:
+            统一后的标签，缺失时返回None
+        """
+        return normalize_label(item.get(self.label_field))
+
+    def prediction_label(self, predicted) -> Optional[str]:
+        """
+        将模型输出的标签值转换为类别
+
+        Args:
+            predicted: 模型JSON输出中label_field字段的原始值
+
+        Returns:
+            统一后的预测标签；不在类别列表中时返回None（计为无效预测）
+        """
+        predicted = normalize_label(predicted)
+        return predicted if predicted in self.labels else None
+
+    def _default_parser(self, response: str) -> Optional[dict]:
+        """默认响应解析：只接受包含标签字段的JSON对象"""
+        return extract_json(response, expected_keys=[self.label_field])
+
+    def display_name(self, label: str) -> str:
+        """类别显示名称"""
+        return self.display_names.get(label, label)
+
+    def run_config(self, provider: str, model_name: str, votes: int = 1) -> dict:
+        """
+        结果日志使用的运行配置
+
+        Args:
+            provider: 供应商名称
+            model_name: 模型名称
+            votes: 每个样本的候选回复数（多数投票）
+
+        Returns:
+            运行配置字典
+        """
+        run_config = {
+            "task": self.name,
+            "provider": provider,
+            "model_name": model_name,
+            "prompt": self.prompt_template,
+            "metadata_file": str(self.dataset_file),
+        }
+        if self.source is not None:
+            run_config["source"] = self.source.describe()
+        if self.resolution is not None:
+            run_config["resolution"] = self.resolution
+        if votes > 1:
+            # 只在投票时写入，保持单次调用运行的run_id不变
+            run_config["votes"] = votes
+        return run_config
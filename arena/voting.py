@@ -0,0 +1,143 @@
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from .metrics import format_rows
+from .tasks import EvalTask
+
+
+def majority_vote(labels: Iterable[Optional[str]]) -> Tuple[Optional[str], float]:
+    """
+    多数投票
+
+    无效预测（None）不参与投票，但计入总票数；票数相同时取最先出现的标签。
+
+    Args:
+        labels: 各候选回复统一后的预测标签
+
+    Returns:
+        (多数标签, 一致率)，一致率为多数标签票数 / 总票数；全部无效时为 (None, 0.0)
+    """
+    labels = list(labels)
+    counts = Counter(label for label in labels if label is not None)
+    if not counts:
+        return None, 0.0
+    # Counter保持插入顺序，max返回第一个最大值
+    label = max(counts, key=counts.get)
+    return label, counts[label] / len(labels)
+
+
+def vote_labels(task: EvalTask, record: dict) -> List[Optional[str]]:
+    """样本记录中各候选回复统一后的预测标签；未投票的记录只有一票"""
+    if "votes" in record:
+        return [task.prediction_label(vote) for vote in record["votes"]]
+    return [task.prediction_label(record.get("predicted"))]
+
+
+def accuracy_by_votes(task: EvalTask, records: List[dict], y_true: List[str]) -> List[dict]:
+    """
+    准确率随投票数K的变化
+
+    对每个样本只取前k个候选回复重新投票，不需要额外调用模型。
+
+    Args:
+        task: 评估任务
+        records: 样本记录
+        y_true: 统一后的真实标签
+
+    Returns:
+        每个k一行：k、accuracy、mean_agreement
+    """
+    votes = [vote_labels(task, record) for record in records]
+    max_votes = max((len(v) for v in votes), default=0)
+    rows = []
+    for k in range(1, max_votes + 1):
+        results = [majority_vote(v[:k]) for v in votes]
+        correct = sum(label == truth for (label, _), truth in zip(results, y_true))
+        rows.append({
+            "k": k,
+            "accuracy": correct / len(records),
+            "mean_agreement": sum(agreement for _, agreement in results) / len(records),
+        })
+    return rows
+
+
+def accuracy_by_agreement(task: EvalTask, records: List[dict], y_true: List[str]) -> List[dict]:
+    """
+    按一致率分组的准确率，用于检查一致率能否作为置信度
+
+    Args:
+        task: 评估任务
+        records: 样本记录
+        y_true: 统一后的真实标签
+
+    Returns:
+        每个一致率一行（从高到低）：agreement、samples、accuracy
+    """
+    groups = {}
+    for record, truth in zip(records, y_true):
+        label, agreement = majority_vote(vote_labels(task, record))
+        group = groups.setdefault(round(agreement, 4), [0, 0])
+        group[0] += 1
+        group[1] += label == truth
+    return [
+        {"agreement": agreement, "samples": samples, "accuracy": correct / samples}
+        for agreement, (samples, correct) in sorted(groups.items(), reverse=True)
+    ]
+
+
+def vote_cost(records: List[dict]) -> Optional[dict]:
+    """
+    投票的token成本
+
+    单票成本按 每次请求的输入token + 每个候选的输出token 估算；
+    使用API的 n 参数时图片只上传一次，额外每票只增加输出token。
+
+    Args:
+        records: 样本记录
+
+    Returns:
+        平均每个样本的 votes、requests、single（单票token）、total（全部token）、
+        per_extra_vote（每增加一票的token）；没有投票记录或用量信息时为None
+    """
+    samples = []
+    for record in records:
+        usage = record.get("usage") or {}
+        votes = len(record.get("votes", ()))
+        if votes < 2 or usage.get("prompt_tokens") is None or usage.get("completion_tokens") is None:
+            continue
+        requests = usage.get("requests", 1)
+        single = usage["prompt_tokens"] / requests + usage["completion_tokens"] / votes
+        total = usage["prompt_tokens"] + usage["completion_tokens"]
+        samples.append((votes, requests, single, total, (total - single) / (votes - 1)))
+    if not samples:
+        return None
+    keys = ("votes", "requests", "single", "total", "per_extra_vote")
+    return {key: sum(values) / len(samples) for key, values in zip(keys, zip(*samples))}
+
+
+def print_voting_report(task: EvalTask, records: List[dict], y_true: List[str]):
+    """
+    打印投票统计：准确率随K的变化、按一致率分组的准确率、每增加一票的成本
+
+    Args:
+        task: 评估任务
+        records: 样本记录
+        y_true: 统一后的真实标签
+    """
+    table = [["投票数K", "准确率", "平均一致率"]]
+    for row in accuracy_by_votes(task, records, y_true):
+        table.append([str(row["k"]), f"{row['accuracy'] * 100:.2f}%", f"{row['mean_agreement'] * 100:.1f}%"])
+    print(format_rows(table))
+
+    print()
+    table = [["一致率", "样本数", "准确率"]]
+    for row in accuracy_by_agreement(task, records, y_true):
+        table.append([f"{row['agreement'] * 100:.0f}%", str(row["samples"]), f"{row['accuracy'] * 100:.2f}%"])
+    print(format_rows(table))
+
+    cost = vote_cost(records)
+    if cost is not None:
+        print()
+        print(f"平均每样本: {cost['votes']:.1f} 票，{cost['requests']:.1f} 次请求")
+        print(f"单票token: {cost['single']:.0f}，全部token: {cost['total']:.0f}")
+        print(f"每增加一票: {cost['per_extra_vote']:.0f} token（单票的 {cost['per_extra_vote'] / cost['single'] * 100:.0f}%）")
@@ -0,0 +1,545 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from llm_client import LLMClient
+from .dataset import dataset_size, iter_samples
+from .engine import EvalResult, evaluate_sample, load_image
+from .leaderboard import write_leaderboard
+from .monitoring import Monitor
+from .results_log import ResultLog, is_pending, STATUS_ERROR
+from .results_store import ResultStore
+from .scheduler import TaskBuilder
+from .tasks import EvalTask
+
+# 队列中样本的状态
+STATE_QUEUED = "queued"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    run_config TEXT NOT NULL,
+    dataset_path TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL,
+    sample_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    record TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, sample_id)
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, run_id, seq);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    started REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class WorkQueue:
+    """
+    基于SQLite的评估任务队列
+
+    协调者把待评估样本写入队列，任意数量的worker进程（同一主机或共享存储上的多台主机）
+    按批领取样本并获得租约，评估期间定期心跳续约；租约过期的样本会被其他worker重新领取。
+    租约使用各主机的系统时间，多主机时需保持时钟同步（误差应远小于租约时长）。
+
+    数据库使用默认的回滚日志模式，不使用WAL，以便放在网络文件系统上。
+    可以在多个线程中使用（例如通过 asyncio.to_thread 调用），同一连接上的操作依次执行。
+    """
+
+    def __init__(self, path: Union[str, Path] = "results/queue.sqlite", timeout: float = 30.0):
+        """
+        打开（或创建）队列
+
+        Args:
+            path: 数据库文件路径
+            timeout: 等待其他进程释放数据库锁的秒数
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 自动提交模式，事务由 _transaction 显式控制
+        self._db = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：开始时即获取写锁，避免多个worker领取到同一批样本"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def enqueue(self, run_id: str, run_config: dict, dataset_path: str, items: List[dict]) -> int:
+        """
+        加入一个运行的待评估样本
+
+        已在队列中且尚未汇总的样本保持原状；已完成并汇总过的样本重新排队。
+
+        Args:
+            run_id: 运行ID（与结果日志一致）
+            run_config: 运行配置
+            dataset_path: 数据集目录，worker按此路径读取图片
+            items: 元数据记录
+
+        Returns:
+            新加入（或重新排队）的样本数
+        """
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, run_config["task"], run_config["provider"], run_config["model_name"],
+                 json.dumps(run_config, ensure_ascii=False), dataset_path, time.time()),
+            )
+            before = db.total_changes
+            db.executemany(
+                """
+                INSERT INTO items (run_id, sample_id, seq, item) VALUES (?, ?, ?, ?)
+                ON CONFLICT (run_id, sample_id) DO UPDATE SET
+                    seq = excluded.seq, state = 'queued', worker = NULL, lease_until = NULL, attempts = 0,
+                    started = NULL, finished = NULL, record = NULL, collected = 0
+                WHERE state = 'done' AND collected = 1
+                """,
+                ((run_id, item["file_name"], seq, json.dumps(item, ensure_ascii=False))
+                 for seq, item in enumerate(items)),
+            )
+            return db.total_changes - before
+
+    def register_worker(self, provider: str, model_name: str) -> str:
+        """
+        登记一个worker
+
+        Args:
+            provider: 该worker使用的供应商
+            model_name: 该worker使用的模型
+
+        Returns:
+            worker ID（主机名-进程号-随机后缀）
+        """
+        worker = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO workers (worker, host, provider, model_name, started, heartbeat) VALUES (?, ?, ?, ?, ?, ?)",
+                (worker, socket.gethostname(), provider, model_name, now, now),
+            )
+        return worker
+
+    def claim(self, worker: str, provider: str, model_name: str, batch_size: int,
+              lease: float) -> List[Tuple[str, dict, int]]:
+        """
+        领取一批该 (供应商, 模型) 的样本，包括租约已过期的样本
+
+        Args:
+            worker: worker ID
+            provider: 供应商名称
+            model_name: 模型名称
+            batch_size: 最多领取的样本数
+            lease: 租约时长（秒）
+
+        Returns:
+            (run_id, 元数据记录, 第几次领取) 列表
+        """
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                """
+                SELECT i.run_id, i.sample_id, i.item, i.attempts FROM items i JOIN runs r ON r.run_id = i.run_id
+                WHERE r.provider = ? AND r.model_name = ?
+                    AND (i.state = 'queued' OR (i.state = 'leased' AND i.lease_until < ?))
+                ORDER BY r.created, i.seq LIMIT ?
+                """,
+                (provider, model_name, now, batch_size),
+            ).fetchall()
+            db.executemany(
+                """
+                UPDATE items SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1,
+                    started = COALESCE(started, ?)
+                WHERE run_id = ? AND sample_id = ?
+                """,
+                ((worker, now + lease, now, row["run_id"], row["sample_id"]) for row in rows),
+            )
+            db.execute("UPDATE workers SET heartbeat = ? WHERE worker = ?", (now, worker))
+        return [(row["run_id"], json.loads(row["item"]), row["attempts"] + 1) for row in rows]
+
+    def heartbeat(self, worker: str, lease: float) -> int:
+        """
+        为该worker持有的全部样本续约
+
+        Args:
+            worker: worker ID
+            lease: 从现在起的租约时长（秒）
+
+        Returns:
+            仍持有的样本数
+        """
+        now = time.time()
+        with self._transaction() as db:
+            held = db.execute(
+                "UPDATE items SET lease_until = ? WHERE worker = ? AND state = 'leased'", (now + lease, worker)
+            ).rowcount
+            db.execute("UPDATE workers SET heartbeat = ? WHERE worker = ?", (now, worker))
+        return held
+
+    def complete(self, worker: str, run_id: str, record: dict) -> bool:
+        """
+        提交样本结果
+
+        Args:
+            worker: worker ID
+            run_id: 运行ID
+            record: evaluate_sample返回的样本记录
+
+        Returns:
+            是否被接受；租约过期且已被其他worker领取时为False
+        """
+        with self._transaction() as db:
+            accepted = db.execute(
+                """
+                UPDATE items SET state = 'done', finished = ?, record = ?
+                WHERE run_id = ? AND sample_id = ? AND worker = ? AND state = 'leased'
+                """,
+                (time.time(), json.dumps(record, ensure_ascii=False), run_id, record["sample_id"], worker),
+            ).rowcount == 1
+            if accepted:
+                db.execute(
+                    "UPDATE workers SET completed = completed + 1, failures = failures + ? WHERE worker = ?",
+                    (int(record.get("status") == STATUS_ERROR), worker),
+                )
+        return accepted
+
+    def release(self, worker: str) -> int:
+        """
+        归还该worker持有的全部样本（worker正常退出时调用），不计入领取次数
+
+        Args:
+            worker: worker ID
+
+        Returns:
+            归还的样本数
+        """
+        with self._transaction() as db:
+            return db.execute(
+                """
+                UPDATE items SET state = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1
+                WHERE worker = ? AND state = 'leased'
+                """,
+                (worker,),
+            ).rowcount
+
+    def runs(self) -> List[dict]:
+        """队列中的全部运行（run_config已解析）"""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM runs ORDER BY created").fetchall()
+        return [dict(row, run_config=json.loads(row["run_config"])) for row in rows]
+
+    def progress(self, run_id: str) -> Dict[str, int]:
+        """
+        运行的进度
+
+        Args:
+            run_id: 运行ID
+
+        Returns:
+            状态 -> 样本数，另有 expired 为租约已过期的样本数
+        """
+        counts = {STATE_QUEUED: 0, STATE_LEASED: 0, STATE_DONE: 0}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, COUNT(*) FROM items WHERE run_id = ? GROUP BY state", (run_id,)
+            ).fetchall()
+            counts["expired"] = self._db.execute(
+                "SELECT COUNT(*) FROM items WHERE run_id = ? AND state = 'leased' AND lease_until < ?",
+                (run_id, time.time()),
+            ).fetchone()[0]
+        for row in rows:
+            counts[row[0]] = row[1]
+        return counts
+
+    def done_records(self, run_id: str, uncollected_only: bool = False) -> List[dict]:
+        """
+        已完成样本的记录（按入队顺序）
+
+        Args:
+            run_id: 运行ID
+            uncollected_only: 只返回尚未汇总到结果日志的记录
+
+        Returns:
+            样本记录列表，每条附带 worker 字段
+        """
+        with self._lock:
+            rows = self._db.execute(
+                f"""
+                SELECT record, worker FROM items WHERE run_id = ? AND state = 'done'
+                {"AND collected = 0" if uncollected_only else ""} ORDER BY seq
+                """,
+                (run_id,),
+            ).fetchall()
+        return [dict(json.loads(row["record"]), worker=row["worker"]) for row in rows]
+
+    def mark_collected(self, run_id: str, sample_ids: List[str]):
+        """
+        标记样本结果已汇总到结果日志
+
+        Args:
+            run_id: 运行ID
+            sample_ids: 样本ID
+        """
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE items SET collected = 1 WHERE run_id = ? AND sample_id = ?",
+                ((run_id, sample_id) for sample_id in sample_ids),
+            )
+
+    def interval(self, run_id: str) -> Optional[Tuple[float, float]]:
+        """运行中首次领取到最后一次完成的时间（系统时间），没有完成的样本时为None"""
+        with self._lock:
+            started, finished = self._db.execute(
+                "SELECT MIN(started), MAX(finished) FROM items WHERE run_id = ? AND state = 'done'", (run_id,)
+            ).fetchone()
+        return (started, finished) if started is not None else None
+
+    def workers(self) -> List[dict]:
+        """全部worker的统计（按开始时间排序）"""
+        with self._lock:
+            return [dict(row) for row in self._db.execute("SELECT * FROM workers ORDER BY started").fetchall()]
+
+    def close(self):
+        """关闭数据库连接"""
+        self._db.close()
+
+
+def build_run_task(run: dict, task_builders: Dict[str, TaskBuilder]) -> EvalTask:
+    """
+    按队列中记录的运行配置重建评估任务
+
+    Args:
+        run: WorkQueue.runs() 中的一项
+        task_builders: 任务名称 -> 构建函数
+
+    Returns:
+        评估任务（提示词、数据集目录与图片分辨率与入队时一致）
+    """
+    # 分辨率任务的名称带 @<分辨率>px 后缀，按原任务名称查找构建函数后重新选择分辨率
+    resolution = run["run_config"].get("resolution")
+    name = run["task"] if resolution is None else run["task"].removesuffix(f"@{resolution}px")
+    if name not in task_builders:
+        raise ValueError(f"未知任务: {name}，可用任务: {', '.join(task_builders)}")
+    return task_builders[name](
+        dataset_path=Path(run["dataset_path"]), prompt_template=run["run_config"]["prompt"]
+    ).at_resolution(resolution)
+
+
+def enqueue_run(queue: WorkQueue, task: EvalTask, provider: str, model_name: str,
+                log_dir: Union[str, Path] = "results/logs", retry_failures_only: bool = False,
+                votes: int = 1) -> Tuple[str, int]:
+    """
+    协调者：把结果日志中尚未完成的样本加入队列
+
+    Args:
+        queue: 任务队列
+        task: 评估任务
+        provider: 供应商名称
+        model_name: 模型名称
+        log_dir: 结果日志目录
+        retry_failures_only: 为True时只加入日志中失败的样本
+        votes: 每个样本的候选回复数
+
+    Returns:
+        (run_id, 新加入的样本数)
+    """
+    result_log = ResultLog(log_dir, task.name, task.run_config(provider, model_name, votes))
+    previous = result_log.load()
+    items = [
+        item for _, item, _ in iter_samples(task)
+        if is_pending(item["file_name"], previous, retry_failures_only)
+    ]
+    return result_log.run_id, queue.enqueue(result_log.run_id, result_log.run_config, str(task.dataset_path), items)
+
+
+async def run_worker(queue: WorkQueue, client: LLMClient, provider: str, model_name: str,
+                     task_builders: Dict[str, TaskBuilder], batch_size: int = 8, concurrency: int = 4,
+                     lease: float = 120.0, max_attempts: int = 3, wait: bool = False,
+                     poll_interval: float = 5.0, prefetch_workers: int = 4,
+                     monitor: Optional[Monitor] = None) -> int:
+    """
+    worker：持续领取该 (供应商, 模型) 的样本，调用模型并提交结果
+
+    Args:
+        queue: 任务队列
+        client: LLM客户端
+        provider: 供应商名称
+        model_name: 模型名称
+        task_builders: 任务名称 -> 构建函数
+        batch_size: 每次领取的样本数
+        concurrency: 同时进行的模型调用数
+        lease: 租约时长（秒），每 lease/3 秒心跳续约一次
+        max_attempts: 同一样本最多被领取的次数，超过后直接记为失败（例如每次都导致worker崩溃）
+        wait: 队列为空时继续等待新样本，否则退出
+        poll_interval: 等待新样本时的轮询间隔（秒）
+        prefetch_workers: 预读取图片的线程数
+        monitor: 实时监控（可选，需已启动），导出本worker的请求、错误与延迟指标
+
+    Returns:
+        本worker提交且被接受的样本数
+    """
+    worker = queue.register_worker(provider, model_name)
+    print(f"worker {worker} 已启动: {provider}/{model_name}")
+
+    tasks: Dict[str, Tuple[EvalTask, int]] = {}
+    runs = {}
+    monitors = {}
+
+    def claim_batch():
+        # 在线程中执行：数据库锁被其他worker占用时（最长 timeout 秒）不阻塞事件循环与心跳
+        claimed = queue.claim(worker, provider, model_name, batch_size, lease)
+        if any(run_id not in runs for run_id, _, _ in claimed):
+            runs.update((run["run_id"], run) for run in queue.runs())
+        return claimed
+
+    def run_task(run_id: str) -> Tuple[EvalTask, int]:
+        if run_id not in tasks:
+            run = runs[run_id]
+            tasks[run_id] = build_run_task(run, task_builders), run["run_config"].get("votes", 1)
+            if monitor is not None:
+                monitors[run_id] = monitor.run(run["task"], provider, model_name, run_id)
+        return tasks[run_id]
+
+    completed = 0
+
+    async def process(run_id: str, item: dict, attempt: int, prefetched):
+        nonlocal completed
+        task, votes = run_task(run_id)
+        if attempt > max_attempts:
+            prefetched.cancel()
+            record = {"sample_id": item["file_name"], "ground_truth": item.get(task.label_field),
+                      "status": STATUS_ERROR, "error": f"超过最大领取次数 {max_attempts}"}
+        else:
+            record = await evaluate_sample(task, client, item, votes=votes, prefetched=prefetched,
+                                           monitor=monitors.get(run_id))
+        if await asyncio.to_thread(queue.complete, worker, run_id, record):
+            completed += 1
+        else:
+            print(f"租约已过期，样本已由其他worker处理: {item['file_name']}")
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(lease / 3)
+            await asyncio.to_thread(queue.heartbeat, worker, lease)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, prefetch_workers), thread_name_prefix="prefetch")
+    beat = asyncio.ensure_future(heartbeat())
+    # 已领取、图片已在后台读取、等待调用的样本
+    backlog = deque()
+    running = set()
+    try:
+        while True:
+            if len(backlog) < max(1, concurrency):
+                for run_id, item, attempt in await asyncio.to_thread(claim_batch):
+                    task, _ = run_task(run_id)
+                    backlog.append((run_id, item, attempt, executor.submit(load_image, task, item)))
+            while backlog and len(running) < max(1, concurrency):
+                running.add(asyncio.ensure_future(process(*backlog.popleft())))
+            if not running:
+                if not wait:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                future.result()
+    finally:
+        beat.cancel()
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # 未完成的样本立即归还，不必等租约过期
+        released = queue.release(worker)
+        print(f"worker {worker} 退出: 提交 {completed} 个样本" + (f"，归还 {released} 个" if released else ""))
+    return completed
+
+
+def collect_run(queue: WorkQueue, run: dict, task_builders: Dict[str, TaskBuilder],
+                log_dir: Union[str, Path] = "results/logs",
+                store_dir: Optional[Union[str, Path]] = "results/store",
+                leaderboard_file: Optional[Union[str, Path]] = "results/leaderboard.md") -> EvalResult:
+    """
+    协调者：把队列中已完成的结果写入结果日志，并合并所有worker的指标
+
+    Args:
+        queue: 任务队列
+        run: WorkQueue.runs() 中的一项
+        task_builders: 任务名称 -> 构建函数
+        log_dir: 结果日志目录
+        store_dir: 列式结果库目录；None表示不写入
+        leaderboard_file: 写入结果库后重新生成的排行榜；None表示不生成
+
+    Returns:
+        评估结果；延迟统计覆盖该运行在队列中完成的全部样本，墙钟时间为首次领取到最后完成
+    """
+    task = build_run_task(run, task_builders)
+    with ResultLog(log_dir, task.name, run["run_config"]) as result_log:
+        new_records = queue.done_records(run["run_id"], uncollected_only=True)
+        for record in new_records:
+            result_log.append({key: value for key, value in record.items() if key != "worker"})
+    queue.mark_collected(run["run_id"], [record["sample_id"] for record in new_records])
+
+    records = result_log.load()
+    queued = queue.done_records(run["run_id"])
+    progress = queue.progress(run["run_id"])
+    result = EvalResult(task, run["provider"], run["model_name"], result_log, dataset_size(task),
+                        sum(progress[state] for state in (STATE_QUEUED, STATE_LEASED, STATE_DONE)))
+    result.calls_made = len(queued)
+    for record in queued:
+        result.latency.add(record)
+    interval = queue.interval(run["run_id"])
+    if interval is not None:
+        result.latency.set_interval(*interval)
+
+    for _, item, ground_truth in iter_samples(task, log=lambda *args, **kwargs: None):
+        record = records.get(item["file_name"])
+        if record is not None:
+            result.add(record, ground_truth, task.prediction_label(record.get("predicted")))
+
+    if store_dir is not None:
+        store = ResultStore(store_dir)
+        store.write_run(result_log.run_config, result_log.run_id, list(records.values()))
+        if leaderboard_file is not None:
+            write_leaderboard(store, leaderboard_file)
+    return result
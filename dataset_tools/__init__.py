@@ -0,0 +1,15 @@
+"""
+Dataset preparation helpers shared by scripts/, the evaluation tasks and training.
+"""
+
+from .gaze import RENDER_VERSION, crop_geometry, plan_outputs, render_box, render_crop, slugify
+from .image_index import index_images, load_image_index, probe_image
+from .labels import iter_labels
+from .virtual import VirtualGazeDataset
+from .packed import PackedDataset, is_packed, pack_dataset
+from .pyramid import build_pyramid, parse_resolutions, variant_file_name
+
+__all__ = ["RENDER_VERSION", "crop_geometry", "plan_outputs", "render_box", "render_crop", "slugify",
+           "iter_labels", "VirtualGazeDataset", "PackedDataset", "is_packed", "pack_dataset",
+           "build_pyramid", "parse_resolutions", "variant_file_name",
+           "index_images", "load_image_index", "probe_image"]
@@ -0,0 +1,154 @@
+"""Perceptual-hash deduplication of near-identical frames (e.g. consecutive surveillance frames)."""
+
+import numpy as np
+from PIL import Image
+
+# Bump when the hash changes, so cached hashes are recomputed
+PHASH_VERSION = 1
+# Side of the grayscale thumbnail the DCT runs on, and of the low-frequency block kept (8x8 = 64 bits)
+SAMPLE_SIZE = 32
+HASH_SIZE = 8
+
+
+def _dct_matrix(n):
+    """Unnormalized DCT-II basis: row k is cos(pi * (2x + 1) * k / 2n)."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n)).astype(np.float32)
+
+
+_DCT = _dct_matrix(SAMPLE_SIZE)
+
+
+def box_region(box, padding=0.5):
+    """The box extended by padding times its size per side, as fractions (left, top, right, bottom) of the frame."""
+    pad_x, pad_y = box['w'] * padding, box['h'] * padding
+    return (max(0.0, box['x'] - pad_x), max(0.0, box['y'] - pad_y),
+            min(1.0, box['x'] + box['w'] + pad_x), min(1.0, box['y'] + box['h'] + pad_y))
+
+
+def thumbnail(image, region=None):
+    """SAMPLE_SIZE x SAMPLE_SIZE grayscale float array of the image, or of a region (see box_region)."""
+    gray = image.convert('L')
+    if region is not None:
+        left, top, right, bottom = region
+        width, height = gray.size
+        gray = gray.crop((int(left * width), int(top * height),
+                          max(int(left * width) + 1, round(right * width)),
+                          max(int(top * height) + 1, round(bottom * height))))
+    return np.asarray(gray.resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.BILINEAR), dtype=np.float32)
+
+
+def load_thumbnails(path, regions=(None,)):
+    """Thumbnails of several regions of one image file, decoding it once."""
+    with Image.open(path) as image:
+        # JPEG frames are decoded at reduced scale and in grayscale, plenty for a 32x32 thumbnail
+        image.draft('L', (image.width // 4, image.height // 4))
+        return [thumbnail(image, region) for region in regions]
+
+
+def phash(thumbnails):
+    """
+    64-bit perceptual hashes of a batch of thumbnails, as a uint64 array.
+
+    The 2-D DCT of the whole batch is two matrix products; each bit says whether
+    one of the 8x8 lowest-frequency coefficients is above the image's median.
+    Small changes (noise, compression, lighting flicker, a person shifting
+    slightly) flip only a few bits.
+    """
+    pixels = np.asarray(thumbnails, dtype=np.float32).reshape(-1, SAMPLE_SIZE, SAMPLE_SIZE)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    bits = coefficients > np.median(coefficients, axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def hamming(a, b):
+    return (int(a) ^ int(b)).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+
+    Finds every stored hash within a radius of a query by the triangle
+    inequality, visiting only children whose edge distance is within the radius
+    of the query's distance to their parent instead of comparing against every
+    stored hash.
+    """
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, value, item):
+        node = (int(value), item, {})
+        self.size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def query(self, value, radius):
+        """(distance, item) of every stored hash within radius bits of value."""
+        matches = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                matches.append((distance, item))
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return matches
+
+
+def cluster(hashes, threshold, groups=None):
+    """
+    Greedy near-duplicate clustering in input order.
+
+    Each item joins the closest earlier representative (the earliest on ties)
+    of the same group whose hash differs by at most threshold bits; otherwise it
+    becomes a representative itself. Representatives never move, so a slow
+    drift (a long static scene with changing light) starts a new cluster once
+    it is threshold bits away from the first frame.
+
+    groups: optional key per item; items in different groups (e.g. different
+        labels) are never merged.
+
+    Returns the representative index of every item.
+    """
+    trees = {}
+    representatives = []
+    for index, value in enumerate(hashes):
+        tree = trees.setdefault(None if groups is None else groups[index], BKTree())
+        matches = tree.query(value, threshold)
+        if matches:
+            representatives.append(min(matches)[1])
+        else:
+            tree.add(value, index)
+            representatives.append(index)
+    return representatives
+
+
+def cluster_sizes(representatives):
+    """Number of items each representative stands for (its weight), keyed by representative index."""
+    sizes = {}
+    for representative in representatives:
+        sizes[representative] = sizes.get(representative, 0) + 1
+    return sizes
+
+
+def savings_report(total, kept, threshold):
+    """One-line summary of how much a deduplicated dataset saves per evaluation."""
+    removed = total - kept
+    share = removed / total * 100 if total else 0.0
+    return (f"Dedup (<= {threshold} bits): kept {kept} of {total} samples, dropped {removed} near-duplicates; "
+            f"every evaluation makes {removed} fewer model calls per prompt and model ({share:.1f}% saved)")
@@ -0,0 +1,122 @@
+"""Gaze-direction sample rendering shared by the dataset build, the virtual dataset and training."""
+
+import math
+import os
+import re
+import unicodedata
+
+from PIL import Image, ImageDraw
+
+# Bump when the rendering changes, so the next build re-renders every image
+RENDER_VERSION = 1
+
+
+def slugify(value, allow_unicode=False):
+    """
+    Taken from https://github.com/django/django/blob/master/django/utils/text.py
+    Convert to ASCII if 'allow_unicode' is False. Convert spaces or repeated
+    dashes to single dashes. Remove characters that aren't alphanumerics,
+    underscores, or hyphens. Convert to lowercase. Also strip leading and
+    trailing whitespace, dashes, and underscores.
+    """
+    value = str(value)
+    if allow_unicode:
+        value = unicodedata.normalize('NFKC', value)
+    else:
+        value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    value = re.sub(r'[^\w\s-]', '', value.lower())
+    return re.sub(r'[-\s]+', '-', value).strip('-_')
+
+
+def crop_geometry(box, image_size, padding, thumbnail):
+    """
+    Where the ROI crop of a box is taken from and how the output image is laid out.
+
+    The crop extends the box by padding times its width/height on each side
+    (clipped to the frame). With a thumbnail width, a downscaled copy of the whole
+    frame is placed below the crop so the model still sees where the person stands
+    relative to the rolling line. All coordinates are integer pixels:
+    region is [x, y, w, h] in the source frame; box ([x1, y1, x2, y2]) and
+    context ([x, y, w, h]) are in the output image.
+    """
+    width, height = image_size
+    x1, y1 = box['x'] * width, box['y'] * height
+    x2, y2 = (box['x'] + box['w']) * width, (box['y'] + box['h']) * height
+    pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+    left, top = max(0, math.floor(x1 - pad_x)), max(0, math.floor(y1 - pad_y))
+    right, bottom = min(width, math.ceil(x2 + pad_x)), min(height, math.ceil(y2 + pad_y))
+
+    geometry = {
+        "source_size": [width, height],
+        "region": [left, top, right - left, bottom - top],
+        "padding": padding,
+        "box": [round(x1 - left), round(y1 - top), round(x2 - left), round(y2 - top)],
+        "context": None,
+    }
+    if thumbnail:
+        context_width = min(thumbnail, width)
+        geometry["context"] = [0, bottom - top, context_width, max(1, round(height * context_width / width))]
+    return geometry
+
+
+def plan_outputs(image_name, boxes, image_size=None, padding=0.5, thumbnail=320):
+    """
+    (output file name, box, metadata entry) for every usable box of one source image.
+
+    With image_size (crop mode) the metadata entry also records the crop geometry.
+    """
+    sanitized_image_name = slugify(os.path.splitext(image_name)[0])
+    outputs = []
+    for box in boxes:
+        if box['w'] == 0 or box['h'] == 0:
+            continue
+        if not box['fields'].get('gaze_direction'):
+            continue
+
+        output_image_filename = f"{sanitized_image_name}_{box['id']}.jpg"
+        metadata_entry = {
+            "file_name": os.path.join('images', output_image_filename),
+            **box['fields']
+        }
+        if image_size is not None:
+            metadata_entry["crop"] = crop_geometry(box, image_size, padding, thumbnail)
+        outputs.append((output_image_filename, box, metadata_entry))
+    return outputs
+
+
+def render_box(original_image, box):
+    """The full frame with the box drawn in red."""
+    width, height = original_image.size
+    img_copy = original_image.copy()
+    draw = ImageDraw.Draw(img_copy)
+
+    x1 = box['x'] * width
+    y1 = box['y'] * height
+    x2 = (box['x'] + box['w']) * width
+    y2 = (box['y'] + box['h']) * height
+
+    draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
+    return img_copy
+
+
+def render_crop(original_image, box, geometry):
+    """ROI crop with the box outlined, plus the whole-frame context thumbnail below it if requested."""
+    left, top, crop_width, crop_height = geometry["region"]
+    crop = original_image.crop((left, top, left + crop_width, top + crop_height))
+    ImageDraw.Draw(crop).rectangle(geometry["box"], outline="red", width=2)
+    if geometry["context"] is None:
+        return crop
+
+    _, context_top, context_width, context_height = geometry["context"]
+    width, height = original_image.size
+    context = original_image.resize((context_width, context_height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    scale = context_width / width
+    ImageDraw.Draw(context).rectangle(
+        [box['x'] * width * scale, box['y'] * height * scale,
+         (box['x'] + box['w']) * width * scale, (box['y'] + box['h']) * height * scale],
+        outline="red", width=2,
+    )
+    canvas = Image.new("RGB", (max(crop_width, context_width), context_top + context_height))
+    canvas.paste(crop, (0, 0))
+    canvas.paste(context, (0, context_top))
+    return canvas
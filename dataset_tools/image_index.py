@@ -0,0 +1,136 @@
+"""Header-only image indexing: dimensions, format, EXIF orientation, content hash and corruption checks."""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+INDEX_NAME = '.image-index.jsonl'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+# EXIF tag holding the orientation (1 = upright; 5-8 swap width and height when displayed)
+ORIENTATION_TAG = 0x0112
+# How far from the end of the file the end-of-image marker is looked for (some encoders pad the tail)
+TAIL_SIZE = 64
+
+
+def _truncated(path, image_format):
+    """True if the file lacks the end marker of its format (JPEG EOI, PNG IEND, GIF trailer)."""
+    markers = {'JPEG': b'\xff\xd9', 'MPO': b'\xff\xd9', 'PNG': b'IEND\xaeB`\x82', 'GIF': b';'}
+    marker = markers.get(image_format)
+    if marker is None:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(max(0, os.fstat(f.fileno()).st_size - TAIL_SIZE))
+        tail = f.read().rstrip(b'\x00')
+    return marker not in tail if image_format in ('JPEG', 'MPO') else not tail.endswith(marker)
+
+
+def probe_image(path, verify=False):
+    """
+    Format, stored width/height and EXIF orientation of an image, reading only its header.
+
+    Corruption shows up as an "error" entry: unreadable headers, a missing end
+    marker (truncated upload or copy) and, with verify, any decoding error in
+    the pixel data (this decodes the whole image).
+    """
+    info = {"format": None, "width": None, "height": None, "orientation": None, "error": None}
+    try:
+        with Image.open(path) as image:
+            info.update(format=image.format, width=image.width, height=image.height)
+            info["orientation"] = image.getexif().get(ORIENTATION_TAG, 1)
+            if verify:
+                image.load()
+        if _truncated(path, info["format"]):
+            info["error"] = "truncated: end-of-image marker missing"
+    except Exception as e:
+        info["error"] = f"{type(e).__name__}: {e}"
+    return info
+
+
+def _index_entry(path, stat, verify):
+    """Index entry of one file; the hash reads the file in large chunks with the GIL released."""
+    with open(path, 'rb') as f:
+        sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256, **probe_image(path, verify),
+            "verified": verify}
+
+
+def load_image_index(images_dir):
+    """name -> index entry from the sidecar index of images_dir ({} if it has not been indexed)."""
+    index = {}
+    try:
+        with open(os.path.join(images_dir, INDEX_NAME), 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    index[entry.pop("name")] = entry
+    except FileNotFoundError:
+        pass
+    return index
+
+
+def lookup(index, path, stat=None):
+    """The index entry of path if the file is unchanged since it was indexed (same size and mtime), else None."""
+    entry = index.get(os.path.basename(path))
+    if entry is None:
+        return None
+    stat = stat or os.stat(path)
+    if entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+        return None
+    return entry
+
+
+def index_images(images_dir, workers=None, verify=False, progress=None):
+    """
+    Index every image in images_dir and write the sidecar index (INDEX_NAME).
+
+    Files are listed with os.scandir, whose stat results come with the listing.
+    Entries of files whose size and mtime are unchanged are reused from the
+    previous index, so only new or modified images are read. The rest are
+    hashed and probed in a thread pool.
+
+    Args:
+        images_dir: directory of images (not recursive)
+        workers: threads (default: ThreadPoolExecutor's default)
+        verify: fully decode every new image to catch corrupt pixel data
+        progress: optional callable invoked once per probed image
+
+    Returns:
+        name -> entry, sorted by name
+    """
+    previous = load_image_index(images_dir)
+    files = []
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                files.append((entry.name, entry.path, entry.stat()))
+    files.sort()
+
+    index = {}
+    stale = []
+    for name, path, stat in files:
+        entry = previous.get(name)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns \
+                and (entry["verified"] or not verify):
+            index[name] = entry
+        else:
+            stale.append((name, path, stat))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(name, executor.submit(_index_entry, path, stat, verify)) for name, path, stat in stale]
+        for name, future in futures:
+            index[name] = future.result()
+            if progress is not None:
+                progress()
+
+    index = dict(sorted(index.items()))
+    index_path = os.path.join(images_dir, INDEX_NAME)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for name, entry in index.items():
+            f.write(json.dumps({"name": name, **entry}, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, index_path)
+    return index
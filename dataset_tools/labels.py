@@ -0,0 +1,108 @@
+"""Streaming reader for the labels.json files exported by the labeling tool."""
+
+import json
+import re
+
+CHUNK_SIZE = 1024 ** 2
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _Stream:
+    """Text buffer over a file that keeps only the unparsed tail plus one chunk in memory."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # File position of buffer[0]: chars dropped so far, and its line and column (1-based)
+        self.offset = 0
+        self.line = 1
+        self.column = 1
+
+    def fill(self):
+        """Read one more chunk, dropping the part of the buffer that is already parsed."""
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        parsed = self.buffer[:self.pos]
+        newlines = parsed.count('\n')
+        self.offset += self.pos
+        self.line += newlines
+        self.column = self.pos - parsed.rindex('\n') if newlines else self.column + self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of file), without consuming it."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, chars, message):
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(message)
+        self.pos += 1
+        return char
+
+    def decode(self, decoder):
+        """Decode the next JSON value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise self.error(e.msg, e.pos) from None
+                self.fill()
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def error(self, message, pos=None):
+        """JSONDecodeError at buffer position pos (default: the current one), reporting file positions."""
+        pos = self.pos if pos is None else pos
+        error = json.JSONDecodeError(message, self.buffer, pos)
+        newlines = self.buffer.count('\n', 0, pos)
+        error.pos = self.offset + pos
+        error.lineno = self.line + newlines
+        error.colno = pos - self.buffer.rindex('\n', 0, pos) if newlines else self.column + pos
+        error.args = (f"{message}: line {error.lineno} column {error.colno} (char {error.pos})",)
+        return error
+
+
+def iter_labels(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield (key, entry) for every member of the top-level object of a labels.json
+    file, in file order, as soon as it is parsed.
+
+    Equivalent to json.load(f).items(), but memory stays bounded by one entry
+    plus one chunk however large the file grows, and the caller can start
+    working before the whole file has been read. Duplicate keys are yielded
+    as they appear (json.load would keep the last one).
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _Stream(f, chunk_size)
+        stream.expect('{', "Expecting '{' (labels.json holds one object)")
+        if stream.peek() == '}':
+            stream.pos += 1
+        else:
+            while True:
+                if stream.peek() != '"':
+                    raise stream.error("Expecting property name enclosed in double quotes")
+                key = stream.decode(decoder)
+                stream.expect(':', "Expecting ':' delimiter")
+                yield key, stream.decode(decoder)
+                if stream.expect(',}', "Expecting ',' delimiter") == '}':
+                    break
+        if stream.peek():
+            raise stream.error("Extra data")
@@ -0,0 +1,176 @@
+import io
+import json
+import mmap
+import os
+import tarfile
+import threading
+
+from PIL import Image
+
+INDEX_NAME = 'index.jsonl'
+DEFAULT_SHARD_SIZE = 256 * 1024 ** 2
+
+
+def _sample_key(file_name):
+    """WebDataset sample key: the file name without its extension (slugified names contain no other dots)."""
+    return os.path.splitext(file_name)[0]
+
+
+def _add_member(tar, name, data):
+    """Append one regular file to the tar and return the offset of its data in the shard."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    # Fixed metadata so identical inputs produce identical shards
+    info.mtime = 0
+    tar.addfile(info, io.BytesIO(data))
+    # addfile leaves tar.offset after the data, padded to whole blocks
+    return tar.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def pack_dataset(dataset_dir, output_dir, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Export an imagefolder dataset (metadata.jsonl + images/) to uncompressed tar shards.
+
+    Each sample is stored WebDataset-style as "<key>.<ext>" (image bytes) and
+    "<key>.json" (its metadata line), so the shards can also be read by any
+    WebDataset tool. index.jsonl lists the samples in order with the shard,
+    byte offset and size of each image (and of its resolution variants, see
+    dataset_tools.pyramid), for random access without scanning the tars.
+    Shards are written under a temporary name and renamed when complete, and
+    the index is written last.
+
+    Returns the number of samples packed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name == INDEX_NAME or (name.startswith('shard-') and name.endswith('.tar')):
+            os.remove(os.path.join(output_dir, name))
+
+    entries = []
+    shard_index = -1
+    tar = None
+    tmp_path = shard_path = None
+
+    def close_shard():
+        if tar is not None:
+            tar.close()
+            os.replace(tmp_path, shard_path)
+
+    with open(os.path.join(dataset_dir, 'metadata.jsonl'), 'r', encoding='utf-8') as meta_f:
+        for line in meta_f:
+            if not line.strip():
+                continue
+            metadata = json.loads(line)
+            image_path = os.path.join(dataset_dir, metadata['file_name'])
+            if not os.path.exists(image_path):
+                print(f"Image not found, skipping: {image_path}")
+                continue
+            with open(image_path, 'rb') as f:
+                data = f.read()
+
+            if tar is None or tar.offset + len(data) > shard_size:
+                close_shard()
+                shard_index += 1
+                shard_name = f"shard-{shard_index:05d}.tar"
+                shard_path = os.path.join(output_dir, shard_name)
+                tmp_path = f"{shard_path}.tmp"
+                tar = tarfile.open(tmp_path, 'w', format=tarfile.USTAR_FORMAT)
+
+            key = _sample_key(metadata['file_name'])
+            offset = _add_member(tar, key + os.path.splitext(metadata['file_name'])[1], data)
+            _add_member(tar, key + '.json', (json.dumps(metadata, ensure_ascii=False) + '\n').encode('utf-8'))
+            entry = {'metadata': metadata, 'shard': shard_name, 'offset': offset, 'size': len(data)}
+            # Resolution variants go into the same shard as "<key>.<N>px.jpg"
+            variants = {}
+            for resolution, variant in (metadata.get('resolutions') or {}).items():
+                with open(os.path.join(dataset_dir, variant), 'rb') as f:
+                    variant_data = f.read()
+                variant_offset = _add_member(tar, f"{key}.{resolution}px{os.path.splitext(variant)[1]}", variant_data)
+                variants[variant] = [variant_offset, len(variant_data)]
+            if variants:
+                entry['variants'] = variants
+            entries.append(entry)
+    close_shard()
+
+    tmp_index = os.path.join(output_dir, INDEX_NAME + '.tmp')
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(tmp_index, os.path.join(output_dir, INDEX_NAME))
+    return len(entries)
+
+
+def is_packed(path):
+    """True if path is a directory written by pack_dataset."""
+    return os.path.isfile(os.path.join(path, INDEX_NAME))
+
+
+class PackedDataset:
+    """
+    Reads a dataset written by pack_dataset through memory-mapped shards.
+
+    The index is loaded once; images are sliced straight out of the mapped tar
+    files, so reading needs no per-sample open/stat and iterating in index
+    order is sequential I/O. Safe to use from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self.dataset_file = os.path.join(self.path, INDEX_NAME)
+        with open(self.dataset_file, 'r', encoding='utf-8') as f:
+            self._entries = [json.loads(line) for line in f if line.strip()]
+        self.records = [entry['metadata'] for entry in self._entries]
+        self._locations = {}
+        for record, entry in zip(self.records, self._entries):
+            self._locations[record['file_name']] = (entry['shard'], entry['offset'], entry['size'])
+            for variant, (offset, size) in entry.get('variants', {}).items():
+                self._locations[variant] = (entry['shard'], offset, size)
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        """HF-style sample: the decoded image plus the metadata fields."""
+        record = self.records[index]
+        return {**record, "image": Image.open(io.BytesIO(self.encode(record)))}
+
+    def describe(self):
+        return {"packed": self.path}
+
+    def _map(self, shard):
+        with self._lock:
+            mapped = self._maps.get(shard)
+            if mapped is None:
+                with open(os.path.join(self.path, shard), 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                self._maps[shard] = mapped
+            return mapped
+
+    def encode(self, record):
+        """The stored image bytes of a record (looked up by file_name, which may name a resolution variant)."""
+        shard, offset, size = self._locations[record['file_name']]
+        return self._map(shard)[offset:offset + size]
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
+
+    def to_hf_dataset(self):
+        """A datasets.Dataset of the metadata whose "image" column is decoded lazily from the shards."""
+        from datasets import Dataset
+
+        def add_images(batch):
+            file_names = batch['file_name']
+            return {**batch, "image": [Image.open(io.BytesIO(self.encode({'file_name': name})))
+                                       for name in file_names]}
+
+        return Dataset.from_list(self.records).with_transform(add_images)
@@ -0,0 +1,61 @@
+"""Multi-resolution variants of dataset images, so resolution sweeps need no re-preprocessing."""
+
+import os
+
+from PIL import Image
+
+
+def parse_resolutions(value):
+    """'448,672,1024' -> [448, 672, 1024] (sorted, duplicates removed)."""
+    resolutions = sorted({int(part) for part in str(value).split(',') if part.strip()})
+    if any(resolution <= 0 for resolution in resolutions):
+        raise ValueError(f"Resolutions must be positive: {value}")
+    return resolutions
+
+
+def variant_file_name(file_name, resolution):
+    """images/x.jpg -> images/x_448px.jpg; variants are always JPEG."""
+    return f"{os.path.splitext(file_name)[0]}_{resolution}px.jpg"
+
+
+def variant_files(file_name, resolutions):
+    """The "resolutions" metadata field: resolution (as a string, JSON keys are strings) -> variant file name."""
+    return {str(resolution): variant_file_name(file_name, resolution) for resolution in resolutions}
+
+
+def build_pyramid(image, resolutions):
+    """
+    Resized copies of image whose longest side is each resolution (never upscaled).
+
+    Levels are produced from the largest down, each one resized from the
+    previous level instead of the full image, so the whole pyramid costs
+    little more than its largest level.
+    """
+    levels = {}
+    current = image.convert("RGB")
+    width, height = current.size
+    for resolution in sorted(resolutions, reverse=True):
+        scale = min(1.0, resolution / max(width, height))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if size != current.size:
+            current = current.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        levels[resolution] = current
+    return levels
+
+
+def save_atomic(image, path):
+    """Write the image to a temporary file and rename it, so readers never see a partial JPEG."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        image.save(tmp_path, format="JPEG")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_pyramid(image, output_dir, file_name, resolutions):
+    """Write the pyramid of image next to file_name (relative to output_dir)."""
+    for resolution, level in build_pyramid(image, resolutions).items():
+        save_atomic(level, os.path.join(output_dir, variant_file_name(file_name, resolution)))
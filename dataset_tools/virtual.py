@@ -0,0 +1,150 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from .gaze import plan_outputs, render_box, render_crop
+from .image_index import load_image_index, lookup
+from .labels import iter_labels
+
+MODES = ('box', 'crop')
+
+
+class _Frame:
+    """Cache slot of one decoded source frame; the lock makes concurrent readers decode it once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.image = None
+
+
+class VirtualGazeDataset:
+    """
+    Gaze-direction samples rendered on demand from labels.json and the
+    preprocessed frames, without a prepare step.
+
+    Samples match the prepared imagefolder dataset: same file_name, label
+    fields and JPEG bytes. Decoded source frames are kept in a small LRU cache
+    shared by all boxes of a frame; the boxes of a frame are adjacent in label
+    order, so a sequential (or prefetching) reader decodes every frame once.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, labels_file, images_dir, mode='box', padding=0.5, thumbnail=320, cache_size=8):
+        """
+        labels_file: labels.json exported by the labeling tool
+        images_dir: directory of the source frames referenced by imageName
+        mode: 'box' (full frame with a red box) or 'crop' (ROI crop with a context thumbnail)
+        padding, thumbnail: crop mode parameters, see dataset_tools.gaze.crop_geometry
+        cache_size: number of decoded frames kept in memory
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        self.labels_file = os.fspath(labels_file)
+        self.dataset_file = self.labels_file
+        self.images_dir = os.fspath(images_dir)
+        self.mode = mode
+        self.padding = padding
+        self.thumbnail = thumbnail
+        self.cache_size = cache_size
+
+        # Crop records carry the crop geometry, which needs each frame's size
+        image_index = load_image_index(self.images_dir) if mode == 'crop' else {}
+        self.records = []
+        for _, data in iter_labels(self.labels_file):
+            image_name = data['imageName']
+            image_path = os.path.join(self.images_dir, image_name)
+            if not os.path.exists(image_path):
+                print(f"Image not found, skipping: {image_path}")
+                continue
+            image_size = None
+            if mode == 'crop':
+                indexed = lookup(image_index, image_path)
+                if indexed is not None and not indexed['error']:
+                    image_size = (indexed['width'], indexed['height'])
+                else:
+                    # Opening the image only reads its header
+                    try:
+                        with Image.open(image_path) as image:
+                            image_size = image.size
+                    except Exception as e:
+                        print(f"Error opening image {image_path}: {e}")
+                        continue
+            for _, box, metadata_entry in plan_outputs(image_name, data['boxes'], image_size, padding, thumbnail):
+                self.records.append({
+                    **metadata_entry,
+                    "source_image": image_name,
+                    "box": {key: box[key] for key in ('x', 'y', 'w', 'h')},
+                })
+
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self.decoded = 0
+
+    @classmethod
+    def from_dir(cls, dataset_dir, **kwargs):
+        """Dataset from a labeled-data directory holding labels.json and preprocessed-images/."""
+        return cls(os.path.join(dataset_dir, 'labels.json'), os.path.join(dataset_dir, 'preprocessed-images'),
+                   **kwargs)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        """HF-style sample: the rendered image plus the label fields."""
+        record = self.records[index]
+        sample = {key: value for key, value in record.items() if key not in ('source_image', 'box')}
+        sample["image"] = self.render(record)
+        return sample
+
+    def describe(self):
+        """Everything that determines the rendered samples, e.g. for an evaluation run config."""
+        description = {"labels_file": self.labels_file, "images_dir": self.images_dir, "mode": self.mode}
+        if self.mode == 'crop':
+            description.update(padding=self.padding, thumbnail=self.thumbnail)
+        return description
+
+    def frame(self, image_name):
+        """Decoded RGB source frame, from the LRU cache when possible."""
+        with self._lock:
+            slot = self._frames.get(image_name)
+            if slot is None:
+                slot = self._frames[image_name] = _Frame()
+                while len(self._frames) > max(1, self.cache_size):
+                    self._frames.popitem(last=False)
+            else:
+                self._frames.move_to_end(image_name)
+        with slot.lock:
+            if slot.image is None:
+                slot.image = Image.open(os.path.join(self.images_dir, image_name)).convert("RGB")
+                self.decoded += 1
+            return slot.image
+
+    def render(self, record):
+        """The sample image of a record, as a PIL image."""
+        original_image = self.frame(record["source_image"])
+        box = record["box"]
+        if self.mode == 'crop':
+            return render_crop(original_image, box, record["crop"])
+        return render_box(original_image, box)
+
+    def encode(self, record):
+        """The sample image as JPEG bytes, identical to the file the prepare script writes."""
+        buffer = io.BytesIO()
+        self.render(record).save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+    def to_hf_dataset(self):
+        """A datasets.Dataset of the records whose "image" column is rendered lazily on access."""
+        from datasets import Dataset
+
+        def add_images(batch):
+            records = [dict(zip(batch, values)) for values in zip(*batch.values())]
+            return {**batch, "image": [self.render(record) for record in records]}
+
+        return Dataset.from_list(self.records).with_transform(add_images)
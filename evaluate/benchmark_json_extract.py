@@ -0,0 +1,129 @@
+"""
+JSON提取微基准
+
+对比旧版多轮正则提取与 arena.json_extract.extract_json 的耗时和结果。
+语料优先取自 results/logs 中记录的真实模型响应，不足时补充构造的响应
+（代码块、长推理文本、深层嵌套等）。
+
+用法: uv run python -m evaluate.benchmark_json_extract
+"""
+
+import json
+import pathlib
+import random
+import re
+import timeit
+
+from arena.json_extract import extract_json
+
+
+def legacy_extract_json_from_response(response: str) -> dict:
+    """旧版评估脚本中的提取逻辑（四轮正则），仅作为基准"""
+    json_pattern1 = r'```json\s*\n?(.*?)\n?\s*```'
+    match = re.search(json_pattern1, response, re.DOTALL | re.IGNORECASE)
+    if match:
+        try:
+            return json.loads(match.group(1).strip())
+        except json.JSONDecodeError:
+            pass
+
+    json_pattern2 = r'```\s*\n?(.*?)\n?\s*```'
+    match = re.search(json_pattern2, response, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1).strip())
+        except json.JSONDecodeError:
+            pass
+
+    json_pattern3 = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
+    for match in re.findall(json_pattern3, response, re.DOTALL):
+        try:
+            return json.loads(match.strip())
+        except json.JSONDecodeError:
+            continue
+
+    try:
+        return json.loads(response.strip())
+    except json.JSONDecodeError:
+        pass
+    return None
+
+
+def load_logged_responses(log_dir: pathlib.Path) -> list:
+    """
+    从结果日志中读取真实响应
+
+    Args:
+        log_dir: 结果日志目录
+
+    Returns:
+        (响应文本, 期望字段) 列表
+    """
+    corpus = []
+    for log_file in sorted(log_dir.glob("*.jsonl")):
+        config_file = log_file.with_suffix(".config.json")
+        task = json.loads(config_file.read_text(encoding="utf-8")).get("task") if config_file.exists() else None
+        key = {"gaze-direction": "gaze_direction", "co-detector": "has-co-detector"}.get(task)
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("response"):
+                    corpus.append((record["response"], key))
+    return corpus
+
+
+def synthetic_responses(n: int, seed: int = 0) -> list:
+    """
+    构造典型的模型响应
+
+    Args:
+        n: 数量
+        seed: 随机种子
+
+    Returns:
+        (响应文本, 期望字段) 列表
+    """
+    rng = random.Random(seed)
+    reasoning = "The worker stands near the mill {stand %d} and faces the conveyor. " * 40
+    templates = [
+        '```json\n{"gaze_direction": "%s"}\n```',
+        'Analysis: %s\n```\n{"gaze_direction": "%%s"}\n```' % (reasoning % tuple(range(40))),
+        '<think>%s draft {"gaze_direction": "upstream"}</think>\n{"gaze_direction": "%%s"}' % (reasoning % tuple(range(40))),
+        '{"result": {"meta": {"camera": {"id": 3, "zone": {"name": "rolling"}}}, "gaze_direction": "%s"}}',
+        '{"gaze_direction": "%s", "evidence": {"head": {"yaw": -30, "pitch": 5}, "body": [1, 2, {"x": 3}]}}',
+    ]
+    labels = ["upstream", "downstream", "clearly_diverted"]
+    return [(rng.choice(templates) % rng.choice(labels), "gaze_direction") for _ in range(n)]
+
+
+def main():
+    log_dir = pathlib.Path("results/logs")
+    corpus = load_logged_responses(log_dir) if log_dir.exists() else []
+    print(f"结果日志中的真实响应: {len(corpus)} 条")
+    if len(corpus) < 500:
+        corpus += synthetic_responses(500 - len(corpus))
+    print(f"语料总数: {len(corpus)} 条，平均长度 {sum(len(r) for r, _ in corpus) / len(corpus):.0f} 字符")
+
+    def legacy():
+        return [legacy_extract_json_from_response(response) for response, _ in corpus]
+
+    def single_pass():
+        return [extract_json(response, [key] if key else None) for response, key in corpus]
+
+    for name, fn in [("旧版四轮正则", legacy), ("单遍raw_decode", single_pass)]:
+        runs = 5
+        seconds = min(timeit.repeat(fn, number=1, repeat=runs))
+        results = fn()
+        hits = sum(
+            1 for result, (_, key) in zip(results, corpus)
+            if isinstance(result, dict) and (key is None or key in result)
+        )
+        print(f"{name}: {seconds / len(corpus) * 1e6:.1f} 微秒/条，"
+              f"提取到期望字段 {hits}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+分布式评估
+
+协调者把待评估样本写入SQLite任务队列，任意数量的worker（可在多台主机上，通过共享存储访问
+队列文件和数据集）领取样本、调用各自配置的模型并写回结果，最后由协调者汇总：
+
+    # 协调者：加入任务（可多次加入不同的任务与模型）
+    uv run python -m evaluate.distributed enqueue --task gaze-direction --provider lmstudio --model qwen2.5-vl-7b-instruct
+    # 每台机器上启动worker（各自使用本机的API密钥或LM Studio）
+    uv run python -m evaluate.distributed worker --provider lmstudio --model qwen2.5-vl-7b-instruct
+    # 查看进度与各worker状态
+    uv run python -m evaluate.distributed status
+    # 汇总结果：写入结果日志与结果库，合并各worker的延迟统计并打印报告
+    uv run python -m evaluate.distributed collect
+
+worker崩溃或失联后，其租约过期的样本会被其他worker重新领取。
+"""
+
+import argparse
+import asyncio
+import time
+
+from arena.engine import print_report
+from arena.metrics import format_rows
+from arena.monitoring import Monitor
+from arena.work_queue import WorkQueue, collect_run, enqueue_run, run_worker
+from evaluate.run_matrix import TASK_BUILDERS
+from llm_client import LLMClientFactory
+
+
+def enqueue(queue: WorkQueue, args):
+    task = TASK_BUILDERS[args.task]().at_resolution(args.resolution)
+    run_id, added = enqueue_run(queue, task, args.provider, args.model, args.log_dir,
+                                retry_failures_only=args.retry_failures_only, votes=args.votes)
+    print(f"运行 {run_id}: 加入 {added} 个样本 ({task.name} × {args.provider}/{args.model})")
+
+
+async def worker(queue: WorkQueue, args):
+    try:
+        client = LLMClientFactory.create_client(provider=args.provider, model_name=args.model)
+    except Exception as e:
+        print(f"初始化 LLM 客户端失败: {e}")
+        return
+    with Monitor(args.metrics_textfile, args.metrics_port, args.trace_file) as monitor:
+        await run_worker(queue, client, args.provider, args.model, TASK_BUILDERS, batch_size=args.batch_size,
+                         concurrency=args.concurrency, lease=args.lease, wait=args.wait, monitor=monitor)
+
+
+def status(queue: WorkQueue):
+    rows = [["运行", "任务", "供应商", "模型", "排队", "进行中", "租约过期", "完成"]]
+    for run in queue.runs():
+        progress = queue.progress(run["run_id"])
+        rows.append([run["run_id"], run["task"], run["provider"], run["model_name"], str(progress["queued"]),
+                     str(progress["leased"] - progress["expired"]), str(progress["expired"]), str(progress["done"])])
+    print(format_rows(rows))
+
+    now = time.time()
+    rows = [["worker", "供应商", "模型", "完成", "失败", "运行时间", "距上次心跳"]]
+    for row in queue.workers():
+        rows.append([row["worker"], row["provider"], row["model_name"], str(row["completed"]), str(row["failures"]),
+                     f"{row['heartbeat'] - row['started']:.0f}秒", f"{now - row['heartbeat']:.0f}秒"])
+    print()
+    print(format_rows(rows))
+
+
+def collect(queue: WorkQueue, args):
+    for run in queue.runs():
+        if args.run and run["run_id"] not in args.run:
+            continue
+        progress = queue.progress(run["run_id"])
+        print(f"\n运行 {run['run_id']} ({run['task']} × {run['provider']}/{run['model_name']}): "
+              f"完成 {progress['done']}，未完成 {progress['queued'] + progress['leased']}")
+        result = collect_run(queue, run, TASK_BUILDERS, args.log_dir, args.store_dir, args.leaderboard_file)
+        print_report(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式评估")
+    parser.add_argument("--queue", default="results/queue.sqlite", help="任务队列文件（多主机时放在共享存储上）")
+    parser.add_argument("--log-dir", default="results/logs", help="结果日志目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_enqueue = commands.add_parser("enqueue", help="加入结果日志中尚未完成的样本")
+    parser_enqueue.add_argument("--task", required=True, choices=sorted(TASK_BUILDERS), help="任务名称")
+    parser_enqueue.add_argument("--provider", required=True, help="供应商名称")
+    parser_enqueue.add_argument("--model", required=True, help="模型名称")
+    parser_enqueue.add_argument("--votes", type=int, default=1, help="每个样本的候选回复数（多数投票）")
+    parser_enqueue.add_argument("--resolution", type=int, help="使用该分辨率的预计算图片（最长边像素数）")
+    parser_enqueue.add_argument("--retry-failures-only", action="store_true", help="只加入日志中失败的样本")
+
+    parser_worker = commands.add_parser("worker", help="领取并评估样本")
+    parser_worker.add_argument("--provider", required=True, help="供应商名称")
+    parser_worker.add_argument("--model", required=True, help="模型名称")
+    parser_worker.add_argument("--batch-size", type=int, default=8, help="每次领取的样本数")
+    parser_worker.add_argument("--concurrency", type=int, default=4, help="同时进行的模型调用数")
+    parser_worker.add_argument("--lease", type=float, default=120.0, help="租约时长（秒）")
+    parser_worker.add_argument("--wait", action="store_true", help="队列为空时继续等待新样本")
+    parser_worker.add_argument("--metrics-port", type=int, help="在本地该端口提供Prometheus指标（/metrics）")
+    parser_worker.add_argument("--metrics-textfile", help="定期写入Prometheus指标文件")
+    parser_worker.add_argument("--trace-file", help="逐请求trace span（JSONL）")
+
+    commands.add_parser("status", help="查看进度与worker状态")
+
+    parser_collect = commands.add_parser("collect", help="汇总结果并打印报告")
+    parser_collect.add_argument("--run", nargs="*", help="只汇总这些运行，默认全部")
+    parser_collect.add_argument("--store-dir", default="results/store", help="结果库目录")
+    parser_collect.add_argument("--leaderboard-file", default="results/leaderboard.md", help="排行榜文件")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == "enqueue":
+            enqueue(queue, args)
+        elif args.command == "worker":
+            asyncio.run(worker(queue, args))
+        elif args.command == "status":
+            status(queue)
+        else:
+            collect(queue, args)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
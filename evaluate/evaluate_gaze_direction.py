@@ -1,54 +1,111 @@
 import asyncio
-import json
 import pathlib
-import time
-import random
-import re
-from collections import defaultdict
 from llm_client import LLMClientFactory
+from arena.engine import run_evaluation, print_report
+from arena.tasks import EvalTask
+from dataset_tools import PackedDataset, VirtualGazeDataset, is_packed
 
 
-def extract_json_from_response(response: str) -> dict:
+PROMPT_TEMPLATE = """
+**Image Description:** A surveillance camera view from a steel mill. The upper part of the image shows a section of a steel rolling line, consisting of a conveyor track that runs from left to right and multiple rolling mills. Steel billets from upstream (outside the left of the frame) are conveyed through the mills and rolled into bars.
+**Task:** Determine the gaze direction of the person marked with a red box in the surveillance image (looking towards the upstream direction of the rolling line | looking towards the downstream direction of the rolling line | gaze clearly diverted from the rolling line) and strictly output in JSON.
+**Output Requirements:**
+* The JSON must include:
+    * "gaze_direction": "upstream" | "downstream" | "clearly_diverted"
+"""
+
+
+CROP_PROMPT_TEMPLATE = """
+**Image Description:** Taken from a surveillance camera view of a steel mill. The upper part of the image is a close-up crop around one person, who is marked with a red box. The lower part is a small thumbnail of the whole camera view with the same person marked with a red box; it shows a section of a steel rolling line, consisting of a conveyor track that runs from left to right and multiple rolling mills. Steel billets from upstream (outside the left of the frame) are conveyed through the mills and rolled into bars. The crop is not mirrored or rotated, so left in the crop is also the upstream side.
+**Task:** Determine the gaze direction of the person marked with a red box (looking towards the upstream direction of the rolling line | looking towards the downstream direction of the rolling line | gaze clearly diverted from the rolling line) and strictly output in JSON.
+**Output Requirements:**
+* The JSON must include:
+    * "gaze_direction": "upstream" | "downstream" | "clearly_diverted"
+"""
+
+
+def build_task(dataset_path=pathlib.Path("dataset/huggingface/gaze-direction"),
+               prompt_template: str = PROMPT_TEMPLATE) -> EvalTask:
     """
-    从模型响应中提取JSON，增强鲁棒性
+    gaze-direction 评估任务
+
+    Args:
+        dataset_path: 数据集目录，也可以是 scripts/pack_dataset.py 打包的分片目录
+        prompt_template: 提示词
+
+    Returns:
+        评估任务
     """
-    # 方法1: 尝试提取```json代码块中的内容
-    json_pattern1 = r'```json\s*\n?(.*?)\n?\s*```'
-    match = re.search(json_pattern1, response, re.DOTALL | re.IGNORECASE)
-    if match:
-        json_str = match.group(1).strip()
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-    
-    # 方法2: 尝试提取```代码块中的内容（没有json标识）
-    json_pattern2 = r'```\s*\n?(.*?)\n?\s*```'
-    match = re.search(json_pattern2, response, re.DOTALL)
-    if match:
-        json_str = match.group(1).strip()
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-    
-    # 方法3: 查找大括号包围的JSON对象
-    json_pattern3 = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-    matches = re.findall(json_pattern3, response, re.DOTALL)
-    for match in matches:
-        try:
-            return json.loads(match.strip())
-        except json.JSONDecodeError:
-            continue
-    
-    # 方法4: 尝试直接解析整个响应（去除前后空白）
-    try:
-        return json.loads(response.strip())
-    except json.JSONDecodeError:
-        pass
-    
-    # 如果所有方法都失败，返回None
-    return None
+    return EvalTask(
+        name="gaze-direction",
+        dataset_path=dataset_path,
+        # 打包的数据集从内存映射的分片中读取图片，不逐个打开小文件
+        source=PackedDataset(dataset_path) if is_packed(dataset_path) else None,
+        label_field="gaze_direction",
+        labels=["upstream", "downstream", "clearly_diverted"],
+        prompt_template=prompt_template,
+        # upstream vs not-upstream 二分类统计
+        groups={
+            "upstream": ["upstream"],
+            "not-upstream": ["downstream", "clearly_diverted"],
+        },
+    )
+
+
+def build_crop_task(dataset_path=pathlib.Path("dataset/huggingface/gaze-direction-crop"),
+                    prompt_template: str = CROP_PROMPT_TEMPLATE) -> EvalTask:
+    """
+    gaze-direction ROI裁剪模式的评估任务
+
+    数据集由 scripts/prepare_gaze_direction_hf.py --mode crop 生成：人物周围的裁剪图，下方附整帧缩略图，
+    裁剪几何信息记录在元数据的 crop 字段中。任务名称不同，结果日志与排行榜中可与整帧模式直接对比。
+
+    Args:
+        dataset_path: 数据集目录
+        prompt_template: 提示词
+
+    Returns:
+        评估任务
+    """
+    task = build_task(dataset_path, prompt_template)
+    task.name = "gaze-direction-crop"
+    return task
+
+
+def build_virtual_task(dataset_path=pathlib.Path("dataset/labeled-data/gaze-direction"),
+                       prompt_template: str = PROMPT_TEMPLATE, mode: str = "box") -> EvalTask:
+    """
+    gaze-direction 虚拟数据集任务：直接读取标注目录中的 labels.json 与预处理图片，评估时按需绘制红框（或裁剪），
+    无需先运行 scripts/prepare_gaze_direction_hf.py；样本与准备好的数据集逐字节相同
+
+    Args:
+        dataset_path: 标注目录（包含 labels.json 与 preprocessed-images）
+        prompt_template: 提示词
+        mode: "box"（整帧红框）或 "crop"（ROI裁剪）
+
+    Returns:
+        评估任务
+    """
+    task = build_task(dataset_path, prompt_template)
+    task.name = "gaze-direction-virtual" if mode == "box" else "gaze-direction-crop-virtual"
+    task.source = VirtualGazeDataset.from_dir(dataset_path, mode=mode)
+    return task
+
+
+def build_virtual_crop_task(dataset_path=pathlib.Path("dataset/labeled-data/gaze-direction"),
+                            prompt_template: str = CROP_PROMPT_TEMPLATE) -> EvalTask:
+    """
+    gaze-direction ROI裁剪模式的虚拟数据集任务，见 build_virtual_task
+
+    Args:
+        dataset_path: 标注目录（包含 labels.json 与 preprocessed-images）
+        prompt_template: 提示词
+
+    Returns:
+        评估任务
+    """
+    return build_virtual_task(dataset_path, prompt_template, mode="crop")
+
 
 async def main():
     """
@@ -59,15 +116,33 @@ async def main():
     provider = "aihubmix" # 'aihubmix' or 'bigmodel' or 'lmstudio' or 'aliyun'
     model_name = "Qwen/Qwen2.5-VL-32B-Instruct"
     dataset_path = pathlib.Path("dataset/huggingface/gaze-direction")
-    metadata_file = dataset_path / "metadata.jsonl"
-
-    prompt_template = """
-**Image Description:** A surveillance camera view from a steel mill. The upper part of the image shows a section of a steel rolling line, consisting of a conveyor track that runs from left to right and multiple rolling mills. Steel billets from upstream (outside the left of the frame) are conveyed through the mills and rolled into bars.
-**Task:** Determine the gaze direction of the person marked with a red box in the surveillance image (looking towards the upstream direction of the rolling line | looking towards the downstream direction of the rolling line | gaze clearly diverted from the rolling line) and strictly output in JSON.
-**Output Requirements:**
-* The JSON must include:
-    * "gaze_direction": "upstream" | "downstream" | "clearly_diverted"
-"""
+    # 逐样本结果日志目录，相同配置重启时跳过已完成的样本
+    log_dir = pathlib.Path("results/logs")
+    # 列式结果库目录（Parquet），用于跨运行查询，见 evaluate/query_results.py
+    store_dir = pathlib.Path("results/store")
+    # 每次运行后由结果库重新生成的排行榜
+    leaderboard_file = pathlib.Path("results/leaderboard.md")
+    # 为True时只重跑日志中失败的样本
+    retry_failures_only = False
+    # 分层Bootstrap置信区间的重采样次数与随机种子
+    bootstrap_resamples = 2000
+    bootstrap_seed = 42
+    # 提前停止：None表示评估全部样本；例如 arena.early_stopping.EarlyStopping(ci_width=0.1) 在准确率
+    # 置信区间宽度小于10%时停止，EarlyStopping(threshold=0.8) 在判定准确率高于/低于80%时停止
+    early_stopping = None
+    # 每个样本的候选回复数：大于1时对全部候选多数投票，报告准确率随票数的变化与每增加一票的成本
+    # （aihubmix/aliyun 使用API的n参数只上传一次图片，其他供应商退化为并发调用）
+    votes = 1
+    # 分析模式：None表示不分析；"sampling"（采样调用栈）或 "cprofile"，并汇总读图、编码、网络、解析等各阶段耗时，
+    # 结果写在结果日志旁（.stages.json 与可用 flamegraph.pl/speedscope 打开的 .folded 文件）
+    profile = None
+    # ROI裁剪模式：评估人物周围的裁剪图（附整帧缩略图）而不是标注了红框的整帧，视觉token与延迟大幅减少；
+    # 需要先运行 scripts/prepare_gaze_direction_hf.py --mode crop，此时忽略 dataset_path
+    crop = False
+    # 图片分辨率：None表示原图；例如 448 使用最长边448px的变体（需要先用 --resolutions 准备数据集）
+    resolution = None
+
+    task = (build_crop_task() if crop else build_task(dataset_path)).at_resolution(resolution)
 
     # --- 初始化客户端 ---
     try:
@@ -82,270 +157,21 @@ async def main():
     print(f"正在使用模型: {client.model_name}")
     print("-" * 30)
 
-    # --- 加载数据集 ---
-    if not metadata_file.exists():
-        print(f"错误: 元数据文件未找到 {metadata_file}")
-        return
-
-    with open(metadata_file, "r") as f:
-        dataset = [json.loads(line) for line in f]
-    total_samples = len(dataset)
-    correct_predictions = 0
-    
-    # 时间统计
-    total_time = 0
-    valid_predictions = 0
-    
-    # 分类统计 - 使用混淆矩阵的思路
-    class_stats = defaultdict(lambda: {"correct": 0, "total": 0, "predicted": 0})
-    all_labels = ["upstream", "downstream", "clearly_diverted"]
-    
-    # 初始化统计字典（包括not-upstream类别）
-    for label in all_labels:
-        class_stats[label] = {"correct": 0, "total": 0, "predicted": 0}
-    
-    # 添加not-upstream类别统计
-    class_stats["not-upstream"] = {"correct": 0, "total": 0, "predicted": 0}
-    
-    # 存储所有预测结果用于均衡统计
-    all_predictions = []
-
     # --- 开始评估 ---
-    for i, item in enumerate(dataset):
-        image_path = item.get("file_name")
-        ground_truth_label = item.get("gaze_direction")
-
-        if not image_path or not ground_truth_label:
-            print(f"跳过第 {i+1} 个样本: 数据不完整")
-            continue
-
-        # The path in metadata.jsonl is like "images/frame_0012_box-1756378134881.jpg".
-        # Let's adjust based on the dataset structure. The metadata.jsonl is in dataset/huggingface/gaze-direction.
-        # So the image path should be relative to that.
-        full_image_path = dataset_path / image_path
-
-        print(f"正在处理样本 {i+1}/{total_samples}: {full_image_path.name}")
-
-        # 统计真实标签总数
-        if ground_truth_label in class_stats:
-            class_stats[ground_truth_label]["total"] += 1
-        
-        # 统计not-upstream类别（downstream或clearly_diverted）
-        if ground_truth_label in ["downstream", "clearly_diverted"]:
-            class_stats["not-upstream"]["total"] += 1
-
-        try:
-            # 记录开始时间
-            start_time = time.time()
-            
-            response = await client.async_fast_chat(
-                text_input=prompt_template, 
-                image_path=str(full_image_path)
-            )
-            
-            # 记录结束时间
-            end_time = time.time()
-            prediction_time = end_time - start_time
-            total_time += prediction_time
-            valid_predictions += 1
-            
-            # 提取 JSON 部分
-            response_data = extract_json_from_response(response)
-
-            if response_data is None:
-                print(f"  - 错误: 无法从响应中提取有效的JSON")
-                print(f"  - 原始响应: {response}")
-                continue
-            
-            predicted_label = response_data.get("gaze_direction")
-
-            print(f"  - 真实标签: {ground_truth_label}")
-            print(f"  - 预测标签: {predicted_label}")
-            print(f"  - 耗时: {prediction_time:.2f}秒")
-
-            # 统计预测标签数量
-            if predicted_label in class_stats:
-                class_stats[predicted_label]["predicted"] += 1
-            
-            # 统计not-upstream预测数量
-            if predicted_label in ["downstream", "clearly_diverted"]:
-                class_stats["not-upstream"]["predicted"] += 1
-
-            # 判断是否正确并更新统计
-            if predicted_label == ground_truth_label:
-                correct_predictions += 1
-                if ground_truth_label in class_stats:
-                    class_stats[ground_truth_label]["correct"] += 1
-                print("  - 结果: 正确")
-            else:
-                print("  - 结果: 错误")
-            
-            # 判断not-upstream类别的正确性
-            ground_is_not_upstream = ground_truth_label in ["downstream", "clearly_diverted"]
-            predicted_is_not_upstream = predicted_label in ["downstream", "clearly_diverted"]
-            
-            if ground_is_not_upstream and predicted_is_not_upstream:
-                class_stats["not-upstream"]["correct"] += 1
-            
-            # 存储预测结果用于均衡统计
-            all_predictions.append({
-                "ground_truth": ground_truth_label,
-                "predicted": predicted_label,
-                "is_correct": predicted_label == ground_truth_label
-            })
-
-        except json.JSONDecodeError:
-            print(f"  - 错误: 无法解析模型的 JSON 输出: {response}")
-            print(f"  - 原始响应: {response}")
-        except Exception as e:
-            print(f"  - 发生错误: {e}")
-        
-        print("-" * 20)
+    result = await run_evaluation(
+        task, client, provider, model_name,
+        log_dir=log_dir,
+        store_dir=store_dir,
+        leaderboard_file=leaderboard_file,
+        retry_failures_only=retry_failures_only,
+        early_stopping=early_stopping,
+        votes=votes,
+        profile=profile,
+    )
 
     # --- 输出评估结果 ---
-    if total_samples > 0:
-        accuracy = (correct_predictions / total_samples) * 100
-        avg_time = total_time / valid_predictions if valid_predictions > 0 else 0
-        
-        # 计算均衡统计
-        print("\n正在计算均衡统计...")
-        
-        # 按真实标签分组所有预测
-        predictions_by_label = defaultdict(list)
-        for pred in all_predictions:
-            predictions_by_label[pred["ground_truth"]].append(pred)
-        
-        # 找到样本最少的类别数量
-        min_samples = min(len(predictions) for predictions in predictions_by_label.values())
-        print(f"最少样本类别数量: {min_samples}")
-        
-        # 从每个类别随机抽取min_samples个样本
-        balanced_predictions = []
-        for label in all_labels:
-            if label in predictions_by_label:
-                label_predictions = predictions_by_label[label]
-                if len(label_predictions) > min_samples:
-                    # 随机抽取min_samples个样本
-                    sampled_predictions = random.sample(label_predictions, min_samples)
-                else:
-                    # 如果样本数量不足min_samples，使用全部样本
-                    sampled_predictions = label_predictions
-                balanced_predictions.extend(sampled_predictions)
-        
-        # 计算均衡统计
-        balanced_correct = sum(1 for pred in balanced_predictions if pred["is_correct"])
-        balanced_total = len(balanced_predictions)
-        balanced_accuracy = (balanced_correct / balanced_total * 100) if balanced_total > 0 else 0
-        
-        print("\n" + "=" * 50)
-        print("评估完成 - 详细统计报告")
-        print("=" * 50)
-        
-        # 总体统计
-        print(f"\n【总体统计】")
-        print(f"总样本数: {total_samples}")
-        print(f"正确预测数: {correct_predictions}")
-        print(f"总体准确率: {accuracy:.2f}%")
-        print(f"有效预测数: {valid_predictions}")
-        print(f"总耗时: {total_time:.2f}秒")
-        print(f"平均耗时: {avg_time:.2f}秒/样本")
-        
-        # 均衡总体统计
-        print(f"\n【均衡总体统计】")
-        print(f"均衡样本数: {balanced_total}")
-        print(f"均衡正确预测数: {balanced_correct}")
-        print(f"均衡总体准确率: {balanced_accuracy:.2f}%")
-        print(f"各类别样本数: {min_samples}")
-        
-        # 显示均衡统计中各类别的分布
-        print(f"\n均衡统计中各类别分布:")
-        for label in all_labels:
-            count = sum(1 for pred in balanced_predictions if pred["ground_truth"] == label)
-            print(f"  {label}: {count}个样本")
-        
-        # 各类别详细统计
-        print(f"\n【各类别统计】")
-        print("-" * 30)
-        
-        # 显示原始三类别统计
-        for label in all_labels:
-            stats = class_stats[label]
-            total = stats["total"]
-            correct = stats["correct"]
-            predicted = stats["predicted"]
-            
-            # 计算精确率、召回率
-            precision = (correct / predicted * 100) if predicted > 0 else 0
-            recall = (correct / total * 100) if total > 0 else 0
-            f1 = (2 * precision * recall / (precision + recall)) if (precision + recall) > 0 else 0
-            
-            print(f"\n类别: {label}")
-            print(f"  实际样本数: {total}")
-            print(f"  预测样本数: {predicted}")
-            print(f"  正确预测数: {correct}")
-            print(f"  召回率 (Recall): {recall:.2f}%")
-            print(f"  精确率 (Precision): {precision:.2f}%")
-            print(f"  F1分数: {f1:.2f}")
-        
-        # 显示not-upstream二分类统计
-        print(f"\n【二分类统计 (upstream vs not-upstream)】")
-        print("-" * 40)
-        
-        # upstream统计
-        upstream_stats = class_stats["upstream"]
-        upstream_total = upstream_stats["total"]
-        upstream_correct = upstream_stats["correct"]
-        upstream_predicted = upstream_stats["predicted"]
-        upstream_precision = (upstream_correct / upstream_predicted * 100) if upstream_predicted > 0 else 0
-        upstream_recall = (upstream_correct / upstream_total * 100) if upstream_total > 0 else 0
-        upstream_f1 = (2 * upstream_precision * upstream_recall / (upstream_precision + upstream_recall)) if (upstream_precision + upstream_recall) > 0 else 0
-        
-        print(f"\n类别: upstream")
-        print(f"  实际样本数: {upstream_total}")
-        print(f"  预测样本数: {upstream_predicted}")
-        print(f"  正确预测数: {upstream_correct}")
-        print(f"  召回率 (Recall): {upstream_recall:.2f}%")
-        print(f"  精确率 (Precision): {upstream_precision:.2f}%")
-        print(f"  F1分数: {upstream_f1:.2f}")
-        
-        # not-upstream统计
-        not_upstream_stats = class_stats["not-upstream"]
-        not_upstream_total = not_upstream_stats["total"]
-        not_upstream_correct = not_upstream_stats["correct"]
-        not_upstream_predicted = not_upstream_stats["predicted"]
-        not_upstream_precision = (not_upstream_correct / not_upstream_predicted * 100) if not_upstream_predicted > 0 else 0
-        not_upstream_recall = (not_upstream_correct / not_upstream_total * 100) if not_upstream_total > 0 else 0
-        not_upstream_f1 = (2 * not_upstream_precision * not_upstream_recall / (not_upstream_precision + not_upstream_recall)) if (not_upstream_precision + not_upstream_recall) > 0 else 0
-        
-        print(f"\n类别: not-upstream (downstream + clearly_diverted)")
-        print(f"  实际样本数: {not_upstream_total}")
-        print(f"  预测样本数: {not_upstream_predicted}")
-        print(f"  正确预测数: {not_upstream_correct}")
-        print(f"  召回率 (Recall): {not_upstream_recall:.2f}%")
-        print(f"  精确率 (Precision): {not_upstream_precision:.2f}%")
-        print(f"  F1分数: {not_upstream_f1:.2f}")
-        
-        # 二分类总体准确率
-        binary_correct = upstream_correct + not_upstream_correct
-        binary_accuracy = (binary_correct / total_samples * 100) if total_samples > 0 else 0
-        print(f"\n二分类总体准确率: {binary_accuracy:.2f}%")
-        
-        # 混淆矩阵信息
-        print(f"\n【混淆矩阵摘要】")
-        print("-" * 30)
-        print("格式: 真实标签 -> 预测标签数量")
-        for true_label in all_labels:
-            true_count = class_stats[true_label]["total"]
-            if true_count > 0:
-                print(f"{true_label} ({true_count}个样本):")
-                # 这里可以进一步细化显示每个真实标签被预测为哪些类别
-                # 但目前的统计结构需要调整才能实现，暂时显示基本信息
-                correct_count = class_stats[true_label]["correct"]
-                print(f"  正确预测: {correct_count}")
-                print(f"  错误预测: {true_count - correct_count}")
-        
-    else:
-        print("没有可评估的样本。")
+    if result is not None:
+        print_report(result, bootstrap_resamples=bootstrap_resamples, bootstrap_seed=bootstrap_seed)
 
 if __name__ == "__main__":
     asyncio.run(main())
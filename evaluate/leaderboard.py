@@ -0,0 +1,37 @@
+"""
+模型排行榜
+
+由结果库构建 模型×样本 正确性矩阵，打印Bradley-Terry/Elo排名与两两McNemar检验，
+并重新生成markdown排行榜：
+
+    uv run python -m evaluate.leaderboard --task gaze-direction
+"""
+
+import argparse
+
+from arena.leaderboard import Leaderboard, print_leaderboard, write_leaderboard
+from arena.results_store import ResultStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型排行榜")
+    parser.add_argument("--task", help="只打印该任务的排名（markdown排行榜始终包含全部任务）")
+    parser.add_argument("--store-dir", default="results/store", help="结果库目录")
+    parser.add_argument("--output", default="results/leaderboard.md", help="markdown排行榜输出路径")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store_dir)
+    tasks = [args.task] if args.task else store.tasks()
+    for task in tasks:
+        leaderboard = Leaderboard.from_store(store, task)
+        print(f"\n【{task}】模型数: {len(leaderboard.entrants)}，样本数: {len(leaderboard.sample_ids)}")
+        if leaderboard.entrants:
+            print_leaderboard(leaderboard)
+        else:
+            print("没有运行记录")
+
+    print(f"\n排行榜已保存到: {write_leaderboard(store, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
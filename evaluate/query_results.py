@@ -0,0 +1,45 @@
+"""
+查询列式结果库
+
+列出每次运行的准确率、有效率与延迟分位数，例如 gaze-direction 上所有模型的准确率和p95延迟：
+
+    uv run python -m evaluate.query_results --task gaze-direction
+
+--ingest 会先把 results/logs 中已有的JSONL结果日志导入结果库。
+"""
+
+import argparse
+import pathlib
+import time
+
+from arena.results_store import ResultStore, print_store_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询评估结果库")
+    parser.add_argument("--task", help="任务名称，例如 gaze-direction")
+    parser.add_argument("--provider", help="供应商名称")
+    parser.add_argument("--model", help="模型名称")
+    parser.add_argument("--store-dir", default="results/store", help="结果库目录")
+    parser.add_argument("--ingest", metavar="LOG_DIR", nargs="?", const="results/logs",
+                        help="先导入结果日志目录中的全部JSONL日志")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store_dir)
+    if args.ingest:
+        log_files = sorted(pathlib.Path(args.ingest).glob("*.jsonl"))
+        for log_file in log_files:
+            if log_file.with_suffix(".config.json").exists():
+                store.ingest_log(log_file)
+        print(f"已导入 {len(log_files)} 个结果日志")
+
+    start_time = time.perf_counter()
+    rows = store.summary(task=args.task, provider=args.provider, model_name=args.model)
+    elapsed = time.perf_counter() - start_time
+
+    print_store_summary(rows)
+    print(f"\n查询耗时: {elapsed * 1000:.1f}毫秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+评估矩阵
+
+按TOML配置在一个进程内并发运行 任务 × 提示词 × (供应商, 模型) 的全部组合，
+各供应商独立限流，图片编码与模型响应在所有评估之间共享：
+
+    uv run python -m evaluate.run_matrix evaluate/arena.toml
+"""
+
+import argparse
+import asyncio
+
+from arena.scheduler import load_matrix_config, run_matrix
+from evaluate import evaluate_co_detector, evaluate_gaze_direction
+
+# 配置中可用的任务
+TASK_BUILDERS = {
+    "gaze-direction": evaluate_gaze_direction.build_task,
+    "gaze-direction-crop": evaluate_gaze_direction.build_crop_task,
+    # 直接读取标注目录，按需渲染，无需准备数据集
+    "gaze-direction-virtual": evaluate_gaze_direction.build_virtual_task,
+    "gaze-direction-crop-virtual": evaluate_gaze_direction.build_virtual_crop_task,
+    "co-detector": evaluate_co_detector.build_task,
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="运行评估矩阵")
+    parser.add_argument("config", nargs="?", default="evaluate/arena.toml", help="TOML配置文件")
+    parser.add_argument("--verbose", action="store_true", help="打印逐样本信息")
+    args = parser.parse_args()
+
+    config = load_matrix_config(args.config)
+    await run_matrix(config, TASK_BUILDERS, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
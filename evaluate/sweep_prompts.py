@@ -0,0 +1,61 @@
+"""
+提示词变体扫描
+
+一次遍历数据集评估多个提示词：每张图片只编码一次，各变体的请求交错发起，
+最后输出每个变体一行的指标对比表。内置提示词作为 baseline 变体，
+其余变体来自文本文件（文件名即变体名）：
+
+    uv run python -m evaluate.sweep_prompts --task co-detector prompts/co-v2.txt prompts/co-v3.txt
+"""
+
+import argparse
+import asyncio
+import pathlib
+
+from llm_client import LLMClientFactory
+from arena.monitoring import Monitor
+from arena.sweep import run_sweep, print_sweep_report
+from evaluate.run_matrix import TASK_BUILDERS
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="提示词变体扫描")
+    parser.add_argument("prompts", nargs="*", help="提示词文件，文件名（不含扩展名）作为变体名")
+    parser.add_argument("--task", default="co-detector", choices=sorted(TASK_BUILDERS), help="任务名称")
+    parser.add_argument("--provider", default="aliyun", help="供应商名称")
+    parser.add_argument("--model", default="qwen2.5-vl-32b-instruct", help="模型名称")
+    parser.add_argument("--dataset-path", help="数据集目录（默认使用任务内置路径）")
+    parser.add_argument("--resolution", type=int, help="使用该分辨率的预计算图片（最长边像素数）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的模型调用数")
+    parser.add_argument("--prefetch", type=int, default=8, help="后台预读取图片的样本数")
+    parser.add_argument("--metrics-port", type=int, help="在本地该端口提供Prometheus指标（/metrics）")
+    parser.add_argument("--metrics-textfile", help="定期写入Prometheus指标文件")
+    parser.add_argument("--trace-file", help="逐请求trace span（JSONL）")
+    parser.add_argument("--no-baseline", action="store_true", help="不评估内置提示词")
+    args = parser.parse_args()
+
+    build_task = TASK_BUILDERS[args.task]
+    kwargs = {"dataset_path": pathlib.Path(args.dataset_path)} if args.dataset_path else {}
+    variants = {} if args.no_baseline else {"baseline": build_task(**kwargs).at_resolution(args.resolution)}
+    for prompt_file in map(pathlib.Path, args.prompts):
+        variants[prompt_file.stem] = build_task(prompt_template=prompt_file.read_text(encoding="utf-8"),
+                                                **kwargs).at_resolution(args.resolution)
+    if not variants:
+        parser.error("没有需要评估的提示词")
+
+    try:
+        client = LLMClientFactory.create_client(provider=args.provider, model_name=args.model)
+    except Exception as e:
+        print(f"初始化 LLM 客户端失败: {e}")
+        return
+
+    print(f"正在使用模型: {client.model_name}，提示词变体: {', '.join(variants)}")
+    print("-" * 30)
+    with Monitor(args.metrics_textfile, args.metrics_port, args.trace_file) as monitor:
+        results = await run_sweep(variants, client, args.provider, args.model, concurrency=args.concurrency,
+                                  prefetch=args.prefetch, monitor=monitor)
+    print_sweep_report(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,42 +3,66 @@
 Generate metadata.jsonl for co-detector-eazy dataset
 """
 
+import argparse
 import json
-import os
 from pathlib import Path
 
-def generate_metadata():
-    # Path to the co-detector-eazy dataset
-    dataset_path = Path("dataset/huggingface/co-detector-eazy")
+from tqdm import tqdm
+
+from dataset_tools.image_index import INDEX_NAME, index_images
+
+
+def generate_metadata(dataset_path=Path("dataset/huggingface/co-detector-eazy"), workers=None, verify=False):
     images_path = dataset_path / "images"
     metadata_path = dataset_path / "metadata.jsonl"
-    
-    # Get all image files in the images directory
-    image_files = []
-    for file_path in images_path.iterdir():
-        if file_path.is_file() and file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-            image_files.append(file_path.name)
-    
-    # Sort the files for consistent ordering
-    image_files.sort()
-    
-    # Generate metadata entries
+
+    # Index every image (header only, in a thread pool); unchanged files are reused from the previous index
+    with tqdm(desc="Indexing images", unit="image") as progress:
+        index = index_images(images_path, workers=workers, verify=verify, progress=progress.update)
+
+    # Corrupt or truncated images would only fail later as API calls, so they are left out here
+    corrupt = {name: entry["error"] for name, entry in index.items() if entry["error"]}
+    for name, error in corrupt.items():
+        print(f"Skipping corrupt image {name}: {error}")
+
+    # Generate metadata entries (the index is sorted by name, for consistent ordering)
     metadata_entries = []
-    for image_file in image_files:
+    for image_file in index:
+        if image_file in corrupt:
+            continue
         entry = {
             "file_name": f"images/{image_file}",
             "has-co-detector": True
         }
         metadata_entries.append(entry)
-    
+
     # Write to metadata.jsonl
     with open(metadata_path, 'w', encoding='utf-8') as f:
         for entry in metadata_entries:
             f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-    
-    print(f"Generated metadata.jsonl with {len(metadata_entries)} entries")
+
+    print(f"Generated metadata.jsonl with {len(metadata_entries)} entries ({len(corrupt)} corrupt images skipped)")
+    print(f"Image index (size, dimensions, EXIF orientation, sha256): {images_path / INDEX_NAME}")
     for entry in metadata_entries:
         print(f"  {entry['file_name']}")
 
 if __name__ == "__main__":
-    generate_metadata()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Index the images of a dataset and generate its metadata.jsonl")
+    parser.add_argument("--dataset-path", type=Path, default=Path("dataset/huggingface/co-detector-eazy"),
+                        help="Dataset directory holding images/")
+    parser.add_argument("--workers", type=int, help="Threads reading image headers (default: CPU count + 4)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Fully decode new images to also catch corrupt pixel data (slower)")
+    parser.add_argument("--index", type=Path, metavar="IMAGES_DIR",
+                        help="Only write the image index of IMAGES_DIR, e.g. "
+                             "dataset/labeled-data/gaze-direction/preprocessed-images (used by the prepare scripts)")
+    args = parser.parse_args()
+    if args.index:
+        with tqdm(desc="Indexing images", unit="image") as progress:
+            index = index_images(args.index, workers=args.workers, verify=args.verify, progress=progress.update)
+        for name, entry in index.items():
+            if entry["error"]:
+                print(f"Corrupt image {name}: {entry['error']}")
+        print(f"Indexed {len(index)} images: {args.index / INDEX_NAME}")
+    else:
+        generate_metadata(args.dataset_path, workers=args.workers, verify=args.verify)
@@ -3,10 +3,11 @@ LLM客户端模块
 提供基于工厂模式的LLM客户端实现，支持多个供应商
 """
 
-from .base import LLMClient, LLMClientFactory
+from .base import LLMClient, LLMClientFactory, ImagePayload, ChatResult
+from .spans import span, add_span_hook, remove_span_hook
 from .aihubmix import AiHubMixClient
 from .lmstudio import LMStudioClient
 from .bigmodel import BigModelClient
 from .aliyun import AliyunClient
 
-__all__ = ["LLMClient", "LLMClientFactory", "AiHubMixClient", "LMStudioClient", "BigModelClient", "AliyunClient"]
\ No newline at end of file
+__all__ = ["LLMClient", "LLMClientFactory", "ImagePayload", "ChatResult", "span", "add_span_hook", "remove_span_hook", "AiHubMixClient", "LMStudioClient", "BigModelClient", "AliyunClient"]
\ No newline at end of file
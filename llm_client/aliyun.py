@@ -5,7 +5,8 @@ import base64
 import os
 import asyncio
 from dotenv import load_dotenv
-from .base import LLMClient, LLMClientFactory
+from .base import LLMClient, LLMClientFactory, ImagePayload, ChatResult, MIME_TYPES
+from .spans import span
 
 load_dotenv()
 
@@ -37,53 +38,45 @@ class AliyunClient(LLMClient):
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
         )
     
-    def _encode_image(self, image_path: Union[str, Path]) -> str:
+    def _encode_image(self, image_path: Union[str, Path, ImagePayload]) -> str:
         """
         将图片文件编码为base64格式
         
         Args:
-            image_path: 图片文件路径
+            image_path: 图片文件路径或预先编码的图片数据
             
         Returns:
             base64编码的图片数据
         """
+        if isinstance(image_path, ImagePayload):
+            return image_path.base64_data
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     
-    def _get_image_mime_type(self, image_path: Union[str, Path]) -> str:
+    def _get_image_mime_type(self, image_path: Union[str, Path, ImagePayload]) -> str:
         """
         获取图片文件的MIME类型
         
         Args:
-            image_path: 图片文件路径
+            image_path: 图片文件路径或预先编码的图片数据
             
         Returns:
             MIME类型字符串
         """
-        image_path = Path(image_path)
-        suffix = image_path.suffix.lower()
-        
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.bmp': 'image/bmp',
-            '.webp': 'image/webp'
-        }
-        
-        return mime_types.get(suffix, 'image/jpeg')
+        if isinstance(image_path, ImagePayload):
+            return image_path.mime_type
+        return MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
     
-    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    def _build_messages(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> list:
         """
-        快速聊天功能，支持文本和图片输入
+        构建请求消息列表
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
-            LLM的回应文本
+            消息列表
         """
         # 构建消息内容
         if image_path:
@@ -108,7 +101,7 @@ class AliyunClient(LLMClient):
             content = text_input
         
         # 构建消息列表
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": [{"type": "text", "text": "You are a helpful assistant."}]
@@ -118,13 +111,28 @@ class AliyunClient(LLMClient):
                 "content": content
             }
         ]
+    
+    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
+        """
+        快速聊天功能，支持文本和图片输入
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            
+        Returns:
+            LLM的回应文本
+        """
+        with span("request.build"):
+            messages = self._build_messages(text_input, image_path)
         
         try:
             # 调用API
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages
-            )
+            with span("request.network"):
+                response = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages
+                )
             
             # 返回回复内容
             return response.choices[0].message.content
@@ -132,64 +140,69 @@ class AliyunClient(LLMClient):
         except Exception as e:
             raise Exception(f"阿里云API调用失败: {str(e)}")
 
-    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
         """
         异步快速聊天功能，支持文本和图片输入
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
             LLM的回应文本
         """
-        # 构建消息内容
-        if image_path:
-            # 有图片输入，构建多模态消息
-            image_base64 = self._encode_image(image_path)
-            mime_type = self._get_image_mime_type(image_path)
-            
-            content = [
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{image_base64}"
-                    }
-                },
-                {
-                    "type": "text",
-                    "text": text_input
-                }
-            ]
-        else:
-            # 纯文本输入
-            content = text_input
+        result = await self.async_chat(text_input, image_path)
+        return result.content
+
+    async def async_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
+        """
+        异步聊天，返回回复文本与token用量
         
-        # 构建消息列表
-        messages = [
-            {
-                "role": "system",
-                "content": [{"type": "text", "text": "You are a helpful assistant."}]
-            },
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            
+        Returns:
+            聊天结果
+        """
+        with span("request.build"):
+            messages = self._build_messages(text_input, image_path)
         
         try:
             # 调用异步API
-            response = await self.async_client.chat.completions.create(
-                model=self.model_name,
-                messages=messages
-            )
+            with span("request.network"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages
+                )
             
-            # 返回回复内容
-            return response.choices[0].message.content
+            return ChatResult.from_response(response)
             
         except Exception as e:
             raise Exception(f"阿里云API异步调用失败: {str(e)}")
 
+    async def async_chat_n(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None,
+                           n: int = 1) -> ChatResult:
+        """
+        使用API的 n 参数在一次请求中采样n个候选回复，图片只上传一次
+        
+        部分模型会拒绝或忽略 n 参数，此时不足的候选通过并发调用补齐
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            n: 候选回复数
+            
+        Returns:
+            聊天结果，choices中为全部候选回复
+        """
+        if n <= 1:
+            return await self.async_chat(text_input, image_path)
+        
+        with span("request.build"):
+            messages = self._build_messages(text_input, image_path)
+        return await self._openai_chat_n(self.async_client, messages, text_input, image_path, n)
+
 
 # 注册阿里云客户端到工厂
 LLMClientFactory.register_client("aliyun", AliyunClient)
\ No newline at end of file
@@ -1,19 +1,168 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Union
+from typing import List, Optional, Union
 from pathlib import Path
+import asyncio
+import base64
+import hashlib
+from openai import BadRequestError, UnprocessableEntityError
+from .spans import span
+
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp'
+}
+
+
+class ImagePayload:
+    """预先编码好的图片数据，可在多次请求之间复用"""
+    
+    def __init__(self, base64_data: str, mime_type: str = "image/jpeg"):
+        """
+        初始化图片数据
+        
+        Args:
+            base64_data: base64编码的图片数据
+            mime_type: MIME类型
+        """
+        self.base64_data = base64_data
+        self.mime_type = mime_type
+        self._digest = None
+    
+    @classmethod
+    def from_file(cls, image_path: Union[str, Path]) -> "ImagePayload":
+        """
+        读取并编码图片文件
+        
+        Args:
+            image_path: 图片文件路径
+            
+        Returns:
+            图片数据
+        """
+        with span("image.read"):
+            with open(image_path, "rb") as image_file:
+                data = image_file.read()
+        return cls.from_bytes(data, MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg'))
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: str = "image/jpeg") -> "ImagePayload":
+        """
+        编码内存中的图片数据
+        
+        Args:
+            data: 图片文件内容
+            mime_type: MIME类型
+            
+        Returns:
+            图片数据
+        """
+        with span("image.base64"):
+            return cls(base64.b64encode(data).decode('utf-8'), mime_type)
+    
+    @property
+    def data_url(self) -> str:
+        """data URL形式的图片数据"""
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+    
+    @property
+    def digest(self) -> str:
+        """图片内容的SHA1摘要（首次访问时计算），可用作缓存键"""
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.base64_data.encode("ascii")).hexdigest()
+        return self._digest
+
+
+class ChatResult:
+    """聊天结果：回复文本与token用量"""
+    
+    def __init__(self, content: str, prompt_tokens: Optional[int] = None,
+                 completion_tokens: Optional[int] = None, choices: Optional[List[str]] = None,
+                 requests: int = 1):
+        """
+        初始化聊天结果
+        
+        Args:
+            content: 回复文本（多个候选时为第一个）
+            prompt_tokens: 输入token数（供应商未返回时为None）
+            completion_tokens: 输出token数（供应商未返回时为None）
+            choices: 全部候选回复，默认只有content
+            requests: 产生该结果的API请求次数
+        """
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.choices = choices if choices is not None else [content]
+        self.requests = requests
+    
+    @classmethod
+    def from_response(cls, response) -> "ChatResult":
+        """
+        由OpenAI兼容的响应对象构建
+        
+        Args:
+            response: chat.completions.create 的返回值
+            
+        Returns:
+            聊天结果
+        """
+        with span("response.parse"):
+            usage = getattr(response, "usage", None)
+            choices = [choice.message.content for choice in response.choices]
+        return cls(
+            choices[0],
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            choices=choices,
+        )
+    
+    @classmethod
+    def merge(cls, results: List["ChatResult"]) -> "ChatResult":
+        """
+        合并多次请求的结果（候选回复依次拼接，token用量相加）
+        
+        Args:
+            results: 聊天结果列表
+            
+        Returns:
+            合并后的聊天结果
+        """
+        def total(values):
+            values = [v for v in values if v is not None]
+            return sum(values) if values else None
+        
+        choices = [choice for result in results for choice in result.choices]
+        return cls(
+            choices[0],
+            prompt_tokens=total(result.prompt_tokens for result in results),
+            completion_tokens=total(result.completion_tokens for result in results),
+            choices=choices,
+            requests=sum(result.requests for result in results),
+        )
+    
+    @property
+    def total_tokens(self) -> Optional[int]:
+        """总token数"""
+        if self.prompt_tokens is None and self.completion_tokens is None:
+            return None
+        return (self.prompt_tokens or 0) + (self.completion_tokens or 0)
 
 
 class LLMClient(ABC):
     """LLM客户端抽象基类"""
     
     @abstractmethod
-    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
         """
         快速聊天功能，支持文本和图片输入
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
             LLM的回应文本
@@ -21,18 +170,91 @@ class LLMClient(ABC):
         pass
     
     @abstractmethod
-    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
         """
         异步快速聊天功能，支持文本和图片输入
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
             LLM的回应文本
         """
         pass
+    
+    async def async_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
+        """
+        异步聊天，返回回复文本与token用量
+        
+        默认实现基于async_fast_chat，不提供token用量；供应商客户端可覆盖此方法
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            
+        Returns:
+            聊天结果
+        """
+        return ChatResult(await self.async_fast_chat(text_input, image_path))
+    
+    async def async_chat_n(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None,
+                           n: int = 1) -> ChatResult:
+        """
+        对同一输入采样n个候选回复
+        
+        默认实现并发调用n次async_chat，部分调用失败时返回其余候选，全部失败时抛出第一个异常；
+        支持 n 参数的供应商客户端可覆盖此方法，在一次请求中返回全部候选，图片只上传一次
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            n: 候选回复数
+            
+        Returns:
+            聊天结果，choices中为全部成功的候选回复
+        """
+        results = await asyncio.gather(
+            *(self.async_chat(text_input, image_path) for _ in range(max(1, n))), return_exceptions=True
+        )
+        succeeded = [result for result in results if not isinstance(result, BaseException)]
+        if not succeeded:
+            raise results[0]
+        return ChatResult.merge(succeeded)
+    
+    async def _openai_chat_n(self, async_client, messages: list, text_input: str,
+                             image_path: Optional[Union[str, Path, ImagePayload]], n: int) -> ChatResult:
+        """
+        使用OpenAI兼容接口的 n 参数在一次请求中采样n个候选回复，供OpenAI兼容客户端的async_chat_n调用
+        
+        供应商拒绝 n 参数时全部改为并发调用，忽略 n 参数（候选不足）时并发补齐
+        
+        Args:
+            async_client: OpenAI兼容的异步客户端
+            messages: 已构建的请求消息列表
+            text_input: 文本输入（回退为并发调用时使用）
+            image_path: 图片文件路径或预先编码的图片数据（可选，回退为并发调用时使用）
+            n: 候选回复数
+            
+        Returns:
+            聊天结果，choices中为全部候选回复
+        """
+        try:
+            with span("request.network"):
+                response = await async_client.chat.completions.create(
+                    messages=messages,
+                    model=self.model_name,
+                    n=n
+                )
+            result = ChatResult.from_response(response)
+        except (BadRequestError, UnprocessableEntityError):
+            # 供应商拒绝 n 参数时全部改为并发调用；限流、超时、鉴权等错误直接抛出，按普通失败记录
+            return await LLMClient.async_chat_n(self, text_input, image_path, n)
+        
+        if len(result.choices) < n:
+            extra = await LLMClient.async_chat_n(self, text_input, image_path, n - len(result.choices))
+            result = ChatResult.merge([result, extra])
+        return result
 
 
 class LLMClientFactory:
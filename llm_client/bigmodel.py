@@ -4,8 +4,10 @@ from pathlib import Path
 import base64
 import os
 import asyncio
+import contextvars
 from dotenv import load_dotenv
-from .base import LLMClient, LLMClientFactory
+from .base import LLMClient, LLMClientFactory, ImagePayload, ChatResult
+from .spans import span
 
 load_dotenv()
 
@@ -29,29 +31,31 @@ class BigModelClient(LLMClient):
         
         self.client = ZhipuAiClient(api_key=api_key)
     
-    def _encode_image(self, image_path: Union[str, Path]) -> str:
+    def _encode_image(self, image_path: Union[str, Path, ImagePayload]) -> str:
         """
         将图片文件编码为base64格式
         
         Args:
-            image_path: 图片文件路径
+            image_path: 图片文件路径或预先编码的图片数据
             
         Returns:
             base64编码的图片数据
         """
+        if isinstance(image_path, ImagePayload):
+            return image_path.base64_data
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
 
-    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    def _chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
         """
-        快速聊天功能，支持文本和图片输入
+        调用API并返回回复文本与token用量
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
-            LLM的回应文本
+            聊天结果
         """
         # 构建消息内容
         content = [
@@ -63,7 +67,8 @@ class BigModelClient(LLMClient):
         
         if image_path:
             # 有图片输入，添加图片内容
-            image_base64 = self._encode_image(image_path)
+            with span("request.build"):
+                image_base64 = self._encode_image(image_path)
             
             content.append({
                 "type": "image_url",
@@ -82,34 +87,63 @@ class BigModelClient(LLMClient):
         
         try:
             # 调用API
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                thinking={
-                    "type": "enabled"
-                }
-            )
+            with span("request.network"):
+                response = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    thinking={
+                        "type": "enabled"
+                    }
+                )
             
-            # 返回回复内容
-            return response.choices[0].message.content
+            return ChatResult.from_response(response)
             
         except Exception as e:
             raise Exception(f"BigModel API调用失败: {str(e)}")
 
-    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
+        """
+        快速聊天功能，支持文本和图片输入
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            
+        Returns:
+            LLM的回应文本
+        """
+        return self._chat(text_input, image_path).content
+
+    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
         """
         异步快速聊天功能，支持文本和图片输入
         
         Args:
             text_input: 文本输入
-            image_path: 图片文件路径（可选）
+            image_path: 图片文件路径或预先编码的图片数据（可选）
             
         Returns:
             LLM的回应文本
         """
+        result = await self.async_chat(text_input, image_path)
+        return result.content
+
+    async def async_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
+        """
+        异步聊天，返回回复文本与token用量
+        
+        Args:
+            text_input: 文本输入
+            image_path: 图片文件路径或预先编码的图片数据（可选）
+            
+        Returns:
+            聊天结果
+        """
         # BigModel SDK 可能不支持异步，这里使用同步方法的异步包装
+        # （复制当前上下文，线程中的阶段耗时仍归属于调用方所在的阶段）
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.fast_chat, text_input, image_path)
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, context.run, self._chat, text_input, image_path)
 
 
 # 注册BigModel客户端到工厂
@@ -4,7 +4,8 @@ from pathlib import Path
 import base64
 import os
 import asyncio
-from .base import LLMClient, LLMClientFactory
+from .base import LLMClient, LLMClientFactory, ImagePayload, ChatResult, MIME_TYPES
+from .spans import span
 
 class LMStudioClient(LLMClient):
     """LMStudio LLM客户端实现"""
@@ -21,34 +22,26 @@ class LMStudioClient(LLMClient):
         self.async_client = AsyncOpenAI(base_url="http://192.168.1.2:1234/v1", api_key="not-needed")
         self.model_name = model_name
 
-    def _encode_image(self, image_path: Union[str, Path]) -> str:
+    def _encode_image(self, image_path: Union[str, Path, ImagePayload]) -> str:
         """
         将图片文件编码为base64格式
         """
+        if isinstance(image_path, ImagePayload):
+            return image_path.base64_data
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
 
-    def _get_image_mime_type(self, image_path: Union[str, Path]) -> str:
+    def _get_image_mime_type(self, image_path: Union[str, Path, ImagePayload]) -> str:
         """
         获取图片文件的MIME类型
         """
-        image_path = Path(image_path)
-        suffix = image_path.suffix.lower()
-        
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.bmp': 'image/bmp',
-            '.webp': 'image/webp'
-        }
-        
-        return mime_types.get(suffix, 'image/jpeg')
+        if isinstance(image_path, ImagePayload):
+            return image_path.mime_type
+        return MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
 
-    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    def _build_messages(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> list:
         """
-        快速聊天功能，支持文本和图片输入
+        构建请求消息列表
         """
         content = []
         if image_path:
@@ -66,59 +59,55 @@ class LMStudioClient(LLMClient):
             "text": text_input
         })
 
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": content
             }
         ]
+
+    def fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
+        """
+        快速聊天功能，支持文本和图片输入
+        """
+        with span("request.build"):
+            messages = self._build_messages(text_input, image_path)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=8192, # 可根据需要调整
-                temperature=0.1,
-            )
+            with span("request.network"):
+                response = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    max_tokens=8192, # 可根据需要调整
+                    temperature=0.1,
+                )
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"LM Studio API调用失败: {str(e)}")
 
-    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path]] = None) -> str:
+    async def async_fast_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> str:
         """
         异步快速聊天功能，支持文本和图片输入
         """
-        content = []
-        if image_path:
-            image_base64 = self._encode_image(image_path)
-            mime_type = self._get_image_mime_type(image_path)
-            content.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:{mime_type};base64,{image_base64}"
-                }
-            })
-        
-        content.append({
-            "type": "text",
-            "text": text_input
-        })
+        result = await self.async_chat(text_input, image_path)
+        return result.content
 
-        messages = [
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
+    async def async_chat(self, text_input: str, image_path: Optional[Union[str, Path, ImagePayload]] = None) -> ChatResult:
+        """
+        异步聊天，返回回复文本与token用量
+        """
+        with span("request.build"):
+            messages = self._build_messages(text_input, image_path)
         
         try:
-            response = await self.async_client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=8192, # 可根据需要调整
-                temperature=0.1,
-            )
-            return response.choices[0].message.content
+            with span("request.network"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    max_tokens=8192, # 可根据需要调整
+                    temperature=0.1,
+                )
+            return ChatResult.from_response(response)
         except Exception as e:
             raise Exception(f"LM Studio API异步调用失败: {str(e)}")
 
@@ -0,0 +1,68 @@
+"""
+阶段耗时埋点
+
+客户端与评估引擎在各阶段（读取图片、base64编码、构建请求、网络请求、解析响应等）外包裹 span，
+注册回调后即可收到每个阶段的耗时；没有注册回调时 span 几乎没有开销。
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+
+# 回调参数: (阶段路径, 开始时间, 耗时)；阶段路径为嵌套的阶段名称以 "/" 连接，例如 "sample/network/request.network"
+SpanHook = Callable[[str, float, float], None]
+
+_hooks: List[SpanHook] = []
+_lock = threading.Lock()
+# 当前协程（或线程）所在的阶段路径
+_current_path = contextvars.ContextVar("llm_client_span_path", default="")
+
+
+def add_span_hook(hook: SpanHook):
+    """
+    注册阶段耗时回调（全局生效，可能在多个线程中被调用）
+
+    Args:
+        hook: 回调函数
+    """
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_span_hook(hook: SpanHook):
+    """
+    注销阶段耗时回调
+
+    Args:
+        hook: add_span_hook注册过的回调函数
+    """
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+@contextmanager
+def span(name: str):
+    """
+    统计一个阶段的耗时（单调时钟），可嵌套，可跨越await
+
+    Args:
+        name: 阶段名称
+    """
+    if not _hooks:
+        yield
+        return
+
+    parent = _current_path.get()
+    path = f"{parent}/{name}" if parent else name
+    token = _current_path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current_path.reset(token)
+        for hook in list(_hooks):
+            hook(path, start, duration)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.build-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def digest(*parts):
+    """Stable hash of JSON-serializable parts, used as the build key of an output file."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class BuildManifest:
+    """
+    Records which source content produced each output file, so rebuilds only
+    regenerate outputs whose inputs changed.
+
+    sources: source path -> size, mtime_ns and content hash. The hash is only
+             recomputed when size or mtime change, so a no-op rebuild never reads
+             image data.
+    outputs: output file name -> build key (hash of everything the file depends on).
+    phashes: key -> perceptual hash (hex) used for deduplication, so a rebuild
+             does not decode the source images again.
+    """
+
+    def __init__(self, output_dir, force=False):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.sources = {}
+        self.outputs = {}
+        self.phashes = {}
+        self._used_phashes = set()
+        if not force and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {self.path}: {e}")
+                data = {}
+            if data.get('version') == MANIFEST_VERSION:
+                self.sources = data.get('sources', {})
+                self.outputs = data.get('outputs', {})
+                self.phashes = data.get('phashes', {})
+        self.hashed = 0
+
+    def source_hash(self, path):
+        """Content hash of a source file, reusing the recorded hash when size and mtime are unchanged."""
+        stat = os.stat(path)
+        entry = self.sources.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        with open(path, 'rb') as f:
+            sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+        self.sources[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        self.hashed += 1
+        return sha256
+
+    def is_current(self, output_name, key, existing):
+        """True if output_name exists on disk (existing: set of file names) and was built from key."""
+        return output_name in existing and self.outputs.get(output_name) == key
+
+    def record(self, output_name, key):
+        self.outputs[output_name] = key
+
+    def phash(self, key):
+        """Recorded perceptual hash (int) for key, or None; the entry is kept when the manifest is saved."""
+        self._used_phashes.add(key)
+        value = self.phashes.get(key)
+        return None if value is None else int(value, 16)
+
+    def record_phash(self, key, value):
+        self._used_phashes.add(key)
+        self.phashes[key] = f"{int(value):016x}"
+
+    def remove_orphans(self, output_images_dir, expected):
+        """
+        Delete files in output_images_dir that no label produces any more; returns the number removed.
+        Hidden files (e.g. the image index written by generate_metadata.py --index) are kept.
+        """
+        removed = 0
+        for entry in os.scandir(output_images_dir):
+            if entry.is_file() and not entry.name.startswith('.') and entry.name not in expected:
+                os.remove(entry.path)
+                removed += 1
+        self.outputs = {name: key for name, key in self.outputs.items() if name in expected}
+        return removed
+
+    def save(self, used_sources):
+        """Atomically write the manifest, keeping only sources that are still referenced."""
+        self.sources = {path: entry for path, entry in self.sources.items() if path in used_sources}
+        self.phashes = {key: value for key, value in self.phashes.items() if key in self._used_phashes}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'sources': self.sources, 'outputs': self.outputs,
+                       'phashes': self.phashes}, f,
+                      ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
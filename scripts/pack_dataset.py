@@ -0,0 +1,18 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_tools.packed import DEFAULT_SHARD_SIZE, pack_dataset  # noqa: E402
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack an imagefolder dataset into tar shards with an index")
+    parser.add_argument("dataset_dir", help="Dataset directory with metadata.jsonl, e.g. dataset/huggingface/gaze-direction")
+    parser.add_argument("output_dir", help="Output directory, e.g. dataset/packed/gaze-direction")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE // 1024 ** 2, help="Shard size in MiB")
+    args = parser.parse_args()
+
+    count = pack_dataset(args.dataset_dir, args.output_dir, shard_size=args.shard_size * 1024 ** 2)
+    print(f"Packed {count} samples into {args.output_dir}")
+    print(f"Use it as dataset_path in the evaluation scripts, or with train/train_qwen_vision.py --packed {args.output_dir}")
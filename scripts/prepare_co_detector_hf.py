@@ -1,27 +1,113 @@
+import argparse
+import errno
 import os
+import sys
 import json
 import shutil
+from PIL import Image
 from tqdm import tqdm
-import unicodedata
-import re
+from build_manifest import BuildManifest, digest
 
-def slugify(value, allow_unicode=False):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_tools.dedup import PHASH_VERSION, cluster, cluster_sizes, load_thumbnails, phash, \
+    savings_report  # noqa: E402
+from dataset_tools.gaze import slugify  # noqa: E402
+from dataset_tools.image_index import load_image_index, lookup  # noqa: E402
+from dataset_tools.labels import iter_labels  # noqa: E402
+from dataset_tools.pyramid import parse_resolutions, variant_file_name, variant_files, write_pyramid  # noqa: E402
+
+# ioctl request number of FICLONE (linux/fs.h): the new file shares the source's extents copy-on-write
+FICLONE = 0x40049409
+
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+
+def reflink(source_path, dest_path):
+    """Clone source_path into dest_path (btrfs, XFS, bcachefs...); raises OSError where unsupported."""
+    if sys.platform != 'linux':
+        raise OSError(errno.EOPNOTSUPP, "reflink is only implemented on Linux")
+    import fcntl
+
+    with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+class FileLinker:
     """
-    Taken from https://github.com/django/django/blob/master/django/utils/text.py
-    Convert to ASCII if 'allow_unicode' is False. Convert spaces or repeated
-    dashes to single dashes. Remove characters that aren't alphanumerics,
-    underscores, or hyphens. Convert to lowercase. Also strip leading and
-    trailing whitespace, dashes, and underscores.
+    Places output images without duplicating their data where possible.
+
+    auto tries a reflink, then a hardlink, then a plain copy, and stops trying
+    a method after it fails once (e.g. unsupported filesystem or cross-device).
+    Hardlinked outputs share the source file, so they must not be edited in place.
+    """
+
+    METHODS = {'reflink': reflink, 'hardlink': os.link, 'copy': shutil.copyfile}
+
+    def __init__(self, mode='auto'):
+        names = ['reflink', 'hardlink', 'copy'] if mode == 'auto' else [mode]
+        self.methods = [(name, self.METHODS[name]) for name in names]
+        self.counts = {name: 0 for name in names}
+        self.bytes_saved = 0
+
+    def place(self, source_path, dest_path):
+        """Atomically create dest_path from source_path with the first method that works."""
+        tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+        while True:
+            name, method = self.methods[0]
+            try:
+                method(source_path, tmp_path)
+                if os.path.exists(dest_path) and os.path.samefile(tmp_path, dest_path):
+                    # Already a hardlink to the source: rename() would do nothing and leave tmp_path behind
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, dest_path)
+                break
+            except OSError as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if len(self.methods) == 1:
+                    raise
+                self.methods.pop(0)
+                print(f"{name} not available ({e}), falling back to {self.methods[0][0]}")
+        self.counts[name] += 1
+        if name != 'copy':
+            self.bytes_saved += os.path.getsize(source_path)
+
+
+def deduplicate(samples, manifest, threshold):
     """
-    value = str(value)
-    if allow_unicode:
-        value = unicodedata.normalize('NFKC', value)
-    else:
-        value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
-    value = re.sub(r'[^\w\s-]', '', value.lower())
-    return re.sub(r'[-\s]+', '-', value).strip('-_')
-
-def create_co_detector_hf_dataset():
+    Drop images that are near-duplicates of an earlier image with the same labels
+    (consecutive frames of a static scene), keeping the first one with its
+    cluster size as "weight". Hashes are cached in the build manifest.
+    """
+    keys = [digest('phash', PHASH_VERSION, source_hash) for _, _, source_hash, _ in samples]
+    hashes = [manifest.phash(key) for key in keys]
+    missing = [index for index, value in enumerate(hashes) if value is None]
+    thumbnails, hashed = [], []
+    for index in tqdm(missing, desc="Hashing images", disable=not missing):
+        try:
+            thumbnails.extend(load_thumbnails(samples[index][0]))
+            hashed.append(index)
+        except Exception as e:
+            print(f"Error opening image {samples[index][0]}: {e}")
+    # One vectorized pass over every new thumbnail
+    for index, value in zip(hashed, phash(thumbnails) if thumbnails else []):
+        manifest.record_phash(keys[index], value)
+        hashes[index] = int(value)
+
+    usable = [index for index, value in enumerate(hashes) if value is not None]
+    representatives = cluster([hashes[index] for index in usable], threshold,
+                              [json.dumps(samples[index][3], sort_keys=True) for index in usable])
+    weights = {usable[rep]: size for rep, size in cluster_sizes(representatives).items()}
+    dropped = {usable[i] for i, rep in enumerate(representatives) if rep != i}
+    print(savings_report(len(samples), len(samples) - len(dropped), threshold))
+    return [
+        (source_path, name, source_hash, {**fields, "weight": weights[index]} if index in weights else fields)
+        for index, (source_path, name, source_hash, fields) in enumerate(samples) if index not in dropped
+    ]
+
+
+def create_co_detector_hf_dataset(force=False, link_mode='auto', dedup=None, resolutions=()):
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     labels_path = os.path.join(base_dir, 'dataset/labeled-data/co-detector/labels.json')
     images_dir = os.path.join(base_dir, 'dataset/labeled-data/co-detector/processed-images')
@@ -30,33 +116,86 @@ def create_co_detector_hf_dataset():
 
     os.makedirs(output_images_dir, exist_ok=True)
 
-    with open(labels_path, 'r', encoding='utf-8') as f:
-        labels_data = json.load(f)
+    # Only images whose source content changed (or that are missing) are placed again
+    manifest = BuildManifest(output_dir, force=force)
+    linker = FileLinker(link_mode)
+    existing = set(os.listdir(output_images_dir))
+    expected = set()
+    used_sources = set()
+    placed = 0
+    resized = 0
 
-    metadata_path = os.path.join(output_dir, 'metadata.jsonl')
+    # Corrupt images flagged by the image index (generate_metadata.py --index), when present, are skipped
+    image_index = load_image_index(images_dir)
 
-    with open(metadata_path, 'w', encoding='utf-8') as meta_f:
-        for image_name_key, data in tqdm(labels_data.items(), desc="Processing co-detector images"):
+    def iter_samples():
+        # labels.json is parsed incrementally, so images are placed while it is still being read
+        for image_name_key, data in iter_labels(labels_path):
             image_name = data['imageName']
             source_image_path = os.path.join(images_dir, image_name)
 
             if not os.path.exists(source_image_path):
                 print(f"Image not found, skipping: {source_image_path}")
                 continue
+            indexed = lookup(image_index, source_image_path)
+            if indexed is not None and indexed['error']:
+                print(f"Corrupt image, skipping: {source_image_path} ({indexed['error']})")
+                continue
 
-            # Since we are not drawing on the image, we can just copy it.
             sanitized_image_name = slugify(os.path.splitext(image_name)[0]) + os.path.splitext(image_name)[1]
+            used_sources.add(source_image_path)
+            # There's only one "box" which holds the image-level label
+            yield (source_image_path, sanitized_image_name, manifest.source_hash(source_image_path),
+                   data['boxes'][0]['fields'])
+
+    samples = iter_samples()
+    if dedup is not None:
+        # Clustering needs every hash before the first image can be kept or dropped
+        samples = deduplicate(list(samples), manifest, dedup)
+
+    metadata_path = os.path.join(output_dir, 'metadata.jsonl')
+    tmp_metadata_path = f"{metadata_path}.tmp"
+
+    with open(tmp_metadata_path, 'w', encoding='utf-8') as meta_f:
+        for source_image_path, sanitized_image_name, source_hash, fields in tqdm(
+                samples, desc="Processing co-detector images"):
+            # Since we are not drawing on the image, we can just link (or copy) it.
             dest_image_path = os.path.join(output_images_dir, sanitized_image_name)
-            shutil.copy(source_image_path, dest_image_path)
+            key = digest(source_hash)
+            if not manifest.is_current(sanitized_image_name, key, existing):
+                linker.place(source_image_path, dest_image_path)
+                placed += 1
+            manifest.record(sanitized_image_name, key)
+            expected.add(sanitized_image_name)
 
-            # There's only one "box" which holds the image-level label
-            fields = data['boxes'][0]['fields']
-            
             metadata_entry = {
                 "file_name": os.path.join('images', sanitized_image_name),
                 **fields
             }
+            if resolutions:
+                # Resized variants need the decoded image, so the source is only decoded when one is stale
+                variant_keys = {variant_file_name(sanitized_image_name, resolution): digest(key, resolution)
+                                for resolution in resolutions}
+                if not all(manifest.is_current(name, variant_key, existing)
+                           for name, variant_key in variant_keys.items()):
+                    with Image.open(source_image_path) as image:
+                        write_pyramid(image, output_images_dir, sanitized_image_name, resolutions)
+                    resized += 1
+                for name, variant_key in variant_keys.items():
+                    manifest.record(name, variant_key)
+                    expected.add(name)
+                metadata_entry["resolutions"] = variant_files(metadata_entry["file_name"], resolutions)
             meta_f.write(json.dumps(metadata_entry, ensure_ascii=False) + '\n')
+    os.replace(tmp_metadata_path, metadata_path)
+
+    removed = manifest.remove_orphans(output_images_dir, expected)
+    manifest.save(used_sources)
+    methods = ", ".join(f"{name} {count}" for name, count in linker.counts.items() if count)
+    print(f"Placed {placed} images ({methods or 'none'}), {len(expected) // (1 + len(resolutions)) - placed} "
+          f"up to date, removed {removed} orphans (hashed {manifest.hashed} source images)")
+    if resolutions:
+        print(f"Wrote {', '.join(f'{resolution}px' for resolution in resolutions)} variants of {resized} images")
+    print(f"Saved {linker.bytes_saved / 1024 ** 2:.1f} MiB of disk space by linking instead of copying")
 
     print(f"Dataset created at: {output_dir}")
     print(f"To load the dataset, use the following Python code:")
@@ -65,4 +204,16 @@ def create_co_detector_hf_dataset():
 
 
 if __name__ == '__main__':
-    create_co_detector_hf_dataset()
+    parser = argparse.ArgumentParser(description="Build the co-detector imagefolder dataset")
+    parser.add_argument("--force", action="store_true", help="Ignore the build manifest and place every image")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default='auto',
+                        help="How to place images: auto tries reflink, then hardlink, then copy")
+    parser.add_argument("--dedup", type=int, metavar="BITS",
+                        help="Drop images whose perceptual hash is within BITS (of 64) of an earlier image with "
+                             "the same labels; kept images get a \"weight\" (e.g. 6)")
+    parser.add_argument("--resolutions", type=parse_resolutions, default=[], metavar="PX,PX,...",
+                        help="Also write variants of every image resized to these longest sides (e.g. 448,672,1024), "
+                             "listed under \"resolutions\" in the metadata and selectable per evaluation run")
+    args = parser.parse_args()
+    create_co_detector_hf_dataset(force=args.force, link_mode=args.link_mode, dedup=args.dedup,
+                                  resolutions=args.resolutions)
@@ -1,84 +1,250 @@
+import argparse
 import os
 import json
-from PIL import Image, ImageDraw
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
 from tqdm import tqdm
-import unicodedata
-import re
+from build_manifest import BuildManifest, digest
 
-def slugify(value, allow_unicode=False):
-    """
-    Taken from https://github.com/django/django/blob/master/django/utils/text.py
-    Convert to ASCII if 'allow_unicode' is False. Convert spaces or repeated
-    dashes to single dashes. Remove characters that aren't alphanumerics,
-    underscores, or hyphens. Convert to lowercase. Also strip leading and
-    trailing whitespace, dashes, and underscores.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_tools.dedup import PHASH_VERSION, box_region, cluster, cluster_sizes, load_thumbnails, phash, \
+    savings_report  # noqa: E402
+from dataset_tools.image_index import load_image_index, lookup  # noqa: E402
+from dataset_tools.labels import iter_labels  # noqa: E402
+from dataset_tools.gaze import RENDER_VERSION, plan_outputs, render_box, render_crop  # noqa: E402
+from dataset_tools.pyramid import parse_resolutions, save_atomic, variant_file_name, variant_files, \
+    write_pyramid  # noqa: E402
+
+
+def render_image(job):
     """
-    value = str(value)
-    if allow_unicode:
-        value = unicodedata.normalize('NFKC', value)
-    else:
-        value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
-    value = re.sub(r'[^\w\s-]', '', value.lower())
-    return re.sub(r'[-\s]+', '-', value).strip('-_')
+    Decode one source image and render the given boxes, one output image each:
+    the full frame with a red box, or the ROI crop when the box has crop geometry.
+    With resolutions, each output also gets its resized variants.
 
+    Runs in a worker process. Returns an error message, or None on success.
+    """
+    image_path, boxes, output_images_dir, resolutions = job
 
-def create_hf_dataset():
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    labels_path = os.path.join(base_dir, 'dataset/labeled-data/gaze-direction/labels.json')
-    images_dir = os.path.join(base_dir, 'dataset/labeled-data/gaze-direction/preprocessed-images')
-    output_dir = os.path.join(base_dir, 'dataset/huggingface/gaze-direction')
-    output_images_dir = os.path.join(output_dir, 'images')
+    try:
+        original_image = Image.open(image_path).convert("RGB")
+    except Exception as e:
+        return f"Error opening image {image_path}: {e}"
 
-    os.makedirs(output_images_dir, exist_ok=True)
+    for output_image_filename, box, geometry in boxes:
+        output_image_path = os.path.join(output_images_dir, output_image_filename)
+        if geometry is not None:
+            rendered = render_crop(original_image, box, geometry)
+        else:
+            rendered = render_box(original_image, box)
+        save_atomic(rendered, output_image_path)
+        if resolutions:
+            write_pyramid(rendered, output_images_dir, output_image_filename, resolutions)
+    return None
 
-    with open(labels_path, 'r', encoding='utf-8') as f:
-        labels_data = json.load(f)
 
-    metadata_path = os.path.join(output_dir, 'metadata.jsonl')
+def thumbnail_job(job):
+    """Decode one source image and return the dedup thumbnails of the given regions (or an error message)."""
+    image_path, regions = job
+    try:
+        return load_thumbnails(image_path, regions), None
+    except Exception as e:
+        return None, f"Error opening image {image_path}: {e}"
 
-    with open(metadata_path, 'w', encoding='utf-8') as meta_f:
-        for image_name_key, data in tqdm(labels_data.items(), desc="Processing images"):
-            image_name = data['imageName']
-            image_path = os.path.join(images_dir, image_name)
 
-            if not os.path.exists(image_path):
-                print(f"Image not found, skipping: {image_path}")
-                continue
+def deduplicate(planned, manifest, threshold, workers):
+    """
+    Drop boxes whose padded ROI is a near-duplicate of an earlier box with the
+    same labels (consecutive frames of a static scene), keeping the first one
+    with its cluster size as "weight".
 
-            try:
-                original_image = Image.open(image_path).convert("RGB")
-                width, height = original_image.size
-            except Exception as e:
-                print(f"Error opening image {image_path}: {e}")
-                continue
+    The ROI is hashed rather than the whole frame, so different people in the
+    same frame are never merged. Hashes are cached in the build manifest.
+    """
+    hash_keys = [
+        [digest('phash', PHASH_VERSION, source_hash, [box['x'], box['y'], box['w'], box['h']])
+         for _, box, _ in outputs]
+        for _, outputs, _, source_hash in planned
+    ]
+    hashes = {key: manifest.phash(key) for keys in hash_keys for key in keys}
+    jobs = []
+    for (image_path, outputs, _, _), keys in zip(planned, hash_keys):
+        missing = [(key, box) for key, (_, box, _) in zip(keys, outputs) if hashes[key] is None]
+        if missing:
+            jobs.append((image_path, [key for key, _ in missing], [box_region(box) for _, box in missing]))
 
-            for box in data['boxes']:
-                if box['w'] == 0 or box['h'] == 0:
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(thumbnail_job, [(image_path, regions) for image_path, _, regions in jobs],
+                                   chunksize=max(1, len(jobs) // (workers * 16)))
+            thumbnails, thumbnail_keys = [], []
+            for (_, keys, _), (images, error) in tqdm(zip(jobs, results), total=len(jobs), desc="Hashing images"):
+                if error:
+                    print(error)
                     continue
-                if not box['fields'].get('gaze_direction'):
+                thumbnails.extend(images)
+                thumbnail_keys.extend(keys)
+        # One vectorized pass over every new thumbnail
+        for key, value in zip(thumbnail_keys, phash(thumbnails) if thumbnails else []):
+            manifest.record_phash(key, value)
+            hashes[key] = int(value)
+
+    # Boxes whose image could not be decoded are kept; the render step reports them
+    boxes = [
+        ((index, name), box, key)
+        for index, ((_, outputs, _, _), keys) in enumerate(zip(planned, hash_keys))
+        for (name, box, _), key in zip(outputs, keys)
+    ]
+    hashed = [(position, box, key) for position, box, key in boxes if hashes[key] is not None]
+    representatives = cluster([hashes[key] for _, _, key in hashed], threshold,
+                              [json.dumps(box['fields'], sort_keys=True) for _, box, _ in hashed])
+    weights = {hashed[rep][0]: size for rep, size in cluster_sizes(representatives).items()}
+    dropped = {hashed[i][0] for i, rep in enumerate(representatives) if rep != i}
+
+    deduplicated = []
+    for index, (image_path, outputs, keys, source_hash) in enumerate(planned):
+        kept = [
+            (name, box, {**entry, "weight": weights[(index, name)]} if (index, name) in weights else entry)
+            for name, box, entry in outputs if (index, name) not in dropped
+        ]
+        if kept:
+            deduplicated.append((image_path, kept, keys, source_hash))
+    print(savings_report(len(boxes), len(boxes) - len(dropped), threshold))
+    return deduplicated
+
+
+def plan_images(labels_path, images_dir, manifest, used_sources, mode, padding, thumbnail, resolutions):
+    """
+    Yield (image_path, outputs, build keys, source hash) per source image, as
+    labels.json is parsed.
+
+    Outputs are planned from the labels alone; only outputs whose source image,
+    box geometry or renderer changed are rendered again. When images_dir has an
+    image index (generate_metadata.py --index), frame sizes come from it and
+    corrupt frames are skipped.
+    """
+    image_index = load_image_index(images_dir)
+    for _, data in iter_labels(labels_path):
+        image_name = data['imageName']
+        image_path = os.path.join(images_dir, image_name)
+
+        try:
+            stat = os.stat(image_path)
+        except FileNotFoundError:
+            print(f"Image not found, skipping: {image_path}")
+            continue
+        indexed = lookup(image_index, image_path, stat)
+        if indexed is not None and indexed['error']:
+            print(f"Corrupt image, skipping: {image_path} ({indexed['error']})")
+            continue
+
+        image_size = None
+        if mode == 'crop':
+            if indexed is not None:
+                image_size = (indexed['width'], indexed['height'])
+            else:
+                # The crop geometry needs the frame size; opening the image only reads its header
+                try:
+                    with Image.open(image_path) as image:
+                        image_size = image.size
+                except Exception as e:
+                    print(f"Error opening image {image_path}: {e}")
                     continue
 
-                img_copy = original_image.copy()
-                draw = ImageDraw.Draw(img_copy)
+        outputs = plan_outputs(image_name, data['boxes'], image_size, padding, thumbnail)
+        if not outputs:
+            continue
+        used_sources.add(image_path)
+        source_hash = manifest.source_hash(image_path)
+        keys = {
+            name: digest(RENDER_VERSION, source_hash, [box['x'], box['y'], box['w'], box['h']],
+                         *([entry["crop"]] if "crop" in entry else []))
+            for name, box, entry in outputs
+        }
+        if resolutions:
+            # Variants are recorded in the metadata and tracked as outputs of their own
+            for name, _, entry in outputs:
+                entry["resolutions"] = variant_files(entry["file_name"], resolutions)
+                keys.update({variant_file_name(name, resolution): digest(keys[name], resolution)
+                             for resolution in resolutions})
+        yield image_path, outputs, keys, source_hash
+
+
+def create_hf_dataset(workers=None, force=False, mode='box', padding=0.5, thumbnail=320, dedup=None,
+                      resolutions=()):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    labels_path = os.path.join(base_dir, 'dataset/labeled-data/gaze-direction/labels.json')
+    images_dir = os.path.join(base_dir, 'dataset/labeled-data/gaze-direction/preprocessed-images')
+    # Crop mode is a separate dataset, so both variants can be evaluated side by side
+    output_dir = os.path.join(base_dir, 'dataset/huggingface/gaze-direction' + ('-crop' if mode == 'crop' else ''))
+    output_images_dir = os.path.join(output_dir, 'images')
+
+    os.makedirs(output_images_dir, exist_ok=True)
+
+    manifest = BuildManifest(output_dir, force=force)
+    existing = set(os.listdir(output_images_dir))
+    used_sources = set()
 
-                x1 = box['x'] * width
-                y1 = box['y'] * height
-                x2 = (box['x'] + box['w']) * width
-                y2 = (box['y'] + box['h']) * height
+    planned = plan_images(labels_path, images_dir, manifest, used_sources, mode, padding, thumbnail, resolutions)
+    if dedup is not None:
+        # Clustering needs every hash before the first sample can be kept or dropped
+        planned = deduplicate(list(planned), manifest, dedup, workers)
+
+    # Source images are rendered while labels.json is still being parsed, one job per
+    # image so each one is decoded at most once. Metadata is written in label order
+    # (matching a serial full build byte for byte) as soon as the oldest pending
+    # image is done, so at most a window of images is in flight.
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4
+    metadata_path = os.path.join(output_dir, 'metadata.jsonl')
+    tmp_metadata_path = f"{metadata_path}.tmp"
+    expected = set()
+    rendered = up_to_date = 0
 
-                draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
+    def finish(outputs, keys, stale, future):
+        nonlocal rendered, up_to_date
+        progress.update()
+        if future is not None:
+            error = future.result()
+            if error:
+                print(error)
+                return
+        rendered += stale
+        up_to_date += len(outputs) - stale
+        for name, _, metadata_entry in outputs:
+            for output in [name, *(variant_file_name(name, resolution) for resolution in resolutions)]:
+                manifest.record(output, keys[output])
+                expected.add(output)
+            meta_f.write(json.dumps(metadata_entry, ensure_ascii=False) + '\n')
 
-                sanitized_image_name = slugify(os.path.splitext(image_name)[0])
-                
-                output_image_filename = f"{sanitized_image_name}_{box['id']}.jpg"
-                output_image_path = os.path.join(output_images_dir, output_image_filename)
-                img_copy.save(output_image_path)
+    # The worker processes are only started by the first submit, so a no-op rebuild spawns none
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(tmp_metadata_path, 'w', encoding='utf-8') as meta_f, \
+            tqdm(desc="Processing images", unit="image") as progress:
+        pending = deque()
+        for image_path, outputs, keys, _ in planned:
+            stale = [
+                (name, box, entry.get("crop")) for name, box, entry in outputs
+                if not all(manifest.is_current(output, keys[output], existing)
+                           for output in [name, *(variant_file_name(name, resolution) for resolution in resolutions)])
+            ]
+            future = None
+            if stale:
+                future = executor.submit(render_image, (image_path, stale, output_images_dir, resolutions))
+            pending.append((outputs, keys, len(stale), future))
+            while pending and (pending[0][3] is None or pending[0][3].done() or len(pending) > window):
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+    os.replace(tmp_metadata_path, metadata_path)
 
-                metadata_entry = {
-                    "file_name": os.path.join('images', output_image_filename),
-                    **box['fields']
-                }
-                meta_f.write(json.dumps(metadata_entry, ensure_ascii=False) + '\n')
+    removed = manifest.remove_orphans(output_images_dir, expected)
+    manifest.save(used_sources)
+    print(f"Rendered {rendered} images, {up_to_date} up to date, removed {removed} orphans "
+          f"(hashed {manifest.hashed} source images)")
 
     print(f"Dataset created at: {output_dir}")
     print(f"To load the dataset, use the following Python code:")
@@ -87,4 +253,22 @@ def create_hf_dataset():
 
 
 if __name__ == '__main__':
-    create_hf_dataset()
+    parser = argparse.ArgumentParser(description="Build the gaze-direction imagefolder dataset")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Ignore the build manifest and render every image")
+    parser.add_argument("--mode", choices=("box", "crop"), default="box",
+                        help="box: full frame with a red box; crop: ROI crop around the box "
+                             "(written to dataset/huggingface/gaze-direction-crop)")
+    parser.add_argument("--padding", type=float, default=0.5,
+                        help="Crop mode: context around the box, as a fraction of its width/height per side")
+    parser.add_argument("--thumbnail", type=int, default=320,
+                        help="Crop mode: width of the whole-frame context thumbnail below the crop (0 disables)")
+    parser.add_argument("--dedup", type=int, metavar="BITS",
+                        help="Drop boxes whose ROI perceptual hash is within BITS (of 64) of an earlier box with "
+                             "the same labels; kept boxes get a \"weight\" (e.g. 6)")
+    parser.add_argument("--resolutions", type=parse_resolutions, default=[], metavar="PX,PX,...",
+                        help="Also write variants of every image resized to these longest sides (e.g. 448,672,1024), "
+                             "listed under \"resolutions\" in the metadata and selectable per evaluation run")
+    args = parser.parse_args()
+    create_hf_dataset(workers=args.workers, force=args.force, mode=args.mode, padding=args.padding,
+                      thumbnail=args.thumbnail, dedup=args.dedup, resolutions=args.resolutions)
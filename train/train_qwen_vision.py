@@ -1,11 +1,17 @@
 
+import argparse
+import os
 import re
+import sys
 import torch
 from unsloth import FastVisionModel
 from datasets import load_dataset
 from trl import SFTTrainer, SFTConfig
 from unsloth.trainer import UnslothVisionDataCollator
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_tools import PackedDataset, VirtualGazeDataset  # noqa: E402
+
 
 def evaluate_accuracy(model, tokenizer, eval_dataset, instruction, save_path:str|None=None) -> float:
     FastVisionModel.for_inference(model)
@@ -86,7 +92,7 @@ def evaluate_accuracy(model, tokenizer, eval_dataset, instruction, save_path:str
     return (correct / total) if total > 0 else 0.0
 
 
-def main():
+def main(use_virtual_dataset: bool = False, packed_dir: str | None = None):
     # Model and Tokenizer Loading (base model for pre-eval)
     model, tokenizer = FastVisionModel.from_pretrained(
         "unsloth/Qwen2.5-VL-7B-Instruct-bnb-4bit",
@@ -97,7 +103,14 @@ def main():
     # Data Preparation (done later) stays same
 
     # === Prepare dataset split first ===
-    dataset = load_dataset('dataset/huggingface/gaze-direction', split="train")
+    if use_virtual_dataset:
+        # Render the red-box samples on demand from labels.json, no prepare step needed
+        dataset = VirtualGazeDataset.from_dir('dataset/labeled-data/gaze-direction').to_hf_dataset()
+    elif packed_dir:
+        # Read images from memory-mapped tar shards written by scripts/pack_dataset.py
+        dataset = PackedDataset(packed_dir).to_hf_dataset()
+    else:
+        dataset = load_dataset('dataset/huggingface/gaze-direction', split="train")
     split_dataset = dataset.train_test_split(test_size=15, seed=42)
     train_dataset = split_dataset['train']
     eval_dataset = split_dataset['test']
@@ -202,4 +215,9 @@ def main():
     tokenizer.save_pretrained("lora_model")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fine-tune Qwen2.5-VL on the gaze-direction dataset")
+    parser.add_argument("--virtual", action="store_true",
+                        help="Read dataset/labeled-data/gaze-direction directly instead of the prepared dataset")
+    parser.add_argument("--packed", help="Read a dataset packed by scripts/pack_dataset.py instead")
+    args = parser.parse_args()
+    main(use_virtual_dataset=args.virtual, packed_dir=args.packed)